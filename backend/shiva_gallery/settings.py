@@ -1,5 +1,6 @@
 # shiva_gallery/settings.py
 
+import os
 from pathlib import Path
 from datetime import timedelta # Import timedelta for JWT settings
 
@@ -37,6 +38,9 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'shop.metrics.MetricsMiddleware', # Latency/status/query/cache counters per view, served at /metrics/
+    'shop.querybudget.QueryBudgetMiddleware', # Query count/N+1 warnings per request (see QUERY_BUDGET)
+    'shop.compression.CompressionMiddleware', # gzip/brotli for responses over COMPRESSION_MIN_SIZE
     'corsheaders.middleware.CorsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware', # Essential for session management (guest cart)
     'django.middleware.common.CommonMiddleware',
@@ -81,6 +85,57 @@ DATABASES = {
     }
 }
 
+# Database profile, chosen with the DATABASE_PROFILE environment variable:
+# 'development' keeps Django's defaults; 'production' tunes SQLite for several worker processes
+# (WAL so reads don't block writes, write lock taken at BEGIN so concurrent cart/order
+# transactions queue instead of failing with "database is locked", persistent connections)
+# and adds a read-only 'replica' connection for catalog reads (see shop/routers.py).
+DATABASE_PROFILE = os.environ.get('DATABASE_PROFILE', 'development')
+
+SQLITE_PRODUCTION_PRAGMAS = [
+    'PRAGMA journal_mode=WAL',
+    'PRAGMA synchronous=NORMAL', # Safe with WAL; fsync only at checkpoints
+    'PRAGMA mmap_size=268435456', # 256 MB of the file read through memory mapping
+    'PRAGMA cache_size=-65536', # 64 MB page cache per connection
+    'PRAGMA busy_timeout=20000', # Wait up to 20 s for the write lock
+]
+
+SQLITE_PRODUCTION_OPTIONS = {
+    'timeout': 20,
+    'transaction_mode': 'IMMEDIATE',
+    'init_command': ';'.join(SQLITE_PRODUCTION_PRAGMAS),
+}
+
+if DATABASE_PROFILE == 'production':
+    DATABASES['default'].update({
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': SQLITE_PRODUCTION_OPTIONS,
+    })
+    DATABASES['replica'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': f"file:{DATABASES['default']['NAME']}?mode=ro",
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'timeout': 20,
+            # journal_mode is a property of the file, set by the writer connection
+            'init_command': ';'.join(SQLITE_PRODUCTION_PRAGMAS[1:] + ['PRAGMA query_only=1']),
+        },
+        'TEST': {'MIRROR': 'default'},
+    }
+
+# Archived orders (see shop/archive.py) stay in the default database unless an 'archive'
+# database is configured, e.g. (then run `python manage.py migrate --database archive`):
+# DATABASES['archive'] = {
+#     'ENGINE': 'django.db.backends.sqlite3',
+#     'NAME': BASE_DIR / 'archive.sqlite3',
+# }
+DATABASE_ROUTERS = ['shop.routers.ArchiveRouter', 'shop.routers.ReadReplicaRouter']
+
+# Days a delivered/cancelled/refunded order stays in the order tables before `manage.py archive_orders` moves it
+ORDER_ARCHIVE_AFTER_DAYS = 180
+
 
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
@@ -123,7 +178,7 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # Django REST Framework settings
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'shop.authentication.StatelessJWTAuthentication', # JWT without a user query per request
         'rest_framework.authentication.SessionAuthentication', # Keep for admin/browsable API
     ),
     'DEFAULT_PERMISSION_CLASSES': (
@@ -134,16 +189,92 @@ REST_FRAMEWORK = {
     'DEFAULT_FILTER_BACKENDS': [
         'django_filters.rest_framework.DjangoFilterBackend'
     ],
+    # Token buckets in a file shared by all worker processes (see shop/throttling.py)
     'DEFAULT_THROTTLE_CLASSES': [
-        'rest_framework.throttling.AnonRateThrottle',
-        'rest_framework.throttling.UserRateThrottle'
+        'shop.throttling.AnonBucketThrottle',
+        'shop.throttling.UserBucketThrottle',
+        'shop.throttling.ScopedBucketThrottle',
     ],
     'DEFAULT_THROTTLE_RATES': {
         'anon': '100/day',
-        'user': '1000/day'
+        'user': '1000/day',
+        # Per endpoint limits, on top of the ones above (throttle_scope of the view/action)
+        'register': '10/hour',
+        'login': '10/minute',
+        'coupon': '30/hour',
     }
 }
 
+# Responses smaller than this many bytes aren't compressed (see shop/compression.py); brotli is
+# used when the `brotli` package is installed, gzip otherwise
+COMPRESSION_MIN_SIZE = 1024
+
+# Faster JSON for the hot responses: orjson rendering (shop/renderers.py) and compiled product
+# list and cart serializers (shop/fastserializers.py). The responses are the same, byte for byte.
+FAST_JSON = os.environ.get('FAST_JSON', '') == '1'
+if FAST_JSON:
+    REST_FRAMEWORK['DEFAULT_RENDERER_CLASSES'] = [
+        'shop.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ]
+
+# SQLite file holding the throttle buckets; must be on a disk all worker processes of the host share
+THROTTLE_STORE_PATH = BASE_DIR / 'throttle.sqlite3'
+
+# Runs the tests with the throttle and metrics stores in a temporary directory (see shop/testrunner.py)
+TEST_RUNNER = 'shop.testrunner.ShopTestRunner'
+
+# Per request query budget (see shop/querybudget.py). Requests over their budget, or running
+# the same query more than REPEAT_LIMIT times, are logged with the stack of the offending query.
+QUERY_BUDGET = {
+    'DEFAULT': 50,
+    'VIEWS': {}, # URL name -> budget, e.g. {'product-list': 10}; a view's `query_budget` attribute wins
+    'REPEAT_LIMIT': 5,
+    'HEADER': DEBUG, # X-Query-Budget: queries=..; budget=..; time_ms=..; repeated=..
+    'RAISE': False, # True makes an over budget request fail (for CI runs)
+}
+
+# Request metrics (see shop/metrics.py). Every worker process adds its counters to this SQLite
+# file every METRICS_FLUSH_INTERVAL seconds; /metrics/ serves the totals in the Prometheus text format.
+METRICS_STORE_PATH = BASE_DIR / 'metrics.sqlite3'
+METRICS_FLUSH_INTERVAL = 5
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN') # Scrapers send "Authorization: Bearer <token>"; unset allows DEBUG and staff
+
+# The default per-process cache, counting hits and misses for the metrics
+CACHES = {
+    'default': {
+        'BACKEND': 'shop.metrics.LocMemCache',
+    }
+}
+# Seconds another worker process may keep serving an order's old status on the tracking page
+TRACKING_CACHE_TIMEOUT = 60
+
+# Shipping cost (Toman) per Order.SHIPPING_METHOD_CHOICES key, used at checkout (see shop/checkout.py)
+SHIPPING_COSTS = {
+    'free_delivery': 0,
+    'post_office': 0,
+}
+
+# Background job queues and their worker threads for `manage.py run_workers` (see shop/jobs.py)
+TASK_QUEUES = {
+    'default': 2,
+    'notifications': 1,
+}
+TASK_RETRY_BASE_DELAY = 10 # Seconds before the first retry, doubled on every further attempt
+TASK_RETRY_MAX_DELAY = 3600
+TASK_STALE_AFTER = 600 # Seconds without a heartbeat after which a running job's worker is taken to be dead
+
+# Emails (order confirmations, review notifications) are printed to the console in development
+EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
+
+# Idempotency-Key handling for cart mutations and order creation (see shop/idempotency.py)
+IDEMPOTENCY_KEY_TTL = timedelta(hours=24) # Stored responses are replayed for retries within this window
+IDEMPOTENCY_LOCK_TIMEOUT = 10 # Seconds a duplicate request waits for the first attempt to finish
+IDEMPOTENCY_LOCK_TTL = timedelta(minutes=2) # An attempt unanswered for longer died (e.g. killed worker); a retry may take its key over
+
+# Seconds a user loaded by StatelessJWTAuthentication stays in the per-process cache
+USER_CACHE_TTL = 60
+
 # Simple JWT settings
 SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(minutes=60), # Access token expiry time
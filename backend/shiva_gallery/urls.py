@@ -6,9 +6,12 @@ from rest_framework.routers import DefaultRouter
 from shop.views import (
     CategoryViewSet, SliderViewSet, TagViewSet, ProductViewSet,
     ReviewViewSet, CartViewSet, OrderViewSet, AddressViewSet,
-    MyTokenObtainPairView, RegisterView, UserProfileViewSet # Import UserProfileViewSet
+    MyTokenObtainPairView, RegisterView, UserProfileViewSet, # Import UserProfileViewSet
+    SalesReportView, OrderTrackingView, CouponStatsView
 )
 from rest_framework_simplejwt.views import TokenRefreshView
+from shop.metrics import metrics_view
+from shop import asyncviews
 
 router = DefaultRouter()
 router.register(r'categories', CategoryViewSet)
@@ -27,6 +30,16 @@ urlpatterns = [
     path('api/token/', MyTokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('api/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
     path('api/register/', RegisterView.as_view(), name='register'),
+    path('api/reports/sales/', SalesReportView.as_view(), name='sales_report'),
+    path('api/reports/coupons/', CouponStatsView.as_view(), name='coupon_stats'),
+    path('api/track/<str:tracking_code>/', OrderTrackingView.as_view(), name='order_tracking'),
+    path('metrics/', metrics_view, name='metrics'),
+    # Async versions of the catalog reads (same JSON as the viewsets above), for ASGI servers
+    path('api/async/products/', asyncviews.product_list, name='async_product_list'),
+    path('api/async/products/<str:slug>/', asyncviews.product_detail, name='async_product_detail'),
+    path('api/async/categories/', asyncviews.category_list, name='async_category_list'),
+    path('api/async/sliders/', asyncviews.slider_list, name='async_slider_list'),
+    path('api/async/home/', asyncviews.homepage, name='async_homepage'),
 ]
 
 # Serve media files in development
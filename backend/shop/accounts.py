@@ -0,0 +1,11 @@
+# shop/accounts.py
+
+from .models import UserProfile
+
+
+def get_profile(user):
+    # The profile (with its user, which UserProfileSerializer reads) in one query.
+    # Profiles are created on first access instead of by a User post_save signal,
+    # so registration is a single INSERT and saving a user never touches the profile.
+    profile, _ = UserProfile.objects.select_related('user').get_or_create(user_id=user.pk)
+    return profile
@@ -1,17 +1,28 @@
 # shop/admin.py
 
+import csv
+import itertools
+
 from django.contrib import admin
+from django.contrib.admin.helpers import ActionForm
 from django import forms
 from django.core.exceptions import ValidationError
 from django.forms.models import BaseInlineFormSet
 from django.contrib.auth.models import User # برای دسترسی به مدل کاربر جنگو
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.http import StreamingHttpResponse
+from django.utils import timezone
 
 from .models import (
     Category, Slider, Tag, Product, ProductBatch,
     Size, # این خط اضافه شد: import کردن مدل Size
     SizeQuantity, ProductVariant, Review,
-    UserProfile, Address, Cart, CartItem, Order, OrderItem, Coupon
+    UserProfile, Address, Cart, CartItem, Order, OrderItem, Coupon, CouponRedemption, Job,
+    DailyVariantSales, DailyCategorySales, ArchivedOrder, ArchivedOrderItem
 )
+from .coupons import generate_coupons
+from .orders import change_order_status, order_status_changed
 
 # ---------------------------------------------------------------------
 # اینلاین ها و فرم های مربوط به ProductBatch و ProductVariant
@@ -216,36 +227,76 @@ class OrderAdmin(admin.ModelAdmin):
     search_fields = ['user__username', 'tracking_code', 'id']
     date_hierarchy = 'order_date' # برای فیلتر بر اساس تاریخ
     inlines = [OrderItemInline]
-    readonly_fields = ['order_date', 'total_amount', 'tracking_code', 'shipping_cost', 'discount_amount'] # اینها توسط سیستم پر می شوند
+    readonly_fields = ['order_date', 'total_amount', 'tracking_code', 'shipping_cost', 'discount_amount', 'status_changed_at'] # اینها توسط سیستم پر می شوند
 
     # امکان تغییر وضعیت سفارش
-    actions = ['mark_as_paid', 'mark_as_processing', 'mark_as_shipped', 'mark_as_delivered', 'mark_as_cancelled']
+    actions = ['mark_as_paid', 'mark_as_processing', 'mark_as_shipped', 'mark_as_delivered', 'mark_as_cancelled', 'mark_as_refunded']
+
+    def save_model(self, request, obj, form, change):
+        # آمار فروش روزانه با تغییر وضعیت سفارش بروزرسانی می شود
+        with transaction.atomic():
+            old_status = Order.objects.filter(pk=obj.pk).values_list('status', flat=True).first() if change else obj.status
+            if old_status != obj.status:
+                obj.status_changed_at = timezone.now()
+            super().save_model(request, obj, form, change)
+            order_status_changed(obj, old_status)
 
     def mark_as_paid(self, request, queryset):
-        queryset.update(status='paid')
+        change_order_status(queryset, 'paid')
         self.message_user(request, "سفارشات انتخاب شده به وضعیت 'پرداخت شده' تغییر یافتند.")
     mark_as_paid.short_description = "علامت گذاری به عنوان پرداخت شده"
 
     def mark_as_processing(self, request, queryset):
-        queryset.update(status='processing')
+        change_order_status(queryset, 'processing')
         self.message_user(request, "سفارشات انتخاب شده به وضعیت 'در حال آماده‌سازی' تغییر یافتند.")
     mark_as_processing.short_description = "علامت گذاری به عنوان در حال آماده سازی"
 
     def mark_as_shipped(self, request, queryset):
-        queryset.update(status='shipped')
+        change_order_status(queryset, 'shipped')
         self.message_user(request, "سفارشات انتخاب شده به وضعیت 'ارسال شده' تغییر یافتند.")
     mark_as_shipped.short_description = "علامت گذاری به عنوان ارسال شده"
 
     def mark_as_delivered(self, request, queryset):
-        queryset.update(status='delivered')
+        change_order_status(queryset, 'delivered')
         self.message_user(request, "سفارشات انتخاب شده به وضعیت 'تحویل شده' تغییر یافتند.")
     mark_as_delivered.short_description = "علامت گذاری به عنوان تحویل شده"
 
     def mark_as_cancelled(self, request, queryset):
-        queryset.update(status='cancelled')
+        change_order_status(queryset, 'cancelled')
         self.message_user(request, "سفارشات انتخاب شده به وضعیت 'لغو شده' تغییر یافتند.")
     mark_as_cancelled.short_description = "علامت گذاری به عنوان لغو شده"
 
+    def mark_as_refunded(self, request, queryset):
+        change_order_status(queryset, 'refunded')
+        self.message_user(request, "سفارشات انتخاب شده به وضعیت 'بازگشت وجه' تغییر یافتند.")
+    mark_as_refunded.short_description = "علامت گذاری به عنوان بازگشت وجه"
+
+
+# سفارشات بایگانی شده فقط قابل مشاهده هستند
+class ArchivedOrderItemInline(admin.TabularInline):
+    model = ArchivedOrderItem
+    extra = 0
+    fields = ['product_name', 'color', 'size_name', 'quantity', 'price_at_order']
+    readonly_fields = fields
+    can_delete = False
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+@admin.register(ArchivedOrder)
+class ArchivedOrderAdmin(admin.ModelAdmin):
+    list_display = ['id', 'username', 'order_date', 'status', 'total_amount', 'shipping_method', 'tracking_code', 'archived_at']
+    list_filter = ['status', 'shipping_method']
+    search_fields = ['username', 'tracking_code', 'id']
+    date_hierarchy = 'order_date'
+    inlines = [ArchivedOrderItemInline]
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
 
 @admin.register(OrderItem)
 class OrderItemAdmin(admin.ModelAdmin):
@@ -254,12 +305,92 @@ class OrderItemAdmin(admin.ModelAdmin):
     search_fields = ['order__id', 'product_variant__product__name']
 
 
+class _Echo:
+    # File-like object for csv.writer that hands each row back instead of storing it
+    def write(self, value):
+        return value
+
+
+class CouponActionForm(ActionForm):
+    # Extra inputs of the generate_codes action, shown next to the action list
+    count = forms.IntegerField(required=False, min_value=1, max_value=1000000, label="تعداد کد")
+    campaign = forms.CharField(required=False, max_length=100, label="کمپین")
+    prefix = forms.CharField(required=False, max_length=20, label="پیشوند")
+
+
 @admin.register(Coupon)
 class CouponAdmin(admin.ModelAdmin):
-    list_display = ['code', 'discount_percentage', 'discount_amount', 'valid_from', 'valid_to', 'is_active', 'usage_limit', 'used_count']
-    list_filter = ['is_active', 'valid_from', 'valid_to']
-    search_fields = ['code']
+    list_display = ['code', 'campaign', 'discount_percentage', 'discount_amount', 'valid_from', 'valid_to', 'is_active', 'usage_limit', 'max_uses', 'used_count', 'user_count', 'total_discount']
+    list_filter = ['is_active', 'campaign', 'valid_from', 'valid_to']
+    search_fields = ['code', 'campaign']
     list_editable = ['is_active', 'usage_limit']
+    action_form = CouponActionForm
+    actions = ['generate_codes']
+
+    def generate_codes(self, request, queryset):
+        # Single-use codes with the settings of the selected coupon, downloaded as CSV while they are created
+        if queryset.count() != 1:
+            self.message_user(request, "برای ساخت کد دقیقا یک کوپن الگو انتخاب کنید.", level='error')
+            return None
+        form = CouponActionForm(request.POST)
+        form.fields['action'].choices = self.get_action_choices(request)
+        if not form.is_valid() or not form.cleaned_data['count'] or not form.cleaned_data['campaign']:
+            self.message_user(request, "تعداد کد و نام کمپین را وارد کنید.", level='error')
+            return None
+        template = queryset.get()
+        campaign = form.cleaned_data['campaign']
+        chunks = generate_coupons(
+            template, form.cleaned_data['count'], campaign,
+            prefix=form.cleaned_data['prefix'], overrides={'max_uses': 1},
+        )
+        try:
+            first = next(chunks, [])
+        except ValueError as e:
+            self.message_user(request, str(e), level='error')
+            return None
+
+        def rows():
+            writer = csv.writer(_Echo())
+            yield writer.writerow(['code', 'campaign'])
+            for codes in itertools.chain([first], chunks):
+                yield ''.join(writer.writerow([code, campaign]) for code in codes)
+
+        response = StreamingHttpResponse(rows(), content_type='text/csv')
+        response['Content-Disposition'] = f'attachment; filename="coupons-{template.pk}.csv"'
+        return response
+    generate_codes.short_description = "ساخت کدهای یکبار مصرف از روی این کوپن"
+
+    def get_queryset(self, request):
+        # Stats come from the redemption table, not from the orders
+        return super().get_queryset(request).annotate(
+            redemption_users=Count('redemptions__user', distinct=True),
+            redemption_discount=Sum('redemptions__discount_amount'),
+        )
+
+    def user_count(self, obj):
+        return obj.redemption_users
+    user_count.short_description = "تعداد کاربران"
+    user_count.admin_order_field = 'redemption_users'
+
+    def total_discount(self, obj):
+        return obj.redemption_discount or 0
+    total_discount.short_description = "مجموع تخفیف"
+    total_discount.admin_order_field = 'redemption_discount'
+
+
+@admin.register(CouponRedemption)
+class CouponRedemptionAdmin(admin.ModelAdmin):
+    list_display = ['coupon', 'user', 'order_id', 'discount_amount', 'redeemed_at']
+    list_select_related = ['coupon', 'user']
+    search_fields = ['coupon__code', 'user__username']
+    raw_id_fields = ['coupon', 'user', 'order']
+    date_hierarchy = 'redeemed_at'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
 
 
 # این بلاک اضافه شد: ثبت مدل Size در پنل ادمین
@@ -268,3 +399,47 @@ class SizeAdmin(admin.ModelAdmin):
     list_display = ('size', 'order')
     list_editable = ('order',) # امکان ویرایش ترتیب از لیست
     search_fields = ('size',)
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'task', 'queue', 'status', 'attempts', 'max_attempts', 'run_at', 'updated_at')
+    list_filter = ('status', 'queue', 'task')
+    search_fields = ('task', 'dedup_key')
+    readonly_fields = ('locked_by', 'locked_at', 'created_at', 'updated_at', 'last_error')
+    actions = ['retry_now']
+
+    def retry_now(self, request, queryset):
+        # Failed or waiting jobs are run again as soon as a worker is free
+        queryset.exclude(status=Job.STATUS_RUNNING).update(status=Job.STATUS_PENDING, run_at=timezone.now(), attempts=0)
+        self.message_user(request, "کارهای انتخاب شده دوباره در صف قرار گرفتند.")
+    retry_now.short_description = "اجرای مجدد"
+
+
+# ----------------------------------------------------
+# گزارش فروش (فقط از جداول خلاصه روزانه خوانده می شود)
+# ----------------------------------------------------
+
+class ReadOnlySalesAdmin(admin.ModelAdmin):
+    date_hierarchy = 'day'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+@admin.register(DailyCategorySales)
+class DailyCategorySalesAdmin(ReadOnlySalesAdmin):
+    list_display = ('day', 'category', 'units', 'gross', 'discount')
+    list_filter = ('category',)
+    list_select_related = ('category',)
+
+@admin.register(DailyVariantSales)
+class DailyVariantSalesAdmin(ReadOnlySalesAdmin):
+    list_display = ('day', 'product_variant', 'units', 'gross', 'discount')
+    list_select_related = ('product_variant__product', 'product_variant__size__size')
+    raw_id_fields = ('product_variant',)
@@ -4,3 +4,11 @@ from django.apps import AppConfig
 class ShopConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'shop'
+
+    def ready(self):
+        from . import tasks # Register background tasks
+        from . import coupons # Coupon cache invalidation
+        from . import authentication # User cache invalidation
+        from . import catalog # Catalog cache invalidation
+        from . import tracking # Order tracking cache invalidation
+        from . import querybudget # Query recording hook on every database connection
@@ -0,0 +1,137 @@
+# shop/archive.py
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Prefetch
+from django.utils import timezone
+
+from .models import ArchivedOrder, ArchivedOrderItem, Order, OrderItem
+from .routers import get_archive_database
+
+# Orders in these states are closed and can be archived
+ARCHIVE_STATUSES = ('delivered', 'cancelled', 'refunded')
+# Days an order stays in the hot tables after it was closed
+ORDER_ARCHIVE_AFTER_DAYS = getattr(settings, 'ORDER_ARCHIVE_AFTER_DAYS', 180)
+
+
+def _address_snapshot(address):
+    if address is None:
+        return None
+    return {
+        'id': address.id, 'user': address.user_id, 'province': address.province, 'city': address.city,
+        'street': address.street, 'postal_code': address.postal_code,
+        'recipient_name': address.recipient_name, 'recipient_phone_number': address.recipient_phone_number,
+        'description': address.description, 'is_default': address.is_default,
+    }
+
+
+def _archive_rows(orders):
+    archived_orders = []
+    archived_items = []
+    for order in orders:
+        items = list(order.items.all())
+        first_product = items[0].product_variant.product if items else None
+        archived_orders.append(ArchivedOrder(
+            id=order.id,
+            user_id=order.user_id,
+            username=order.user.username if order.user else '',
+            order_date=order.order_date,
+            total_amount=order.total_amount,
+            shipping_address=_address_snapshot(order.shipping_address),
+            shipping_method=order.shipping_method,
+            shipping_cost=order.shipping_cost,
+            discount_amount=order.discount_amount,
+            status=order.status,
+            status_changed_at=order.status_changed_at,
+            tracking_code=order.tracking_code,
+            coupon_used_code=order.coupon_used_code,
+            item_count=sum(item.quantity for item in items),
+            thumbnail=first_product.main_image.name if first_product and first_product.main_image else '',
+        ))
+        for item in items:
+            variant = item.product_variant
+            archived_items.append(ArchivedOrderItem(
+                id=item.id,
+                order_id=order.id,
+                product_variant_id=variant.id,
+                product_id=variant.product_id,
+                category_id=variant.product.category_id,
+                product_name=variant.product.name,
+                color=variant.color,
+                size_id=variant.size_id,
+                size_name=variant.size.size.size,
+                size_order=variant.size.size.order,
+                variant_price=variant.price,
+                quantity=item.quantity,
+                price_at_order=item.price_at_order,
+            ))
+    return archived_orders, archived_items
+
+
+def archive_orders(older_than_days=None, batch_size=500, limit=None):
+    # Move orders closed more than `older_than_days` ago to the archive tables, batch by batch.
+    # Each batch is written to the archive, keeping the original ids (rows already there are
+    # ignored, so an interrupted run can simply be repeated), and deleted from the hot tables.
+    if older_than_days is None:
+        older_than_days = ORDER_ARCHIVE_AFTER_DAYS
+    cutoff = timezone.now() - timedelta(days=older_than_days)
+    archive_db = get_archive_database()
+    candidates = Order.objects.filter(status__in=ARCHIVE_STATUSES, status_changed_at__lt=cutoff).order_by('pk')
+
+    archived = 0
+    while limit is None or archived < limit:
+        size = batch_size if limit is None else min(batch_size, limit - archived)
+        orders = list(
+            candidates.select_related('user', 'shipping_address').prefetch_related(
+                Prefetch('items', queryset=OrderItem.objects.select_related(
+                    'product_variant__product', 'product_variant__size__size'
+                ).order_by('id'))
+            )[:size]
+        )
+        if not orders:
+            break
+        order_ids = [order.id for order in orders]
+        archived_orders, archived_items = _archive_rows(orders)
+
+        # One transaction per batch, so an order is never in both places (and listed twice by
+        # CombinedOrderList). With a separate archive database the archive commits first: an
+        # interruption then leaves the batch in both until the next run, never in neither.
+        with transaction.atomic():
+            with transaction.atomic(using=archive_db):
+                ArchivedOrder.objects.using(archive_db).bulk_create(archived_orders, ignore_conflicts=True)
+                ArchivedOrderItem.objects.using(archive_db).bulk_create(archived_items, ignore_conflicts=True)
+            OrderItem.objects.filter(order_id__in=order_ids).delete()
+            Order.objects.filter(pk__in=order_ids).delete()
+        archived += len(orders)
+    return archived
+
+
+def get_archived_orders(user):
+    return ArchivedOrder.objects.filter(user=user).order_by('-order_date')
+
+
+class CombinedOrderList:
+    # A read-only, paginatable view over the hot orders and the archived orders of a user,
+    # newest first. A page only reads its rows (plus those before it) from each source.
+    ordered = True
+
+    def __init__(self, orders, archived_orders):
+        self.orders = orders
+        self.archived_orders = archived_orders
+
+    def count(self):
+        return self.orders.count() + self.archived_orders.count()
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        start, stop = index.start or 0, index.stop
+        orders = list(self.orders[:stop]) if stop is not None else list(self.orders)
+        archived_orders = list(self.archived_orders[:stop]) if stop is not None else list(self.archived_orders)
+        merged = sorted(orders + archived_orders, key=lambda order: order.order_date, reverse=True)
+        return merged[start:stop]
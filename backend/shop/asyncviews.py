@@ -0,0 +1,148 @@
+# shop/asyncviews.py
+
+import functools
+import math
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+from rest_framework.exceptions import APIException, MethodNotAllowed, NotFound
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.renderers import JSONRenderer
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from .catalog import CATALOG_CACHE_TIMEOUT, aget_catalog_cache_key, get_product_queryset
+from .compression import compress, get_encoding, is_compressible, set_encoded_content
+from .fastserializers import fast_serializer
+from .models import Category, Product, Slider
+from .renderers import ORJSONRenderer
+from .routers import read_replica
+from .serializers import CategorySerializer, ProductDetailSerializer, ProductListSerializer, SliderSerializer
+
+# Async (ASGI) versions of the catalog reads. They return the same JSON, byte for byte, as the
+# DRF viewsets (same querysets, serializers, pagination and renderer), but await the database
+# and the cache instead of holding a worker thread, and cache every rendered response (see
+# shop/catalog.py). Like the viewsets they read from the replica when one is configured.
+# They are public reads and, unlike the viewsets, not throttled.
+
+HOMEPAGE_PRODUCT_COUNT = getattr(settings, 'HOMEPAGE_PRODUCT_COUNT', 12)
+
+_renderer = ORJSONRenderer() if getattr(settings, 'FAST_JSON', False) else JSONRenderer()
+
+
+def _json_response(content, status=200):
+    return HttpResponse(content, status=status, content_type=_renderer.media_type)
+
+
+def catalog_view(view):
+    # GET/HEAD only. The view returns the data; its rendered JSON is cached per absolute URL
+    # (host and query string included) until the catalog changes, along with the same JSON
+    # compressed in each encoding asked for, so a response is compressed once, not per request.
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        try:
+            if request.method not in ('GET', 'HEAD'):
+                raise MethodNotAllowed(request.method)
+            key = await aget_catalog_cache_key(request.build_absolute_uri())
+            entry = await cache.aget(key) # {'identity': JSON, <encoding>: compressed JSON, ...}
+            changed = entry is None
+            if changed:
+                with read_replica():
+                    data = await view(request, *args, **kwargs)
+                entry = {'identity': _renderer.render(data)}
+        except APIException as e:
+            return _json_response(_renderer.render({'detail': e.detail}), e.status_code)
+
+        response = _json_response(entry['identity'])
+        if is_compressible(response):
+            patch_vary_headers(response, ('Accept-Encoding',))
+            encoding = get_encoding(request)
+            if encoding is not None:
+                if encoding not in entry:
+                    entry[encoding] = compress(entry['identity'], encoding, cached=True)
+                    changed = True
+                set_encoded_content(response, entry[encoding], encoding)
+        if changed:
+            await cache.aset(key, entry, CATALOG_CACHE_TIMEOUT)
+        return response
+    return wrapper
+
+
+async def paginate(request, queryset, serializer_class):
+    # PageNumberPagination's pages, links and response shape, counted and fetched with async queries
+    page_size = api_settings.PAGE_SIZE
+    count = await queryset.acount()
+    num_pages = max(1, math.ceil(count / page_size))
+    page_number = request.GET.get(PageNumberPagination.page_query_param, 1)
+    if page_number in PageNumberPagination.last_page_strings:
+        page_number = num_pages
+    try:
+        page_number = int(page_number)
+    except (TypeError, ValueError):
+        page_number = 0
+    if not 1 <= page_number <= num_pages:
+        raise NotFound(PageNumberPagination.invalid_page_message)
+
+    offset = (page_number - 1) * page_size
+    page = [obj async for obj in queryset[offset:offset + page_size]]
+
+    url = request.build_absolute_uri()
+    next_link = previous_link = None
+    if page_number < num_pages:
+        next_link = replace_query_param(url, PageNumberPagination.page_query_param, page_number + 1)
+    if page_number > 2:
+        previous_link = replace_query_param(url, PageNumberPagination.page_query_param, page_number - 1)
+    elif page_number == 2:
+        previous_link = remove_query_param(url, PageNumberPagination.page_query_param)
+    return {
+        'count': count,
+        'next': next_link,
+        'previous': previous_link,
+        'results': serializer_class(page, many=True, context={'request': request}).data,
+    }
+
+
+@catalog_view
+async def product_list(request):
+    # /api/async/products/[?category_slug=...], as ProductViewSet.list
+    queryset = get_product_queryset()
+    category_slug = request.GET.get('category_slug')
+    if category_slug:
+        queryset = queryset.filter(category__slug=category_slug)
+    return await paginate(request, queryset, fast_serializer(ProductListSerializer))
+
+
+@catalog_view
+async def product_detail(request, slug):
+    # /api/async/products/<slug>/, as ProductViewSet.retrieve
+    product = await get_product_queryset(detail=True).filter(slug=slug).afirst()
+    if product is None:
+        # get_object_or_404()'s message, as the viewset returns it
+        raise NotFound(f"No {Product._meta.object_name} matches the given query.")
+    return ProductDetailSerializer(product, context={'request': request}).data
+
+
+@catalog_view
+async def category_list(request):
+    return await paginate(request, Category.objects.all(), CategorySerializer)
+
+
+@catalog_view
+async def slider_list(request):
+    return await paginate(request, Slider.objects.all(), SliderSerializer)
+
+
+@catalog_view
+async def homepage(request):
+    # Everything the home page shows, in one request: active sliders and categories and the newest products
+    context = {'request': request}
+    sliders = [slider async for slider in Slider.objects.filter(is_active=True)]
+    categories = [category async for category in Category.objects.filter(is_active=True)]
+    products = [product async for product in get_product_queryset()[:HOMEPAGE_PRODUCT_COUNT]]
+    return {
+        'sliders': SliderSerializer(sliders, many=True, context=context).data,
+        'categories': CategorySerializer(categories, many=True, context=context).data,
+        'products': fast_serializer(ProductListSerializer)(products, many=True, context=context).data,
+    }
@@ -0,0 +1,171 @@
+# shop/authentication.py
+
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils.functional import SimpleLazyObject, empty
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+User = get_user_model()
+
+# Seconds a loaded user stays in the per-process cache; saving or deleting the user drops it
+# from the cache of the process that did it (other processes keep it until it expires)
+USER_CACHE_TTL = getattr(settings, 'USER_CACHE_TTL', 60)
+
+# User attributes that MyTokenObtainPairSerializer.get_token puts in the token
+CLAIM_ATTRIBUTES = ('username', 'email', 'first_name', 'last_name')
+
+# Attributes a loaded User has that its class doesn't
+_INSTANCE_ATTRIBUTES = {'_state'} | {field.attname for field in User._meta.concrete_fields}
+
+
+class UserCache:
+    # Per-process cache of user rows. Stores field values, not instances, so every request
+    # gets its own User object (related objects cached on one request don't leak to another).
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._rows = {}
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        with self._lock:
+            entry = self._rows.get(user_id)
+        if entry is None:
+            return None
+        expires_at, db, names, values = entry
+        if expires_at <= time.monotonic():
+            self.invalidate(user_id)
+            return None
+        return User.from_db(db, names, values)
+
+    def load(self, user_id, fresh=False):
+        # From the cache, or (always with `fresh`) from the database, refreshing the cache
+        user = None if fresh else self.get(user_id)
+        if user is None:
+            user = User.objects.filter(**{api_settings.USER_ID_FIELD: user_id}).first()
+            if user is not None:
+                self.set(user_id, user)
+            else:
+                self.invalidate(user_id)
+        return user
+
+    def set(self, user_id, user):
+        names = [field.attname for field in User._meta.concrete_fields]
+        entry = (time.monotonic() + self.ttl, user._state.db, names, [getattr(user, name) for name in names])
+        with self._lock:
+            self._rows[user_id] = entry
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._rows.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._rows.clear()
+
+
+user_cache = UserCache(USER_CACHE_TTL)
+
+
+def _load_user(user_id, fresh=False):
+    user = user_cache.load(user_id, fresh)
+    if user is None:
+        raise AuthenticationFailed("User not found", code="user_not_found")
+    if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+        raise AuthenticationFailed("User is inactive", code="user_inactive")
+    return user
+
+
+class TokenClaimsUser(SimpleLazyObject):
+    # request.user built from the token: the id and the profile claims are read from the token,
+    # anything else (is_staff, profile, cart, ...) loads the real User on first access.
+    # Passes isinstance(..., User) and can be used in queries (filter(user=request.user))
+    # without loading, since Django only reads the id for those.
+    _meta = User._meta
+    is_authenticated = True
+    is_anonymous = False
+
+    def __init__(self, token):
+        user_id = User._meta.pk.to_python(token[api_settings.USER_ID_CLAIM])
+        super().__init__(lambda: _load_user(user_id))
+        self.__dict__['token'] = token
+        self.__dict__['_user_id'] = user_id
+
+    @property
+    def __class__(self):
+        return User
+
+    @property
+    def pk(self):
+        return self._user_id
+
+    @property
+    def id(self):
+        return self._user_id
+
+    def __getattr__(self, name):
+        if self._wrapped is empty:
+            if name in CLAIM_ATTRIBUTES and name in self.token:
+                return self.token[name]
+            # Probes like hasattr(user, 'resolve_expression') in the ORM must not load the row
+            if not hasattr(User, name) and name not in _INSTANCE_ATTRIBUTES:
+                raise AttributeError(name)
+        return super().__getattr__(name)
+
+    def _is_pk_set(self, meta=None):
+        return True
+
+    def __bool__(self):
+        return True
+
+    def __eq__(self, other):
+        if isinstance(other, User):
+            return self._user_id == other.pk
+        return NotImplemented
+
+    def __hash__(self):
+        return hash(self._user_id)
+
+
+class StatelessJWTAuthentication(JWTAuthentication):
+    # Like JWTAuthentication, without the per-request user query on reads: a user in the
+    # per-process cache is returned as is, otherwise request.user is a TokenClaimsUser that
+    # only loads the row when a view needs more than the token carries. Requests that change
+    # something (unsafe methods) always load the user, so a deleted or deactivated user can't
+    # write once the change is committed.
+    # Reads are checked less often: a cached user is served for up to USER_CACHE_TTL seconds
+    # after it was deactivated in another process, and a read that only needs the id from the
+    # token (e.g. the own order list) works until the access token expires
+    # (SIMPLE_JWT['ACCESS_TOKEN_LIFETIME']).
+    def authenticate(self, request):
+        result = super().authenticate(request)
+        if result is None or request.method in SAFE_METHODS:
+            return result
+        user, validated_token = result
+        return _load_user(user.pk, fresh=True), validated_token
+
+    def get_user(self, validated_token):
+        try:
+            user_id = User._meta.pk.to_python(validated_token[api_settings.USER_ID_CLAIM])
+        except KeyError as e:
+            raise InvalidToken("Token contained no recognizable user identification") from e
+
+        user = user_cache.get(user_id)
+        if user is None:
+            return TokenClaimsUser(validated_token)
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed("User is inactive", code="user_inactive")
+        return user
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_user(sender, instance, **kwargs):
+    user_cache.invalidate(instance.pk)
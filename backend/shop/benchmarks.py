@@ -0,0 +1,480 @@
+# shop/benchmarks.py
+
+import asyncio
+import io
+import multiprocessing
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.db import OperationalError, connection, connections, transaction
+from django.db.utils import load_backend
+from django.test import RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIClient
+from rest_framework.throttling import AnonRateThrottle
+
+from .catalog import get_product_queryset
+from .checkout import place_order
+from .fastserializers import compile_serializer
+from .metrics import MetricsRegistry
+from .models import (
+    Address, Category, Product, ProductBatch, Size, SizeQuantity, ProductVariant, Cart, CartItem, Order, OrderItem, Tag
+)
+from .renderers import ORJSONRenderer
+from .serializers import ProductListSerializer
+from .throttling import AnonBucketThrottle, get_throttle_store
+from .views import CartViewSet
+
+
+class _Rollback(Exception):
+    pass
+
+
+def run_isolated(func, *args, **kwargs):
+    # Benchmarks create their own data; everything is rolled back afterwards
+    # so they can be run against the real database.
+    result = None
+    try:
+        with transaction.atomic():
+            result = func(*args, **kwargs)
+            raise _Rollback
+    except _Rollback:
+        pass
+    return result
+
+
+def build_variants(count, stock=1000, using='default'):
+    # A small catalog with `count` purchasable variants, created with bulk inserts
+    tag = uuid.uuid4().hex[:8]
+    category = Category.objects.using(using).create(name=f"bench-{tag}")
+    size = Size.objects.using(using).create(size=f"B-{tag}"[:20])
+    products = Product.objects.using(using).bulk_create([
+        Product(name=f"bench {i}", slug=f"bench-{tag}-{i}", category=category) for i in range(count)
+    ])
+    batches = ProductBatch.objects.using(using).bulk_create([
+        ProductBatch(product=product, color="black", total_quantity=stock) for product in products
+    ])
+    size_quantities = SizeQuantity.objects.using(using).bulk_create([
+        SizeQuantity(product_batch=batch, size=size, quantity=stock, price=100000) for batch in batches
+    ])
+    return ProductVariant.objects.using(using).bulk_create([
+        ProductVariant(product=product, size=sq, color="black", price=100000, stock=stock, online_stock=stock)
+        for product, sq in zip(products, size_quantities)
+    ])
+
+
+def _summary(timings):
+    timings = sorted(timings)
+    return {
+        'median_ms': round(statistics.median(timings) * 1000, 2),
+        'p95_ms': round(timings[min(len(timings) - 1, int(len(timings) * 0.95))] * 1000, 2),
+    }
+
+
+def bench_checkout(sizes=(1, 5, 20, 50), repeat=5):
+    # Checkout latency and query count as a function of the number of cart lines
+    def run():
+        variants = build_variants(max(sizes))
+        user = User.objects.create_user(f"bench-{uuid.uuid4().hex[:8]}")
+        cart, _ = Cart.objects.get_or_create(user=user)
+        results = []
+        for size in sizes:
+            timings = []
+            queries = 0
+            for _ in range(repeat):
+                CartItem.objects.bulk_create([
+                    CartItem(cart=cart, product_variant=variant, quantity=1, price_at_addition=variant.price)
+                    for variant in variants[:size]
+                ])
+                with CaptureQueriesContext(connection) as captured:
+                    start = time.perf_counter()
+                    place_order(user, shipping_method='post_office')
+                    timings.append(time.perf_counter() - start)
+                queries = len(captured.captured_queries)
+            results.append({'cart_size': size, 'queries': queries, **_summary(timings)})
+        return results
+
+    return run_isolated(run)
+
+
+def bench_throttle(sizes=(1, 100, 10000), repeat=5):
+    # Cost of one throttle check with DRF's cache throttle (list of timestamps per client, in the
+    # per-process cache) and with the shared token bucket store (one SQLite UPSERT), for a number
+    # of distinct client addresses sharing 5000 requests.
+    factory = RequestFactory()
+    results = []
+    with tempfile.TemporaryDirectory() as directory, \
+            override_settings(THROTTLE_STORE_PATH=os.path.join(directory, 'throttle.sqlite3')):
+        for size in sizes:
+            requests = [
+                Request(factory.get('/', REMOTE_ADDR=f"10.{i // 65536 % 256}.{i // 256 % 256}.{i % 256}"))
+                for i in range(size)
+            ]
+            row = {'clients': size}
+            for name, throttle_class in (('cache', AnonRateThrottle), ('bucket', AnonBucketThrottle)):
+                timings = []
+                for _ in range(repeat):
+                    cache.clear()
+                    start = time.perf_counter()
+                    for i in range(5000):
+                        throttle_class().allow_request(requests[i % size], None)
+                    timings.append((time.perf_counter() - start) / 5000)
+                row[f'{name}_us'] = round(statistics.median(timings) * 1e6, 1)
+            results.append(row)
+    return results
+
+
+# Alias of the throwaway database bench_db_concurrency runs on, and the tables it needs: the
+# product list read, and a checkout-like transaction that reads stock before writing (the
+# pattern that makes deferred SQLite transactions fail with "database is locked" when two of
+# them try to upgrade to a write lock at once)
+BENCH_DATABASE = 'bench'
+_DB_MODELS = (User, Address, Category, Tag, Product, ProductBatch, Size, SizeQuantity, ProductVariant, Order, OrderItem)
+
+
+def _bench_connection(path, profile):
+    # A connection to the SQLite file at `path` under the BENCH_DATABASE alias, with Django's
+    # default settings or with the production profile's options
+    database = {
+        **connections['default'].settings_dict,
+        'NAME': path,
+        'CONN_MAX_AGE': 0,
+        'CONN_HEALTH_CHECKS': False,
+        'OPTIONS': dict(settings.SQLITE_PRODUCTION_OPTIONS) if profile == 'production' else {},
+    }
+    connections[BENCH_DATABASE] = load_backend(database['ENGINE']).DatabaseWrapper(database, BENCH_DATABASE)
+    return connections[BENCH_DATABASE]
+
+
+def _create_bench_database(path, variants=1000):
+    connection = _bench_connection(path, 'default')
+    with connection.schema_editor() as editor:
+        for model in _DB_MODELS:
+            editor.create_model(model)
+    build_variants(variants, stock=1000000, using=BENCH_DATABASE)
+    # Forked workers must not share the connection
+    connection.close()
+
+
+def _db_worker(path, profile, operations, write_ratio, seed, results):
+    rng = random.Random(seed)
+    connection = _bench_connection(path, profile)
+    variants = ProductVariant.objects.using(BENCH_DATABASE)
+    variant_ids = list(variants.values_list('pk', flat=True))
+    timings, errors = [], 0
+    for _ in range(operations):
+        start = time.perf_counter()
+        try:
+            if rng.random() < write_ratio:
+                with transaction.atomic(using=BENCH_DATABASE):
+                    variant = variants.get(pk=rng.choice(variant_ids))
+                    variants.filter(pk=variant.pk).update(stock=variant.stock - 1)
+                    order, = Order.objects.using(BENCH_DATABASE).bulk_create([Order(total_amount=variant.price)])
+                    OrderItem.objects.using(BENCH_DATABASE).bulk_create([
+                        OrderItem(order=order, product_variant=variant, quantity=1, price_at_order=variant.price)
+                    ])
+            else:
+                offset = rng.randrange(len(variant_ids) - 20)
+                list(get_product_queryset().using(BENCH_DATABASE)[offset:offset + 20])
+        except OperationalError:
+            errors += 1
+            continue
+        timings.append(time.perf_counter() - start)
+    connection.close()
+    results.put((timings, errors))
+
+
+def bench_db_concurrency(sizes=(1, 4, 8), repeat=1, operations=300, write_ratio=0.2):
+    # Throughput, latency and "database is locked" errors of concurrent worker processes on
+    # one SQLite file, with Django's default connection settings and with the production
+    # profile of settings.py (WAL, tuned pragmas, BEGIN IMMEDIATE).
+    results = []
+    for workers in sizes:
+        for profile in ('default', 'production'):
+            for attempt in range(repeat):
+                with tempfile.TemporaryDirectory() as directory:
+                    path = os.path.join(directory, 'bench.sqlite3')
+                    _create_bench_database(path)
+
+                    queue = multiprocessing.Queue()
+                    processes = [
+                        multiprocessing.Process(
+                            target=_db_worker, args=(path, profile, operations, write_ratio, worker, queue)
+                        )
+                        for worker in range(workers)
+                    ]
+                    start = time.perf_counter()
+                    for process in processes:
+                        process.start()
+                    outcomes = [queue.get() for _ in processes]
+                    for process in processes:
+                        process.join()
+                    elapsed = time.perf_counter() - start
+
+                timings = [timing for worker_timings, _ in outcomes for timing in worker_timings]
+                results.append({
+                    'workers': workers,
+                    'profile': profile,
+                    'ops_per_s': round(len(timings) / elapsed),
+                    'errors': sum(errors for _, errors in outcomes),
+                    **(_summary(timings) if timings else {}),
+                })
+    return results
+
+
+def bench_metrics(sizes=(1, 50, 500), repeat=5):
+    # Per request cost of recording the metrics, and the cost of one flush to the shared store,
+    # for a number of distinct views (each view is ~16 series)
+    results = []
+    with tempfile.TemporaryDirectory() as directory, \
+            override_settings(METRICS_STORE_PATH=os.path.join(directory, 'metrics.sqlite3')):
+        for size in sizes:
+            record_timings = []
+            flush_timings = []
+            for _ in range(repeat):
+                registry = MetricsRegistry()
+                start = time.perf_counter()
+                for i in range(10000):
+                    registry.observe_request(f"View{i % size}.list", 'GET', 200, (i % 100) / 1000, 5, 0.001)
+                    registry.observe_cache(1, 0)
+                record_timings.append((time.perf_counter() - start) / 10000)
+                start = time.perf_counter()
+                registry.flush()
+                flush_timings.append(time.perf_counter() - start)
+            results.append({
+                'views': size,
+                'record_us': round(statistics.median(record_timings) * 1e6, 1),
+                'flush_ms': round(statistics.median(flush_timings) * 1000, 2),
+            })
+    return results
+
+
+BENCH_HOST = 'testserver'
+
+
+class _InFlight:
+    # Requests a worker is serving at the same time, and the most it served at once
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.current = 0
+        self.peak = 0
+
+    def __enter__(self):
+        with self.lock:
+            self.current += 1
+            self.peak = max(self.peak, self.current)
+
+    def __exit__(self, *exc_info):
+        with self.lock:
+            self.current -= 1
+
+
+def _run_wsgi(paths, clients, threads, client_delay):
+    # One WSGI worker with `threads` threads; each client sends its requests one after another.
+    # Writing the response to a slow client holds the worker's thread.
+    handler = WSGIHandler()
+    in_flight = _InFlight()
+    statuses = []
+
+    def request(path, address):
+        path, _, query = path.partition('?')
+        environ = {
+            'REQUEST_METHOD': 'GET', 'SCRIPT_NAME': '', 'PATH_INFO': path, 'QUERY_STRING': query,
+            'SERVER_NAME': BENCH_HOST, 'SERVER_PORT': '80', 'SERVER_PROTOCOL': 'HTTP/1.1', 'HTTP_HOST': BENCH_HOST,
+            'REMOTE_ADDR': address, 'wsgi.version': (1, 0), 'wsgi.url_scheme': 'http', 'wsgi.input': io.BytesIO(),
+            'wsgi.errors': sys.stderr, 'wsgi.multithread': True, 'wsgi.multiprocess': True, 'wsgi.run_once': False,
+        }
+        with in_flight:
+            response = handler(environ, lambda status, headers, exc_info=None: statuses.append(int(status[:3])))
+            b''.join(response)
+            response.close()
+            time.sleep(client_delay)
+
+    def client(number, worker):
+        for path in paths[number::clients]:
+            worker.submit(request, path, f"10.0.{number // 256 % 256}.{number % 256}").result()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as worker, ThreadPoolExecutor(max_workers=clients) as client_threads:
+        list(client_threads.map(client, range(clients), [worker] * clients))
+    return time.perf_counter() - start, statuses, in_flight.peak
+
+
+async def _asgi_request(application, path, address, client_delay, in_flight, statuses):
+    path, _, query = path.partition('?')
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET', 'scheme': 'http',
+        'path': path, 'raw_path': path.encode(), 'query_string': query.encode(), 'root_path': '',
+        'headers': [(b'host', BENCH_HOST.encode())], 'client': (address, 50000), 'server': (BENCH_HOST, 80),
+    }
+    body_sent = False
+
+    async def receive():
+        nonlocal body_sent
+        if not body_sent:
+            body_sent = True
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        await asyncio.Event().wait() # The client stays connected; Django stops listening once it has responded
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            statuses.append(message['status'])
+        elif not message.get('more_body'):
+            await asyncio.sleep(client_delay) # Writing to a slow client waits, without holding a thread
+
+    with in_flight:
+        await application(scope, receive, send)
+
+
+def _run_asgi(paths, clients, client_delay):
+    # One ASGI worker (an event loop); each client sends its requests one after another
+    application = ASGIHandler()
+    in_flight = _InFlight()
+    statuses = []
+
+    async def client(number):
+        for path in paths[number::clients]:
+            await _asgi_request(
+                application, path, f"10.1.{number // 256 % 256}.{number % 256}", client_delay, in_flight, statuses
+            )
+
+    async def run():
+        await asyncio.gather(*(client(number) for number in range(clients)))
+
+    start = time.perf_counter()
+    asyncio.run(run())
+    return time.perf_counter() - start, statuses, in_flight.peak
+
+
+def bench_asgi(sizes=(1, 10, 50, 200), repeat=5, threads=4, client_delay=0.05):
+    # Requests per second and the most connections served at once by one worker, for `sizes`
+    # concurrent clients each reading `repeat` product list pages slowly (client_delay seconds
+    # per response): the DRF viewset under WSGI (a worker with `threads` threads) against the
+    # async view under ASGI, with a cold cache (a distinct URL per request) and cached.
+    # Uses the catalog in the database; a small one is created (and removed) if it is empty.
+    created = None
+    if not Product.objects.filter(is_active=True).exists():
+        created = build_variants(20)
+    try:
+        with tempfile.TemporaryDirectory() as directory, override_settings(
+            ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, BENCH_HOST],
+            THROTTLE_STORE_PATH=os.path.join(directory, 'throttle.sqlite3'),
+            METRICS_STORE_PATH=os.path.join(directory, 'metrics.sqlite3'),
+        ):
+            results = []
+            for clients in sizes:
+                count = clients * repeat
+                row = {'clients': clients}
+                runs = (
+                    ('wsgi', lambda: _run_wsgi(
+                        [f"/api/products/?bench={i}" for i in range(count)], clients, threads, client_delay
+                    )),
+                    ('asgi', lambda: _run_asgi(
+                        [f"/api/async/products/?bench={i}" for i in range(count)], clients, client_delay
+                    )),
+                    ('asgi_cached', lambda: _run_asgi(['/api/async/products/'] * count, clients, client_delay)),
+                )
+                for name, run in runs:
+                    cache.clear()
+                    elapsed, statuses, peak = run()
+                    row[f'{name}_rps'] = round(count / elapsed, 1)
+                    row[f'{name}_peak'] = peak
+                    row[f'{name}_errors'] = sum(1 for status in statuses if status >= 400)
+                results.append(row)
+            return results
+    finally:
+        if created:
+            category = created[0].product.category
+            Product.objects.filter(category=category).delete()
+            category.delete()
+            created[0].size.size.delete()
+
+
+def bench_json(sizes=(10, 50, 200), repeat=5, requests=200):
+    # The JSON fast path (FAST_JSON) against DRF's: time to serialize and render `size` listed
+    # products, and requests per second one thread (so one core) serves for GET /api/cart/ with
+    # `size` lines, the whole request included (middleware, auth, queries).
+    def run():
+        variants = build_variants(max(sizes))
+        tags = Tag.objects.bulk_create([Tag(name=f"bench {i}", slug=f"bench-{uuid.uuid4().hex[:8]}") for i in range(3)])
+        for variant in variants:
+            variant.product.tags.add(*tags)
+        user = User.objects.create_user(f"bench-{uuid.uuid4().hex[:8]}")
+        cart = Cart.objects.create(user=user)
+        client = APIClient()
+        client.force_authenticate(user)
+        context = {'request': RequestFactory().get('/api/products/')}
+        category = variants[0].product.category
+
+        def render_list(products, serializer_class, renderer):
+            return renderer.render(serializer_class(products, many=True, context=context).data)
+
+        def cart_rps(fast):
+            # The viewsets' renderers are picked at startup from FAST_JSON; swap them for the run
+            renderer_classes = CartViewSet.renderer_classes
+            CartViewSet.renderer_classes = [ORJSONRenderer if fast else JSONRenderer]
+            try:
+                with override_settings(FAST_JSON=fast):
+                    get_throttle_store().reset()
+                    client.get('/api/cart/')
+                    start = time.perf_counter()
+                    for _ in range(requests):
+                        client.get('/api/cart/')
+                    return requests / (time.perf_counter() - start)
+            finally:
+                CartViewSet.renderer_classes = renderer_classes
+
+        results = []
+        for size in sizes:
+            products = list(get_product_queryset().filter(category=category)[:size])
+            CartItem.objects.filter(cart=cart).delete()
+            CartItem.objects.bulk_create([
+                CartItem(cart=cart, product_variant=variant, quantity=1, price_at_addition=variant.price)
+                for variant in variants[:size]
+            ])
+            row = {'size': size}
+            for name, serializer_class, renderer in (
+                ('drf', ProductListSerializer, JSONRenderer()),
+                ('fast', compile_serializer(ProductListSerializer), ORJSONRenderer()),
+            ):
+                timings = []
+                for _ in range(repeat):
+                    start = time.perf_counter()
+                    render_list(products, serializer_class, renderer)
+                    timings.append(time.perf_counter() - start)
+                row[f'list_{name}_ms'] = round(statistics.median(timings) * 1000, 2)
+            row['cart_drf_rps'] = round(statistics.median(cart_rps(False) for _ in range(repeat)), 1)
+            row['cart_fast_rps'] = round(statistics.median(cart_rps(True) for _ in range(repeat)), 1)
+            results.append(row)
+        return results
+
+    with tempfile.TemporaryDirectory() as directory, override_settings(
+        ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, BENCH_HOST],
+        THROTTLE_STORE_PATH=os.path.join(directory, 'throttle.sqlite3'),
+        METRICS_STORE_PATH=os.path.join(directory, 'metrics.sqlite3'),
+    ):
+        return run_isolated(run)
+
+
+SCENARIOS = {
+    'checkout': bench_checkout,
+    'throttle': bench_throttle,
+    'db_concurrency': bench_db_concurrency,
+    'metrics': bench_metrics,
+    'asgi': bench_asgi,
+    'json': bench_json,
+}
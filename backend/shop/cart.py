@@ -0,0 +1,201 @@
+# shop/cart.py
+
+from decimal import Decimal
+
+from django.db import transaction
+from django.utils import timezone
+from rest_framework import serializers
+from rest_framework.exceptions import NotFound
+
+from .models import Cart, CartItem, ProductVariant
+
+
+def get_cart_total(cart):
+    # Cart total after product discounts, computed with a single query
+    return sum(
+        (item.get_total_item_price() for item in cart.items.select_related('product_variant__product')),
+        Decimal(0)
+    )
+
+
+def _adjustment(variant, requested, quantity, reason):
+    return {'product_variant_id': variant.id, 'requested': requested, 'quantity': quantity, 'reason': reason}
+
+
+def merge_guest_cart(user, session_key):
+    # Merge the guest (session) cart into the user's cart in bulk.
+    # Quantities of matching variants are summed and capped at online_stock,
+    # prices are recalculated with the product discount, and the guest cart is removed.
+    # The number of queries does not depend on the number of items.
+    # Returns the cart and the guest lines that didn't make it as they were: dropped
+    # (reason 'unavailable': inactive product or no online stock; quantity 0) or cut
+    # down to the stock (reason 'stock'), with the quantity asked for and the one kept.
+    adjustments = []
+    if not session_key:
+        return None, adjustments
+
+    with transaction.atomic():
+        guest_items = list(
+            CartItem.objects.filter(cart__session_key=session_key, cart__user__isnull=True)
+            .select_related('product_variant__product')
+        )
+        if not guest_items:
+            # Nothing to merge; drop the empty guest cart if there is one
+            Cart.objects.filter(session_key=session_key, user__isnull=True).delete()
+            return None, adjustments
+
+        cart, created = Cart.objects.get_or_create(user=user)
+        existing = {} if created else {
+            item.product_variant_id: item
+            for item in cart.items.filter(product_variant_id__in=[i.product_variant_id for i in guest_items])
+        }
+
+        to_create = []
+        to_update = []
+        for guest_item in guest_items:
+            variant = guest_item.product_variant
+            if not variant.product.is_active or variant.online_stock <= 0:
+                adjustments.append(_adjustment(variant, guest_item.quantity, 0, 'unavailable'))
+                continue
+            price = variant.get_discounted_price()
+            user_item = existing.get(variant.id)
+            requested = guest_item.quantity + (user_item.quantity if user_item else 0)
+            quantity = min(requested, variant.online_stock)
+            if quantity < requested:
+                adjustments.append(_adjustment(variant, requested, quantity, 'stock'))
+            if user_item is None:
+                to_create.append(CartItem(
+                    cart=cart, product_variant=variant, quantity=quantity, price_at_addition=price,
+                ))
+            else:
+                user_item.quantity = quantity
+                user_item.price_at_addition = price
+                to_update.append(user_item)
+
+        if to_update:
+            CartItem.objects.bulk_update(to_update, ['quantity', 'price_at_addition'])
+        if to_create:
+            CartItem.objects.bulk_create(to_create)
+
+        # Guest items are removed together with their cart (CASCADE)
+        Cart.objects.filter(session_key=session_key, user__isnull=True).delete()
+        Cart.objects.filter(pk=cart.pk).update(updated_at=timezone.now())
+
+    return cart, adjustments
+
+
+CART_OPERATIONS = ('add', 'update', 'remove', 'clear')
+
+
+def _parse_quantity(value, allow_zero=False):
+    try:
+        quantity = int(value)
+    except (TypeError, ValueError):
+        raise serializers.ValidationError({"quantity": "تعداد باید یک عدد صحیح باشد."})
+    if quantity < 0 or (quantity == 0 and not allow_zero):
+        raise serializers.ValidationError({"quantity": "تعداد باید بزرگتر از صفر باشد."})
+    return quantity
+
+
+def _to_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def apply_cart_operations(cart, operations):
+    # Apply a list of add/update/remove/clear operations to the cart.
+    # All lines and variants are loaded once, the operations are replayed in memory,
+    # stock is validated against the final quantities and the result is written with
+    # bulk statements in a single transaction. Nothing is written if any operation is invalid.
+    if not isinstance(operations, list) or not operations:
+        raise serializers.ValidationError({"operations": "لیست عملیات لازم است."})
+
+    with transaction.atomic():
+        items = {item.id: item for item in cart.items.all()}
+        quantities = {item.product_variant_id: item.quantity for item in items.values()}
+        item_variants = {item_id: item.product_variant_id for item_id, item in items.items()}
+
+        variant_ids = set(quantities)
+        for operation in operations:
+            if not isinstance(operation, dict) or operation.get('op') not in CART_OPERATIONS:
+                raise serializers.ValidationError({"operations": "نوع عملیات نامعتبر است."})
+            if operation['op'] == 'add':
+                if not operation.get('product_variant_id'):
+                    raise serializers.ValidationError({"operations": "شناسه تنوع محصول لازم است."})
+                try:
+                    variant_ids.add(int(operation['product_variant_id']))
+                except (TypeError, ValueError):
+                    raise NotFound("تنوع محصول یافت نشد.")
+
+        variants = ProductVariant.objects.select_related('product').in_bulk(variant_ids)
+
+        touched = set()
+        for operation in operations:
+            op = operation['op']
+            if op == 'clear':
+                quantities = {}
+                continue
+            if op == 'add':
+                variant = variants.get(int(operation['product_variant_id']))
+                if variant is None:
+                    raise NotFound("تنوع محصول یافت نشد.")
+                quantity = _parse_quantity(operation.get('quantity', 1))
+                quantities[variant.id] = quantities.get(variant.id, 0) + quantity
+                touched.add(variant.id)
+                continue
+
+            # update/remove address existing cart lines by cart_item_id
+            variant_id = item_variants.get(_to_int(operation.get('cart_item_id')))
+            if variant_id is None or variant_id not in quantities:
+                raise NotFound("آیتم سبد خرید یافت نشد.")
+            if op == 'remove':
+                del quantities[variant_id]
+                continue
+            if 'quantity' not in operation:
+                raise serializers.ValidationError({"quantity": "تعداد لازم است."})
+            quantity = _parse_quantity(operation['quantity'], allow_zero=True)
+            if quantity == 0:
+                del quantities[variant_id]
+            else:
+                quantities[variant_id] = quantity
+                touched.add(variant_id)
+
+        # Only lines changed by this batch are validated and repriced
+        touched &= set(quantities)
+        for variant_id in touched:
+            variant = variants[variant_id]
+            if not variant.product.is_active:
+                raise serializers.ValidationError({"detail": "محصول مربوط به این تنوع فعال نیست."})
+            if variant.online_stock < quantities[variant_id]:
+                raise serializers.ValidationError({
+                    "detail": f"موجودی آنلاین برای این تنوع محصول کافی نیست. موجودی فعلی: {variant.online_stock}"
+                })
+
+        existing = {item.product_variant_id: item for item in items.values()}
+        to_delete = [item.id for variant_id, item in existing.items() if variant_id not in quantities]
+        to_update = []
+        to_create = []
+        for variant_id in touched:
+            price = variants[variant_id].get_discounted_price()
+            item = existing.get(variant_id)
+            if item is None:
+                to_create.append(CartItem(
+                    cart=cart, product_variant_id=variant_id,
+                    quantity=quantities[variant_id], price_at_addition=price,
+                ))
+            else:
+                item.quantity = quantities[variant_id]
+                item.price_at_addition = price
+                to_update.append(item)
+
+        if to_delete:
+            CartItem.objects.filter(id__in=to_delete).delete()
+        if to_update:
+            CartItem.objects.bulk_update(to_update, ['quantity', 'price_at_addition'])
+        if to_create:
+            CartItem.objects.bulk_create(to_create)
+        Cart.objects.filter(pk=cart.pk).update(updated_at=timezone.now())
+
+    return cart
@@ -0,0 +1,56 @@
+# shop/catalog.py
+
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Prefetch
+from django.db.models.signals import m2m_changed, post_delete, post_save
+
+from .models import Category, Product, ProductBatch, ProductVariant, Review, SizeQuantity, Slider, Tag
+
+# Seconds a rendered catalog response (shop/asyncviews.py) stays cached. Saving any catalog row
+# invalidates them at once in this process; other processes (with the per-process default cache)
+# and stock changes made with UPDATE queries (checkout) catch up after this long.
+CATALOG_CACHE_TIMEOUT = getattr(settings, 'CATALOG_CACHE_TIMEOUT', 60)
+CATALOG_CACHE_PREFIX = 'catalog:'
+CATALOG_VERSION_KEY = 'catalog-version'
+
+# Models whose changes show up in catalog responses
+CATALOG_MODELS = (Category, Slider, Tag, Product, ProductBatch, SizeQuantity, ProductVariant, Review)
+
+
+def get_product_queryset(detail=False):
+    # Active products with every relation ProductListSerializer reads, or with `detail`
+    # everything ProductDetailSerializer reads, loaded up front
+    queryset = Product.objects.filter(is_active=True).select_related('category').prefetch_related('tags')
+    if not detail:
+        return queryset.prefetch_related('variants')
+    return queryset.prefetch_related(
+        Prefetch('variants', queryset=ProductVariant.objects.select_related('size__size')),
+        Prefetch('batches__size_quantities', queryset=SizeQuantity.objects.select_related('size')),
+        Prefetch(
+            'reviews', queryset=Review.objects.filter(is_approved=True).select_related('user'),
+            to_attr='approved_reviews'
+        ),
+    )
+
+
+async def aget_catalog_cache_key(url):
+    # Keys include the catalog version, so bumping it drops every cached response at once
+    version = await cache.aget(CATALOG_VERSION_KEY)
+    if version is None:
+        await cache.aadd(CATALOG_VERSION_KEY, time.time_ns(), None)
+        version = await cache.aget(CATALOG_VERSION_KEY)
+    return f"{CATALOG_CACHE_PREFIX}{version}:{hashlib.md5(url.encode()).hexdigest()}"
+
+
+def invalidate_catalog_cache(sender=None, **kwargs):
+    cache.set(CATALOG_VERSION_KEY, time.time_ns(), None)
+
+
+for model in CATALOG_MODELS:
+    post_save.connect(invalidate_catalog_cache, sender=model, dispatch_uid=f'catalog-save-{model.__name__}')
+    post_delete.connect(invalidate_catalog_cache, sender=model, dispatch_uid=f'catalog-delete-{model.__name__}')
+m2m_changed.connect(invalidate_catalog_cache, sender=Product.tags.through, dispatch_uid='catalog-product-tags')
@@ -0,0 +1,112 @@
+# shop/checkout.py
+
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Case, F, PositiveIntegerField, When
+from django.utils import timezone
+from rest_framework import serializers
+
+from .jobs import enqueue
+from .coupons import evaluate_coupon, redeem_coupon
+from .models import Cart, CartItem, Order, OrderItem, ProductVariant
+from .sales import record_order
+from .tasks import send_order_confirmation
+from .tracking import generate_tracking_code
+
+# Shipping cost per Order.SHIPPING_METHOD_CHOICES key (Toman)
+SHIPPING_COSTS = getattr(settings, 'SHIPPING_COSTS', {})
+
+
+def get_shipping_cost(shipping_method):
+    return Decimal(SHIPPING_COSTS.get(shipping_method, 0))
+
+
+def _create_order(**fields):
+    # Tracking codes are random; on the (very unlikely) collision with an existing code try another one
+    for attempt in range(5):
+        try:
+            with transaction.atomic():
+                return Order.objects.create(tracking_code=generate_tracking_code(), **fields)
+        except IntegrityError:
+            if attempt == 4:
+                raise
+
+
+def place_order(user, coupon_code=None, **order_data):
+    # Turn the user's cart into an order with a fixed number of statements:
+    # one read of the cart lines (with variants and products), then the order insert, the coupon redemption,
+    # one bulk insert of order items, one UPDATE for all stock changes, the sales rollups
+    # and one DELETE for the cart lines, all in a single transaction.
+    shipping_method = order_data.get('shipping_method') or 'free_delivery'
+
+    with transaction.atomic():
+        cart_items = list(
+            CartItem.objects.filter(cart__user=user).select_related('product_variant__product')
+        )
+        if not cart_items:
+            raise serializers.ValidationError("سبد خرید شما خالی است و نمی‌توانید سفارش ثبت کنید.")
+
+        subtotal = Decimal(0)
+        lines = []
+        for cart_item in cart_items:
+            variant = cart_item.product_variant
+            if not variant.product.is_active:
+                raise serializers.ValidationError(f"محصول {variant.product.name} دیگر فعال نیست.")
+            if variant.online_stock < cart_item.quantity:
+                raise serializers.ValidationError(
+                    f"موجودی آنلاین برای {variant.product.name} کافی نیست. موجودی فعلی: {variant.online_stock}"
+                )
+            unit_price = variant.get_discounted_price()
+            subtotal += unit_price * cart_item.quantity
+            lines.append((variant, cart_item.quantity, unit_price))
+
+        coupon = None
+        discount_amount = Decimal(0)
+        if coupon_code:
+            coupon, discount_amount = evaluate_coupon(coupon_code, subtotal)
+            coupon_code = coupon.code
+
+        shipping_cost = get_shipping_cost(shipping_method)
+        order = _create_order(
+            user=user,
+            total_amount=subtotal - discount_amount + shipping_cost,
+            shipping_cost=shipping_cost,
+            discount_amount=discount_amount,
+            coupon_used_code=coupon_code or None,
+            **order_data,
+        )
+        if coupon is not None:
+            redeem_coupon(coupon, user, order, discount_amount)
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product_variant=variant, quantity=quantity, price_at_order=unit_price)
+            for variant, quantity, unit_price in lines
+        ])
+
+        # online_stock is a PositiveIntegerField, so the CHECK (online_stock >= 0) constraint
+        # rejects the update if a concurrent order took the stock after our read.
+        try:
+            with transaction.atomic():
+                ProductVariant.objects.filter(id__in=[variant.id for variant, _, _ in lines]).update(
+                    online_stock=Case(
+                        *[When(id=variant.id, then=F('online_stock') - quantity) for variant, quantity, _ in lines],
+                        default=F('online_stock'),
+                        output_field=PositiveIntegerField(),
+                    )
+                )
+        except IntegrityError:
+            raise serializers.ValidationError("موجودی یکی از محصولات سبد خرید در این فاصله به پایان رسید.")
+
+        record_order(order, [
+            (variant.id, variant.product.category_id, quantity, unit_price)
+            for variant, quantity, unit_price in lines
+        ])
+
+        CartItem.objects.filter(id__in=[cart_item.id for cart_item in cart_items]).delete()
+        Cart.objects.filter(user=user).update(updated_at=timezone.now())
+
+        # Runs after commit, so a rolled back order never sends a confirmation
+        enqueue(send_order_confirmation, args=[order.id])
+
+    return order
@@ -0,0 +1,107 @@
+# shop/compression.py
+
+import gzip
+import re
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.middleware.gzip import GZipMiddleware
+from django.utils.cache import patch_vary_headers
+from django.utils.text import compress_string
+
+try:
+    import brotli
+except ImportError: # Optional; without it responses are gzipped only
+    brotli = None
+
+# Our preference among the encodings a client accepts equally
+ENCODINGS = ('br', 'gzip') if brotli is not None else ('gzip',)
+
+_COMPRESSIBLE_TYPES = re.compile(r'^(text/|application/(json|javascript|xml)|image/svg\+xml)')
+
+
+def is_compressible(response):
+    # Responses under COMPRESSION_MIN_SIZE bytes go out as they are: the saving doesn't pay for the work
+    return (
+        not response.streaming and not response.has_header('Content-Encoding')
+        and len(response.content) >= getattr(settings, 'COMPRESSION_MIN_SIZE', 1024)
+        and _COMPRESSIBLE_TYPES.match(response.get('Content-Type', '')) is not None
+    )
+
+
+def get_encoding(request):
+    # The encoding of ENCODINGS the request's Accept-Encoding rates highest, or None
+    accepted = {}
+    for item in request.headers.get('Accept-Encoding', '').split(','):
+        name, *params = item.split(';')
+        quality = 1.0
+        for param in params:
+            key, _, value = param.partition('=')
+            if key.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        accepted[name.strip().lower()] = quality
+    best, best_quality = None, 0.0
+    for encoding in ENCODINGS:
+        quality = accepted.get(encoding, accepted.get('*', 0.0))
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def compress(content, encoding, cached=False):
+    # `cached` content is compressed once and served many times, so it gets the slowest, smallest
+    # compression. Otherwise gzip gets GZipMiddleware's random padding against BREACH (brotli has
+    # nowhere to put it; Django masks its CSRF tokens per response anyway).
+    if encoding == 'br':
+        return brotli.compress(content, quality=11 if cached else 5)
+    if cached:
+        return gzip.compress(content, compresslevel=9, mtime=0)
+    return compress_string(content, max_random_bytes=GZipMiddleware.max_random_bytes)
+
+
+def set_encoded_content(response, content, encoding):
+    # Sends `content` (the response's content, compressed) instead, if it is smaller
+    if len(content) >= len(response.content):
+        return response
+    response.content = content
+    response.headers['Content-Length'] = str(len(content))
+    response.headers['Content-Encoding'] = encoding
+    # A strong ETag names the uncompressed bytes (RFC 9110 8.8.1)
+    etag = response.get('ETag')
+    if etag and etag.startswith('"'):
+        response.headers['ETag'] = 'W/' + etag
+    return response
+
+
+class CompressionMiddleware:
+    # GZipMiddleware with brotli (when installed), a size threshold (COMPRESSION_MIN_SIZE) and
+    # only textual content types. Responses that come compressed already, such as the cached
+    # catalog responses (see shop/asyncviews.py), are left alone. Streaming responses (the admin's
+    # CSV exports) aren't compressed. Runs sync under WSGI and async under ASGI.
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self.finish(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        return self.finish(request, await self.get_response(request))
+
+    def finish(self, request, response):
+        if not is_compressible(response):
+            return response
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encoding = get_encoding(request)
+        if encoding is None:
+            return response
+        return set_encoded_content(response, compress(response.content, encoding), encoding)
@@ -0,0 +1,164 @@
+# shop/coupons.py
+
+import secrets
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F, Max, Q, Sum
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+from rest_framework import serializers
+
+from .models import Coupon, CouponRedemption
+
+# Seconds a coupon looked up by code stays cached. The usage counter in the cached copy may be
+# slightly behind; it is only used for stats, the per-user limit is counted in the database.
+COUPON_CACHE_TIMEOUT = getattr(settings, 'COUPON_CACHE_TIMEOUT', 300)
+COUPON_CACHE_PREFIX = 'coupon:'
+_MISSING = 'missing' # Cached for unknown codes, so repeated invalid codes don't hit the database
+
+# Characters of generated codes; similar looking characters (0/O, 1/I/L) are left out
+COUPON_CODE_ALPHABET = getattr(settings, 'COUPON_CODE_ALPHABET', '23456789ABCDEFGHJKMNPQRSTUVWXYZ')
+COUPON_CODE_LENGTH = getattr(settings, 'COUPON_CODE_LENGTH', 10)
+
+
+def normalize_code(code):
+    return (code or '').strip().upper()
+
+
+def _cache_key(code):
+    return f"{COUPON_CACHE_PREFIX}{normalize_code(code)}"
+
+
+def get_coupon(code):
+    # Case-insensitive lookup by code, cached
+    key = _cache_key(code)
+    coupon = cache.get(key)
+    if coupon is None:
+        coupon = Coupon.objects.filter(code__iexact=normalize_code(code)).first() or _MISSING
+        cache.set(key, coupon, COUPON_CACHE_TIMEOUT)
+    return None if coupon == _MISSING else coupon
+
+
+def get_user_redemption_count(coupon, user):
+    # Indexed count on (coupon, user)
+    return CouponRedemption.objects.filter(coupon_id=coupon.pk, user_id=user.pk).count()
+
+
+def validate_coupon(coupon, cart_total, user=None):
+    # Same rules as Coupon.is_valid, plus the minimum cart amount and (for a logged in user)
+    # the per-user usage limit, with a message per failed rule
+    errors = {}
+    now = timezone.now()
+    if not coupon.is_active:
+        errors['is_active'] = "کوپن غیرفعال است."
+    if now < coupon.valid_from:
+        errors['valid_from'] = "کوپن هنوز فعال نشده است."
+    if now > coupon.valid_to:
+        errors['valid_to'] = "کوپن منقضی شده است."
+    if coupon.max_uses is not None and coupon.used_count >= coupon.max_uses:
+        errors['max_uses'] = "ظرفیت استفاده از کوپن به پایان رسیده است."
+    if user is not None and user.is_authenticated and get_user_redemption_count(coupon, user) >= coupon.usage_limit:
+        errors['usage_limit'] = "محدودیت استفاده از کوپن به پایان رسیده است."
+    if cart_total < coupon.min_cart_amount:
+        errors['min_cart_amount'] = f"حداقل مبلغ سبد خرید برای این کوپن {coupon.min_cart_amount} تومان است."
+    return errors
+
+
+def evaluate_coupon(code, cart_total, user=None):
+    # Returns (coupon, discount) for a valid code or raises ValidationError;
+    # cart_total is computed once by the caller
+    coupon = get_coupon(code)
+    if coupon is None:
+        raise serializers.ValidationError({"coupon_code": "کوپن نامعتبر یا غیرفعال است."})
+    errors = validate_coupon(coupon, cart_total, user)
+    if errors:
+        raise serializers.ValidationError(errors)
+    return coupon, min(coupon.get_discount_value(cart_total), cart_total)
+
+
+def redeem_coupon(coupon, user, order, discount_amount):
+    # Record one use of the coupon by the user. Must run inside the checkout transaction so
+    # a failed order gives the use back. The counter UPDATE comes first: it locks the coupon
+    # row until commit, so concurrent checkouts of the same coupon count the user's
+    # redemptions one after another and can't exceed the limit together.
+    updated = Coupon.objects.filter(
+        Q(max_uses__isnull=True) | Q(used_count__lt=F('max_uses')), pk=coupon.pk, is_active=True
+    ).update(used_count=F('used_count') + 1)
+    if not updated:
+        raise serializers.ValidationError({"max_uses": "ظرفیت استفاده از کوپن به پایان رسیده است."})
+    if get_user_redemption_count(coupon, user) >= coupon.usage_limit:
+        raise serializers.ValidationError({"usage_limit": "محدودیت استفاده از کوپن به پایان رسیده است."})
+    CouponRedemption.objects.create(coupon_id=coupon.pk, user=user, order=order, discount_amount=discount_amount)
+
+
+def get_redemption_stats(coupons=None):
+    # Per coupon: total uses, distinct users, total discount and last use, from the redemption table
+    rows = CouponRedemption.objects.all()
+    if coupons is not None:
+        rows = rows.filter(coupon__in=coupons)
+    return rows.values('coupon_id', 'coupon__code').annotate(
+        redemptions=Count('id'),
+        users=Count('user_id', distinct=True),
+        total_discount=Sum('discount_amount'),
+        last_redeemed_at=Max('redeemed_at'),
+    ).order_by('-redemptions')
+
+
+# Settings copied from the template coupon to generated codes
+GENERATED_COUPON_FIELDS = (
+    'discount_percentage', 'discount_amount', 'valid_from', 'valid_to', 'is_active',
+    'usage_limit', 'max_uses', 'min_cart_amount', 'max_discount_amount',
+)
+
+
+def generate_coupons(template, count, campaign, prefix='', length=COUPON_CODE_LENGTH,
+                     alphabet=COUPON_CODE_ALPHABET, chunk_size=1000, overrides=None):
+    # Create `count` coupons with random codes and the settings of `template` under `campaign`
+    # (required), yielding the codes created by each chunk. The existing codes are loaded once
+    # and new codes are checked against that set in memory. Each chunk is one transaction: a
+    # SELECT of its codes that were created since (by another run, maybe of the same campaign),
+    # then one INSERT of the rest. SQLite runs one write transaction at a time (see DATABASES in
+    # settings.py), so exactly those are created by this call; only taken codes are generated again.
+    if not campaign:
+        raise ValueError("campaign is required")
+    prefix = normalize_code(prefix)
+    alphabet = ''.join(dict.fromkeys(normalize_code(alphabet)))
+    if len(alphabet) < 2 or length < 1:
+        raise ValueError("the alphabet needs at least two characters and the length must be positive")
+    if len(prefix) + length > Coupon._meta.get_field('code').max_length:
+        raise ValueError("prefix and length are longer than a coupon code can be")
+
+    existing = {code.upper() for code in Coupon.objects.values_list('code', flat=True).iterator()}
+    # Keep the code space mostly empty so random codes rarely hit an existing one
+    if (len(existing) + count) * 2 > len(alphabet) ** length:
+        raise ValueError("not enough distinct codes for this alphabet and length")
+
+    fields = {name: getattr(template, name) for name in GENERATED_COUPON_FIELDS}
+    fields.update(overrides or {})
+    rng = secrets.SystemRandom()
+    remaining = count
+    while remaining:
+        codes = []
+        while len(codes) < min(chunk_size, remaining):
+            code = prefix + ''.join(rng.choices(alphabet, k=length))
+            if code not in existing:
+                existing.add(code)
+                codes.append(code)
+        with transaction.atomic():
+            taken = set(Coupon.objects.filter(code__in=codes).values_list('code', flat=True))
+            created = [code for code in codes if code not in taken]
+            Coupon.objects.bulk_create([Coupon(code=code, campaign=campaign, used_count=0, **fields) for code in created])
+        remaining -= len(created)
+        # bulk_create sends no post_save; drop "unknown code" markers of earlier lookups
+        cache.delete_many([_cache_key(code) for code in created])
+        yield created
+
+
+@receiver(post_save, sender=Coupon)
+@receiver(post_delete, sender=Coupon)
+def invalidate_coupon_cache(sender, instance, **kwargs):
+    cache.delete(_cache_key(instance.code))
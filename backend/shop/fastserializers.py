@@ -0,0 +1,182 @@
+# shop/fastserializers.py
+
+import datetime
+import functools
+
+from django.conf import settings
+from django.core.exceptions import ObjectDoesNotExist
+from django.db.models import Manager
+from django.utils import timezone
+from rest_framework import ISO_8601, fields, relations, serializers
+from rest_framework.fields import SkipField, get_attribute
+from rest_framework.relations import PKOnlyObject
+from rest_framework.settings import api_settings
+
+# Read-only serializers "compiled" from DRF ones for the hot responses (product lists, the cart).
+# A DRF serializer works out on every object which fields it has and how each one reads and
+# formats its value; compile_serializer() does that once per serializer class and keeps, per
+# field, the attribute path and a formatter picked for its type, then builds the same dicts
+# (same keys, order and values, so the same JSON) straight from the instances. The formatting
+# that needs care (decimals, datetimes) is still DRF's own, and method fields call the
+# serializer's methods. Only output: there is no validation or saving.
+# Enabled with FAST_JSON (see settings.py); see fast_serializer().
+
+_STRING_FIELDS = (fields.CharField, fields.SlugField, fields.EmailField, fields.URLField)
+
+
+def fast_serializer(serializer_class):
+    # serializer_class compiled with FAST_JSON, else itself; used the same way either way
+    if getattr(settings, 'FAST_JSON', False):
+        return compile_serializer(serializer_class)
+    return serializer_class
+
+
+@functools.lru_cache(maxsize=None)
+def compile_serializer(serializer_class):
+    return CompiledSerializer(serializer_class)
+
+
+class CompiledSerializer:
+    def __init__(self, serializer_class):
+        if serializer_class.to_representation is not serializers.Serializer.to_representation:
+            raise TypeError(f"{serializer_class.__name__} has its own to_representation()")
+        self.serializer_class = serializer_class
+        # Bound once to a serializer without a request; nothing below reads its context
+        template = serializer_class(context={})
+        self.fields = [
+            (field.field_name, self._getter(field), self._formatter(field))
+            for field in template._readable_fields
+        ]
+
+    def __call__(self, instance=None, many=False, context=None, **kwargs):
+        # Same call as the DRF serializer's for output: serializer(instance, many=.., context=..).data
+        return _Output(self, instance, many, context or {})
+
+    def represent(self, instance, output):
+        # Serializer.to_representation(), field by field
+        data = {}
+        for name, getter, formatter in self.fields:
+            try:
+                value = getter(instance)
+            except SkipField:
+                continue
+            if value is None or (type(value) is PKOnlyObject and value.pk is None):
+                data[name] = None
+            else:
+                data[name] = formatter(value, output)
+        return data
+
+    def _getter(self, field):
+        if field.source == '*':
+            # Method fields (and source='*' ones) get the instance itself
+            return lambda instance: instance
+        if isinstance(field, relations.RelatedField):
+            # The id only (PKOnlyObject), from the foreign key column
+            return field.get_attribute
+        source_attrs = field.source_attrs
+
+        def getter(instance):
+            # Plain attribute lookups; DRF's get_attribute() for anything else (mappings,
+            # methods and related managers to call, ...)
+            try:
+                value = instance
+                for attr in source_attrs:
+                    value = getattr(value, attr)
+                    if callable(value):
+                        return get_attribute(instance, source_attrs)
+                return value
+            except ObjectDoesNotExist:
+                return None
+            except (KeyError, AttributeError):
+                # Missing along the way (e.g. a guest cart's user.username): DRF decides,
+                # returning a default or None, leaving the key out, or raising
+                return field.get_attribute(instance)
+        return getter
+
+    def _formatter(self, field):
+        # formatter(value, output) -> field.to_representation(value), without DRF's per call dispatch
+        if isinstance(field, serializers.SerializerMethodField):
+            method = getattr(self.serializer_class, field.method_name)
+            serializer_class = self.serializer_class
+            return lambda value, output: method(output.serializer(serializer_class), value)
+        if isinstance(field, serializers.ListSerializer):
+            child = compile_serializer(type(field.child))
+            return lambda value, output: [
+                child.represent(item, output) for item in (value.all() if isinstance(value, Manager) else value)
+            ]
+        if isinstance(field, serializers.BaseSerializer):
+            return compile_serializer(type(field)).represent
+        if isinstance(field, relations.PrimaryKeyRelatedField) and field.pk_field is None:
+            return lambda value, output: value.pk
+        if isinstance(field, (relations.RelatedField, relations.ManyRelatedField)):
+            raise TypeError(f"{self.serializer_class.__name__}.{field.field_name}: {type(field).__name__} is not supported")
+        if isinstance(field, fields.FileField):
+            return self._file_formatter(field)
+        if type(field) in _STRING_FIELDS:
+            return lambda value, output: value if type(value) is str else str(value)
+        if type(field) is fields.IntegerField:
+            return lambda value, output: int(value)
+        if type(field) is fields.BooleanField:
+            return lambda value, output: value if type(value) is bool else field.to_representation(value)
+        if type(field) is fields.DecimalField and field.decimal_places is not None:
+            # Quantized, so equal decimals format the same; prices repeat a lot
+            to_representation = functools.lru_cache(maxsize=1024)(field.to_representation)
+            return lambda value, output: to_representation(value)
+        if (type(field) is fields.DateTimeField and not hasattr(field, 'timezone')
+                and getattr(field, 'format', api_settings.DATETIME_FORMAT).lower() == ISO_8601):
+            return self._datetime_formatter(field)
+        # The rest: DRF's formatting as is (none of them reads the context)
+        return lambda value, output: field.to_representation(value)
+
+    def _datetime_formatter(self, field):
+        # DateTimeField.to_representation() in ISO 8601 with the response's time zone, looked up
+        # once per response rather than per value
+        def formatter(value, output):
+            if output.timezone is None or type(value) is not datetime.datetime or value.utcoffset() is None:
+                return field.to_representation(value)
+            try:
+                value = value.astimezone(output.timezone).isoformat()
+            except OverflowError:
+                return field.to_representation(value)
+            return value[:-6] + 'Z' if value.endswith('+00:00') else value
+        return formatter
+
+    def _file_formatter(self, field):
+        # FileField.to_representation() with this response's request
+        if not getattr(field, 'use_url', api_settings.UPLOADED_FILES_USE_URL):
+            return lambda value, output: value.name if value else None
+
+        def formatter(value, output):
+            if not value:
+                return None
+            try:
+                url = value.url
+            except AttributeError:
+                return None
+            request = output.context.get('request')
+            return request.build_absolute_uri(url) if request is not None else url
+        return formatter
+
+
+class _Output:
+    def __init__(self, compiled, instance, many, context):
+        self.compiled = compiled
+        self.instance = instance
+        self.many = many
+        self.context = context
+        self.timezone = timezone.get_current_timezone() if settings.USE_TZ else None
+        self._serializers = {}
+
+    def serializer(self, serializer_class):
+        # The DRF serializer whose methods the method fields call, one per class per response
+        serializer = self._serializers.get(serializer_class)
+        if serializer is None:
+            serializer = self._serializers[serializer_class] = serializer_class(context=self.context)
+        return serializer
+
+    @property
+    def data(self):
+        if self.many:
+            instances = self.instance.all() if isinstance(self.instance, Manager) else self.instance
+            return [self.compiled.represent(instance, self) for instance in instances]
+        return self.compiled.represent(self.instance, self)
@@ -0,0 +1,135 @@
+# shop/idempotency.py
+
+import hashlib
+import json
+import time
+from datetime import timedelta
+from functools import wraps
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+
+# How long a stored response is replayed for retries of the same key
+IDEMPOTENCY_KEY_TTL = getattr(settings, 'IDEMPOTENCY_KEY_TTL', timedelta(hours=24))
+IDEMPOTENCY_POLL_INTERVAL = 0.1
+
+
+def _lock_timeout():
+    # Seconds a duplicate request waits for the first attempt before giving up with 409
+    return getattr(settings, 'IDEMPOTENCY_LOCK_TIMEOUT', 10)
+
+
+def _lock_ttl():
+    # How long an attempt holds its key without answering. An older claim belongs to an attempt
+    # that died (worker killed mid-request); its key is free again. Keep it above the slowest request.
+    return getattr(settings, 'IDEMPOTENCY_LOCK_TTL', timedelta(minutes=2))
+
+
+def _get_scope(request):
+    # Keys are only unique per user (or per guest session)
+    if request.user.is_authenticated:
+        return f"user:{request.user.pk}"
+    if not request.session.session_key:
+        request.session.create()
+    return f"session:{request.session.session_key}"
+
+
+def _get_fingerprint(request):
+    body = json.dumps(request.data, sort_keys=True, default=str)
+    return hashlib.sha256(f"{request.method}:{request.path}:{body}".encode()).hexdigest()
+
+
+def _claim(scope, key, fingerprint):
+    # Insert the key as "in progress". The unique (scope, key) constraint makes sure
+    # only one of several concurrent attempts wins; the others get the existing row.
+    now = timezone.now()
+    while True:
+        try:
+            with transaction.atomic():
+                record = IdempotencyKey.objects.create(
+                    scope=scope, key=key, request_fingerprint=fingerprint,
+                    claimed_at=now, expires_at=now + IDEMPOTENCY_KEY_TTL,
+                )
+            return record, True
+        except IntegrityError:
+            record = IdempotencyKey.objects.filter(scope=scope, key=key).first()
+            if record is None:
+                continue # Deleted in the meantime (failed first attempt), try again
+            if record.expires_at <= now:
+                IdempotencyKey.objects.filter(pk=record.pk).delete()
+                continue
+            if record.response_status is None and record.claimed_at <= now - _lock_ttl():
+                # Abandoned in progress: take it over, unless another retry just did
+                reclaimed = IdempotencyKey.objects.filter(
+                    pk=record.pk, response_status__isnull=True, claimed_at=record.claimed_at
+                ).update(request_fingerprint=fingerprint, claimed_at=now, expires_at=now + IDEMPOTENCY_KEY_TTL)
+                if reclaimed:
+                    record.request_fingerprint, record.claimed_at = fingerprint, now
+                    return record, True
+                continue
+            return record, False
+
+
+def _owned(record):
+    # The key's row while this attempt still holds it (not taken over as abandoned)
+    return IdempotencyKey.objects.filter(pk=record.pk, claimed_at=record.claimed_at, response_status__isnull=True)
+
+
+def _wait_for_response(record):
+    deadline = time.monotonic() + _lock_timeout()
+    while record is not None and record.response_status is None and time.monotonic() < deadline:
+        time.sleep(IDEMPOTENCY_POLL_INTERVAL)
+        record = IdempotencyKey.objects.filter(pk=record.pk).first()
+    return record
+
+
+def idempotent(view_method):
+    # Decorator for viewset actions: a request with an Idempotency-Key header runs the view once
+    # and stores its response; retries with the same key replay the stored response.
+    @wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        key = request.headers.get(IDEMPOTENCY_HEADER)
+        if not key:
+            return view_method(self, request, *args, **kwargs)
+        if len(key) > 255:
+            return Response({"detail": "کلید یکتایی درخواست بیش از حد طولانی است."}, status=status.HTTP_400_BAD_REQUEST)
+
+        scope = _get_scope(request)
+        fingerprint = _get_fingerprint(request)
+        record, created = _claim(scope, key, fingerprint)
+
+        if not created:
+            if record.request_fingerprint != fingerprint:
+                return Response({"detail": "این کلید یکتایی قبلاً برای درخواست دیگری استفاده شده است."}, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+            record = _wait_for_response(record)
+            if record is None or record.response_status is None:
+                return Response({"detail": "درخواست دیگری با همین کلید یکتایی در حال پردازش است."}, status=status.HTTP_409_CONFLICT)
+            response = Response(record.response_body, status=record.response_status)
+            response['Idempotent-Replayed'] = 'true'
+            return response
+
+        try:
+            response = view_method(self, request, *args, **kwargs)
+        except Exception:
+            # Release the key so that a retry can run the view again
+            _owned(record).delete()
+            raise
+
+        if response.status_code >= 500:
+            _owned(record).delete()
+            return response
+
+        # Store the data exactly as it will be rendered (Decimals, dates, ...)
+        body = json.loads(JSONRenderer().render(response.data)) if response.data is not None else None
+        _owned(record).update(response_status=response.status_code, response_body=body)
+        return response
+
+    return wrapper
@@ -0,0 +1,225 @@
+# shop/jobs.py
+
+import logging
+import os
+import random
+import socket
+import threading
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+# Number of worker threads per queue, e.g. {'default': 2, 'notifications': 1}
+TASK_QUEUES = getattr(settings, 'TASK_QUEUES', {'default': 1})
+# Retry delay is TASK_RETRY_BASE_DELAY * 2 ** (attempt - 1) seconds, capped at TASK_RETRY_MAX_DELAY
+TASK_RETRY_BASE_DELAY = getattr(settings, 'TASK_RETRY_BASE_DELAY', 10)
+TASK_RETRY_MAX_DELAY = getattr(settings, 'TASK_RETRY_MAX_DELAY', 3600)
+# A running job whose worker has not reported for this many seconds is taken to be dead: the job
+# is run again, or fails if it is out of attempts
+TASK_STALE_AFTER = getattr(settings, 'TASK_STALE_AFTER', 600)
+# How often (seconds) a worker renews locked_at of the job it is running
+TASK_HEARTBEAT_INTERVAL = getattr(settings, 'TASK_HEARTBEAT_INTERVAL', TASK_STALE_AFTER / 5)
+
+_registry = {}
+
+
+def task(name=None, queue='default', max_attempts=5):
+    # Register a function as a background task:
+    #
+    #     @task(queue='notifications')
+    #     def send_order_confirmation(order_id): ...
+    #
+    #     enqueue(send_order_confirmation, args=[order.id])
+    def decorator(func):
+        func.task_name = name or f"{func.__module__}.{func.__name__}"
+        func.queue = queue
+        func.max_attempts = max_attempts
+        _registry[func.task_name] = func
+        return func
+    return decorator
+
+
+def get_task(name):
+    return _registry[name]
+
+
+def enqueue(func, args=(), kwargs=None, run_at=None, delay=None, dedup_key=None, queue=None):
+    # Queue a task to run after the current transaction commits (immediately if there is none),
+    # so workers never see rows that may still be rolled back.
+    # A job with the same dedup_key that is still pending or running is not queued again.
+    if run_at is None:
+        run_at = timezone.now() + timedelta(seconds=delay or 0)
+    job = Job(
+        queue=queue or func.queue,
+        task=func.task_name,
+        args=list(args),
+        kwargs=kwargs or {},
+        run_at=run_at,
+        max_attempts=func.max_attempts,
+        dedup_key=dedup_key,
+    )
+    transaction.on_commit(lambda: Job.objects.bulk_create([job], ignore_conflicts=dedup_key is not None))
+
+
+def get_retry_delay(attempts):
+    delay = min(TASK_RETRY_BASE_DELAY * 2 ** (attempts - 1), TASK_RETRY_MAX_DELAY)
+    return timedelta(seconds=delay * random.uniform(0.8, 1.2))
+
+
+def claim_next_job(queue, worker_id):
+    # Pick the oldest due job of the queue. The conditional UPDATE makes sure that
+    # a job is claimed by exactly one worker even if several see it as pending.
+    now = timezone.now()
+    candidates = Job.objects.filter(
+        queue=queue, status=Job.STATUS_PENDING, run_at__lte=now
+    ).order_by('run_at', 'id').values_list('pk', flat=True)[:5]
+    for pk in candidates:
+        claimed = Job.objects.filter(pk=pk, status=Job.STATUS_PENDING).update(
+            status=Job.STATUS_RUNNING, locked_by=worker_id, locked_at=now, attempts=F('attempts') + 1
+        )
+        if claimed:
+            return Job.objects.get(pk=pk)
+    return None
+
+
+def _owned(job):
+    # The job's row while this attempt still holds it; after requeue_stale_jobs() gave it up
+    # (or another worker claimed it again) the attempt's updates don't apply
+    return Job.objects.filter(pk=job.pk, status=Job.STATUS_RUNNING, locked_by=job.locked_by, attempts=job.attempts)
+
+
+def heartbeat(job):
+    return _owned(job).update(locked_at=timezone.now())
+
+
+class _Heartbeat:
+    # Renews locked_at every TASK_HEARTBEAT_INTERVAL seconds while the job runs, so a job that is
+    # merely slow is never taken for one whose worker died
+    def __init__(self, job):
+        self.job = job
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+
+    def __exit__(self, *exc_info):
+        self.stop_event.set()
+        self.thread.join()
+
+    def _run(self):
+        try:
+            while not self.stop_event.wait(TASK_HEARTBEAT_INTERVAL):
+                heartbeat(self.job)
+        except Exception:
+            logger.exception("Heartbeat of job %s failed", self.job.pk)
+        finally:
+            connection.close()
+
+
+def execute_job(job):
+    try:
+        func = get_task(job.task)
+        with _Heartbeat(job):
+            func(*job.args, **job.kwargs)
+    except Exception:
+        error = traceback.format_exc()
+        if job.attempts >= job.max_attempts:
+            logger.error("Job %s (%s) failed permanently:\n%s", job.pk, job.task, error)
+            _owned(job).update(status=Job.STATUS_FAILED, last_error=error, locked_at=None)
+        else:
+            logger.warning("Job %s (%s) failed, attempt %s of %s", job.pk, job.task, job.attempts, job.max_attempts)
+            _owned(job).update(
+                status=Job.STATUS_PENDING, last_error=error, locked_by='', locked_at=None,
+                run_at=timezone.now() + get_retry_delay(job.attempts),
+            )
+        return False
+    _owned(job).update(status=Job.STATUS_DONE, last_error='', locked_at=None)
+    return True
+
+
+def requeue_stale_jobs():
+    # Jobs left "running" by a worker that stopped reporting (see _Heartbeat) are made pending
+    # again, or failed if that was their last attempt. Returns the numbers requeued and failed.
+    stale = Job.objects.filter(
+        status=Job.STATUS_RUNNING, locked_at__lt=timezone.now() - timedelta(seconds=TASK_STALE_AFTER)
+    )
+    error = f"Worker stopped responding (no heartbeat for {TASK_STALE_AFTER} seconds)"
+    failed = stale.filter(attempts__gte=F('max_attempts')).update(
+        status=Job.STATUS_FAILED, last_error=error, locked_by='', locked_at=None
+    )
+    requeued = stale.filter(attempts__lt=F('max_attempts')).update(
+        status=Job.STATUS_PENDING, last_error=error, locked_by='', locked_at=None
+    )
+    if failed or requeued:
+        logger.warning("Stale jobs: %s requeued, %s failed", requeued, failed)
+    return requeued, failed
+
+
+def run_pending_jobs(queue=None, limit=None):
+    # Run due jobs in the current thread (useful for tests and one-off runs)
+    worker_id = f"{socket.gethostname()}:{os.getpid()}:inline"
+    queues = [queue] if queue else list(TASK_QUEUES)
+    count = 0
+    for name in queues:
+        while limit is None or count < limit:
+            job = claim_next_job(name, worker_id)
+            if job is None:
+                break
+            execute_job(job)
+            count += 1
+    return count
+
+
+class WorkerPool:
+    # One thread per concurrency slot of each queue, so a queue never runs more
+    # jobs at once than its configured limit.
+    def __init__(self, queues=None, poll_interval=1.0):
+        self.queues = queues or TASK_QUEUES
+        self.poll_interval = poll_interval
+        self.stop_event = threading.Event()
+        self.threads = []
+
+    def _work(self, queue, worker_id):
+        while not self.stop_event.is_set():
+            close_old_connections()
+            try:
+                job = claim_next_job(queue, worker_id)
+                if job is None:
+                    self.stop_event.wait(self.poll_interval)
+                    continue
+                execute_job(job)
+            except Exception:
+                logger.exception("Worker %s crashed while processing queue %s", worker_id, queue)
+                self.stop_event.wait(self.poll_interval)
+        close_old_connections()
+
+    def start(self):
+        host = f"{socket.gethostname()}:{os.getpid()}"
+        for queue, concurrency in self.queues.items():
+            for slot in range(concurrency):
+                thread = threading.Thread(
+                    target=self._work, args=(queue, f"{host}:{queue}:{slot}"), daemon=True
+                )
+                thread.start()
+                self.threads.append(thread)
+
+    def run_forever(self):
+        self.start()
+        while not self.stop_event.is_set():
+            requeue_stale_jobs()
+            close_old_connections()
+            self.stop_event.wait(TASK_STALE_AFTER / 10)
+
+    def stop(self, timeout=None):
+        self.stop_event.set()
+        for thread in self.threads:
+            thread.join(timeout)
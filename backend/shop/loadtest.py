@@ -0,0 +1,246 @@
+# shop/loadtest.py
+
+import http.client
+import json
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from urllib.parse import quote, urlsplit
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.db.models import Exists, OuterRef
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from .models import Cart, CartItem, Category, Coupon, Product, ProductVariant
+from .querybudget import QUERY_BUDGET_HEADER
+from .serializers import MyTokenObtainPairSerializer
+
+BENCH_USERNAME_PREFIX = 'bench-'
+BENCH_COUPON_CODE = 'BENCHMARK10'
+BENCH_MIN_STOCK = 20 # Online stock of the variants the flows put in carts; each checkout buys a few units
+
+# A result is a regression when its p95 latency is this much (fraction) above the baseline
+# or it runs more queries than the baseline
+REGRESSION_THRESHOLD = 0.2
+
+
+class BenchData:
+    # The rows the flows read and write: taken from the (generated) catalog, plus benchmark users
+    # with their tokens and a coupon. Users, carts and the coupon are created if missing.
+    def __init__(self, users=10):
+        products = list(
+            Product.objects.filter(is_active=True, category__isnull=False)
+            .filter(Exists(ProductVariant.objects.filter(product=OuterRef('pk'), online_stock__gte=BENCH_MIN_STOCK)))
+            .values_list('slug', flat=True)[:50]
+        )
+        if not products:
+            raise ValueError(
+                f"محصول فعالی با موجودی {BENCH_MIN_STOCK} یا بیشتر یافت نشد؛ ابتدا generate_load_data را اجرا کنید."
+            )
+        self.product_slugs = products
+        self.category_slugs = list(
+            Category.objects.filter(products__slug__in=products).values_list('slug', flat=True).distinct()
+        )
+        self.variant_ids = list(
+            ProductVariant.objects.filter(product__slug__in=products, online_stock__gte=BENCH_MIN_STOCK)
+            .values_list('id', flat=True)
+        )
+
+        self.users = []
+        for n in range(users):
+            user, _ = User.objects.get_or_create(username=f"{BENCH_USERNAME_PREFIX}{n + 1}")
+            self.users.append((user, str(MyTokenObtainPairSerializer.get_token(user).access_token)))
+        # Flows start from empty carts
+        CartItem.objects.filter(cart__user__in=[user for user, _ in self.users]).delete()
+        for user, _ in self.users:
+            Cart.objects.get_or_create(user=user)
+
+        now = timezone.now()
+        Coupon.objects.update_or_create(code=BENCH_COUPON_CODE, defaults={
+            'discount_percentage': 10, 'valid_from': now - timedelta(days=1), 'valid_to': now + timedelta(days=365),
+            'is_active': True, 'usage_limit': 1000000, 'max_uses': None, 'min_cart_amount': 0,
+        })
+
+    def pick(self, values, i):
+        return values[i % len(values)]
+
+
+class Flow:
+    # One timed request; `setup` runs untimed requests first (e.g. filling the cart before checkout).
+    # path/body/setup take (data, i), where i numbers the request within the flow.
+    # Every request is made as one of the benchmark users: anonymous requests from one address
+    # would share a single 'anon' throttle bucket.
+    def __init__(self, method, path, body=None, setup=None):
+        self.method = method
+        self.path = path
+        self.body = body
+        self.setup = setup
+
+
+def _add_to_cart(data, i):
+    return [('POST', '/api/cart/add_item/', {'product_variant_id': data.pick(data.variant_ids, i), 'quantity': 1})]
+
+
+FLOWS = {
+    'product_list': Flow('GET', lambda data, i: '/api/products/'),
+    'product_detail': Flow('GET', lambda data, i: f"/api/products/{data.pick(data.product_slugs, i)}/"),
+    'category_filter': Flow('GET', lambda data, i: f"/api/products/?category_slug={data.pick(data.category_slugs, i)}"),
+    'cart_add': Flow(
+        'POST', lambda data, i: '/api/cart/add_item/',
+        body=lambda data, i: {'product_variant_id': data.pick(data.variant_ids, i), 'quantity': 1},
+    ),
+    'cart_update': Flow(
+        'POST', lambda data, i: '/api/cart/batch/',
+        body=lambda data, i: {'operations': [
+            {'op': 'clear'}, {'op': 'add', 'product_variant_id': data.pick(data.variant_ids, i), 'quantity': 2},
+        ]},
+    ),
+    'apply_coupon': Flow(
+        'POST', lambda data, i: '/api/cart/apply_coupon/',
+        body=lambda data, i: {'coupon_code': BENCH_COUPON_CODE}, setup=_add_to_cart,
+    ),
+    'checkout': Flow(
+        'POST', lambda data, i: '/api/orders/',
+        body=lambda data, i: {'shipping_method': 'post_office'}, setup=_add_to_cart,
+    ),
+    'order_history': Flow('GET', lambda data, i: '/api/orders/'),
+}
+
+
+class InProcessSession:
+    # Requests through the Django test client; query counts are captured directly
+    def __init__(self, token):
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+
+    def request(self, method, path, body=None):
+        with CaptureQueriesContext(connection) as captured:
+            response = getattr(self.client, method.lower())(path, body, format='json')
+        return response.status_code, len(captured.captured_queries)
+
+
+class HttpSession:
+    # One keep-alive connection to a running server. Query counts are read from the
+    # X-Query-Budget header, which the server sends when QUERY_BUDGET['HEADER'] is on (DEBUG).
+    def __init__(self, base_url, token):
+        url = urlsplit(base_url)
+        connection_class = http.client.HTTPSConnection if url.scheme == 'https' else http.client.HTTPConnection
+        self.connection = connection_class(url.hostname, url.port, timeout=30)
+        self.prefix = url.path.rstrip('/')
+        self.headers = {'Content-Type': 'application/json', 'Authorization': f"Bearer {token}"}
+
+    def request(self, method, path, body=None):
+        payload = json.dumps(body) if body is not None else None
+        # Slugs are Persian; the request line has to be ASCII
+        self.connection.request(method, quote(self.prefix + path, safe='/?=&'), body=payload, headers=self.headers)
+        response = self.connection.getresponse()
+        response.read()
+        header = response.getheader(QUERY_BUDGET_HEADER) or ''
+        queries = None
+        if header.startswith('queries='):
+            queries = int(header.split(';', 1)[0].split('=', 1)[1])
+        return response.status, queries
+
+    def close(self):
+        self.connection.close()
+
+
+def _percentile(sorted_values, fraction):
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+
+def summarize(name, timings, statuses, queries, elapsed):
+    timings = sorted(timings)
+    errors = sum(1 for status in statuses if status >= 400)
+    return {
+        'flow': name,
+        'requests': len(timings),
+        'errors': errors,
+        'p50_ms': round(statistics.median(timings) * 1000, 2),
+        'p95_ms': round(_percentile(timings, 0.95) * 1000, 2),
+        'p99_ms': round(_percentile(timings, 0.99) * 1000, 2),
+        'rps': round(len(timings) / elapsed, 1) if elapsed else None,
+        # The most queries any request of the flow ran (None when the server doesn't report them)
+        'queries': max((count for count in queries if count is not None), default=None),
+    }
+
+
+def _run_requests(flow, data, session, indexes):
+    timings, statuses, queries = [], [], []
+    for i in indexes:
+        for method, path, body in (flow.setup(data, i) if flow.setup else []):
+            session.request(method, path, body)
+        body = flow.body(data, i) if flow.body else None
+        start = time.perf_counter()
+        status, count = session.request(flow.method, flow.path(data, i), body)
+        timings.append(time.perf_counter() - start)
+        statuses.append(status)
+        queries.append(count)
+    return timings, statuses, queries
+
+
+def run_in_process(flows, data, requests=50):
+    # Sequential requests through the test client, as the benchmark user of each request
+    results = []
+    sessions = [InProcessSession(token) for _, token in data.users]
+    for name in flows:
+        flow = FLOWS[name]
+        timings, statuses, queries = [], [], []
+        start = time.perf_counter()
+        for i in range(requests):
+            session = sessions[i % len(sessions)]
+            request_timings, request_statuses, request_queries = _run_requests(flow, data, session, [i])
+            timings += request_timings
+            statuses += request_statuses
+            queries += request_queries
+        results.append(summarize(name, timings, statuses, queries, time.perf_counter() - start))
+    return results
+
+
+def run_http(flows, data, base_url, requests=200, concurrency=8):
+    # `concurrency` workers, each with its own connection and benchmark user, share the requests of a flow
+    results = []
+    for name in flows:
+        flow = FLOWS[name]
+        lock = threading.Lock()
+        timings, statuses, queries = [], [], []
+
+        def worker(number):
+            _, token = data.users[number % len(data.users)]
+            session = HttpSession(base_url, token)
+            try:
+                outcome = _run_requests(flow, data, session, range(number, requests, concurrency))
+            finally:
+                session.close()
+            with lock:
+                timings.extend(outcome[0])
+                statuses.extend(outcome[1])
+                queries.extend(outcome[2])
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            list(executor.map(worker, range(concurrency)))
+        results.append(summarize(name, timings, statuses, queries, time.perf_counter() - start))
+    return results
+
+
+def find_regressions(results, baseline, threshold=REGRESSION_THRESHOLD):
+    # Messages for every flow that got slower, runs more queries or fails more than in the baseline
+    previous = {result['flow']: result for result in baseline.get('results', [])}
+    regressions = []
+    for result in results:
+        before = previous.get(result['flow'])
+        if before is None:
+            continue
+        if result['p95_ms'] > before['p95_ms'] * (1 + threshold):
+            regressions.append(f"{result['flow']}: p95 {before['p95_ms']}ms -> {result['p95_ms']}ms")
+        if result['queries'] is not None and before.get('queries') is not None and result['queries'] > before['queries']:
+            regressions.append(f"{result['flow']}: queries {before['queries']} -> {result['queries']}")
+        if result['errors'] > before.get('errors', 0):
+            regressions.append(f"{result['flow']}: errors {before.get('errors', 0)} -> {result['errors']}")
+    return regressions
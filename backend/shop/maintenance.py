@@ -0,0 +1,103 @@
+# shop/maintenance.py
+
+import time
+from datetime import timedelta
+
+from django.contrib.sessions.models import Session
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Cart, CartItem, IdempotencyKey, Job
+
+
+def _delete_in_chunks(queryset, delete_chunk, chunk_size, pause):
+    # Select primary keys chunk by chunk and delete each chunk in its own short transaction,
+    # so that checkout and cart writes are never blocked for long. delete_chunk gets the
+    # queryset narrowed to the chunk, so its conditions are checked again inside the
+    # transaction: a row that stopped matching since the select (a cart that was touched
+    # or got an item) is left alone.
+    total = {}
+    while True:
+        ids = list(queryset.values_list('pk', flat=True)[:chunk_size])
+        if not ids:
+            return total
+        with transaction.atomic():
+            counts = delete_chunk(queryset.filter(pk__in=ids))
+        for name, count in counts.items():
+            total[name] = total.get(name, 0) + count
+        if len(ids) < chunk_size:
+            return total
+        if pause:
+            time.sleep(pause)
+
+
+def _delete_guest_carts(carts):
+    ids = list(carts.values_list('pk', flat=True))
+    session_keys = list(
+        Cart.objects.filter(pk__in=ids).exclude(session_key__isnull=True).values_list('session_key', flat=True)
+    )
+    items, _ = CartItem.objects.filter(cart_id__in=ids).delete()
+    carts, _ = Cart.objects.filter(pk__in=ids).delete()
+    sessions, _ = Session.objects.filter(session_key__in=session_keys).delete()
+    return {'carts': carts, 'cart_items': items, 'sessions': sessions}
+
+
+def purge_stale_data(days=30, empty_after_hours=24, chunk_size=500, pause=0, include_user_carts=False,
+                     failed_job_days=90):
+    # Remove abandoned guest carts (with their items and sessions), expired sessions and
+    # expired idempotency keys, background jobs that finished more than `days` ago and failed
+    # ones older than `failed_job_days` (kept longer, their last_error is needed to look into
+    # the failure). With include_user_carts, items of user carts that have not been touched
+    # for `days` are cleared as well (the cart row itself is kept).
+    # Returns the number of deleted rows per table.
+    now = timezone.now()
+    stale_before = now - timedelta(days=days)
+    empty_before = now - timedelta(hours=empty_after_hours)
+    report = {'carts': 0, 'cart_items': 0, 'sessions': 0, 'idempotency_keys': 0, 'jobs': 0}
+
+    def add(counts):
+        for name, count in counts.items():
+            report[name] += count
+
+    # Guest carts that have not been touched for `days`
+    add(_delete_in_chunks(
+        Cart.objects.filter(user__isnull=True, updated_at__lt=stale_before).order_by('pk'),
+        _delete_guest_carts, chunk_size, pause,
+    ))
+    # Empty guest carts (e.g. created by just opening the cart page)
+    add(_delete_in_chunks(
+        Cart.objects.filter(user__isnull=True, updated_at__lt=empty_before, items__isnull=True).order_by('pk'),
+        _delete_guest_carts, chunk_size, pause,
+    ))
+
+    if include_user_carts:
+        stale_user_items = CartItem.objects.filter(
+            cart__user__isnull=False, cart__updated_at__lt=stale_before
+        ).order_by('pk')
+        add(_delete_in_chunks(
+            stale_user_items,
+            lambda items: {'cart_items': items.delete()[0]},
+            chunk_size, pause,
+        ))
+
+    add(_delete_in_chunks(
+        Session.objects.filter(expire_date__lt=now).order_by('pk'),
+        lambda sessions: {'sessions': sessions.delete()[0]},
+        chunk_size, pause,
+    ))
+    add(_delete_in_chunks(
+        IdempotencyKey.objects.filter(expires_at__lt=now).order_by('pk'),
+        lambda keys: {'idempotency_keys': keys.delete()[0]},
+        chunk_size, pause,
+    ))
+    add(_delete_in_chunks(
+        Job.objects.filter(status=Job.STATUS_DONE, updated_at__lt=stale_before).order_by('pk'),
+        lambda jobs: {'jobs': jobs.delete()[0]},
+        chunk_size, pause,
+    ))
+    add(_delete_in_chunks(
+        Job.objects.filter(status=Job.STATUS_FAILED, updated_at__lt=now - timedelta(days=failed_job_days)).order_by('pk'),
+        lambda jobs: {'jobs': jobs.delete()[0]},
+        chunk_size, pause,
+    ))
+    return report
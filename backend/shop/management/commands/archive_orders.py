@@ -0,0 +1,25 @@
+# shop/management/commands/archive_orders.py
+
+from django.core.management.base import BaseCommand
+
+from shop.archive import ORDER_ARCHIVE_AFTER_DAYS, archive_orders
+
+
+class Command(BaseCommand):
+    help = "انتقال سفارشات بسته شده (تحویل شده، لغو شده، بازگشت وجه) قدیمی به جداول بایگانی"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--older-than-days', type=int, default=ORDER_ARCHIVE_AFTER_DAYS,
+            help="سفارشاتی که بیش از این تعداد روز از بسته شدنشان گذشته بایگانی می‌شوند"
+        )
+        parser.add_argument('--batch-size', type=int, default=500, help="تعداد سفارش در هر دسته")
+        parser.add_argument('--limit', type=int, help="حداکثر تعداد سفارش در این اجرا")
+
+    def handle(self, *args, **options):
+        count = archive_orders(
+            older_than_days=options['older_than_days'],
+            batch_size=options['batch_size'],
+            limit=options['limit'],
+        )
+        self.stdout.write(self.style.SUCCESS(f"{count} سفارش بایگانی شد."))
@@ -0,0 +1,25 @@
+# shop/management/commands/benchmark.py
+
+from django.core.management.base import BaseCommand, CommandError
+
+from shop.benchmarks import SCENARIOS
+
+
+class Command(BaseCommand):
+    help = "اجرای بنچمارک‌های عملکرد (داده‌های ساخته شده در پایان حذف می‌شوند)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('scenario', choices=sorted(SCENARIOS), help="نام سناریو")
+        parser.add_argument('--sizes', type=int, nargs='+', help="اندازه‌های ورودی (مثلاً تعداد آیتم سبد خرید)")
+        parser.add_argument('--repeat', type=int, default=5, help="تعداد تکرار هر اندازه")
+
+    def handle(self, *args, **options):
+        kwargs = {'repeat': options['repeat']}
+        if options['sizes']:
+            kwargs['sizes'] = options['sizes']
+        try:
+            results = SCENARIOS[options['scenario']](**kwargs)
+        except TypeError as e:
+            raise CommandError(str(e))
+        for row in results:
+            self.stdout.write("  ".join(f"{key}={value}" for key, value in row.items()))
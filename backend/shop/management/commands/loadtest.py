@@ -0,0 +1,96 @@
+# shop/management/commands/loadtest.py
+
+import json
+import os
+import tempfile
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test import override_settings
+from django.utils import timezone
+
+from shop.benchmarks import run_isolated
+from shop.loadtest import FLOWS, REGRESSION_THRESHOLD, BenchData, find_regressions, run_http, run_in_process
+from shop.throttling import get_throttle_store
+
+
+class Command(BaseCommand):
+    help = (
+        "اجرای جریان‌های اصلی فروشگاه (لیست و جزئیات محصول، فیلتر دسته بندی، سبد خرید، کوپن، ثبت سفارش و تاریخچه سفارش) "
+        "روی داده فعلی، درون فرایند یا به صورت بار همزمان HTTP روی یک سرور محلی، و مقایسه با خط مبنا"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('flows', nargs='*', help=f"جریان‌ها (پیش فرض: همه): {', '.join(FLOWS)}")
+        parser.add_argument('--requests', type=int, default=50, help="تعداد درخواست هر جریان")
+        parser.add_argument('--users', type=int, default=20, help="تعداد کاربران بنچمارک")
+        parser.add_argument('--url', help="آدرس سرور در حال اجرا (مثلاً http://127.0.0.1:8000)؛ بدون آن درون فرایند اجرا می‌شود")
+        parser.add_argument('--concurrency', type=int, default=8, help="تعداد درخواست‌های همزمان در حالت HTTP")
+        parser.add_argument(
+            '--reset-throttles', action='store_true',
+            help="خالی کردن محدودیت‌های نرخ سرور محلی پیش از هر جریان (در حالت HTTP)",
+        )
+        parser.add_argument('--output', help="ذخیره نتایج در فایل JSON (برای استفاده به عنوان خط مبنا)")
+        parser.add_argument('--baseline', help="فایل JSON خط مبنا برای مقایسه")
+        parser.add_argument(
+            '--threshold', type=float, default=REGRESSION_THRESHOLD,
+            help="افزایش مجاز p95 نسبت به خط مبنا (0.2 یعنی ۲۰٪)",
+        )
+
+    def handle(self, *args, **options):
+        flows = options['flows'] or list(FLOWS)
+        unknown = [name for name in flows if name not in FLOWS]
+        if unknown:
+            raise CommandError(f"جریان نامعتبر: {', '.join(unknown)}")
+        mode = 'http' if options['url'] else 'in_process'
+        baseline = None
+        if options['baseline']:
+            with open(options['baseline']) as f:
+                baseline = json.load(f)
+            if baseline.get('mode') != mode:
+                raise CommandError(f"خط مبنا در حالت {baseline.get('mode')} گرفته شده است، نه {mode}.")
+
+        try:
+            if options['url']:
+                results = self.run_http(flows, options)
+            else:
+                results = self.run_in_process(flows, options)
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        for row in results:
+            self.stdout.write("  ".join(f"{key}={value}" for key, value in row.items()))
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump({
+                    'mode': mode, 'url': options['url'], 'requests': options['requests'],
+                    'concurrency': options['concurrency'] if options['url'] else 1,
+                    'created': timezone.now().isoformat(), 'results': results,
+                }, f, indent=2)
+            self.stdout.write(f"نتایج در {options['output']} ذخیره شد.")
+
+        if baseline is not None:
+            regressions = find_regressions(results, baseline, options['threshold'])
+            if regressions:
+                raise CommandError("افت کارایی نسبت به خط مبنا:\n" + "\n".join(regressions))
+            self.stdout.write(self.style.SUCCESS("افت کارایی نسبت به خط مبنا دیده نشد."))
+
+    def run_in_process(self, flows, options):
+        # Everything the flows write is rolled back; throttle and metrics stores are temporary
+        with tempfile.TemporaryDirectory() as directory, override_settings(
+            ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'],
+            THROTTLE_STORE_PATH=os.path.join(directory, 'throttle.sqlite3'),
+            METRICS_STORE_PATH=os.path.join(directory, 'metrics.sqlite3'),
+        ):
+            return run_isolated(lambda: run_in_process(flows, BenchData(options['users']), options['requests']))
+
+    def run_http(self, flows, options):
+        # The server sees committed data, so the benchmark users, their orders and the coupon stay
+        data = BenchData(options['users'])
+        results = []
+        for name in flows:
+            if options['reset_throttles']:
+                get_throttle_store().reset()
+            results += run_http([name], data, options['url'], options['requests'], options['concurrency'])
+        return results
@@ -0,0 +1,30 @@
+# shop/management/commands/purge_carts.py
+
+from django.core.management.base import BaseCommand
+
+from shop.maintenance import purge_stale_data
+
+
+class Command(BaseCommand):
+    help = "حذف سبدهای خرید رها شده مهمان، نشست‌های منقضی شده و آیتم‌های قدیمی سبد خرید به صورت دسته‌ای"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=30, help="سبدهایی که این تعداد روز تغییر نکرده‌اند حذف می‌شوند")
+        parser.add_argument('--empty-after-hours', type=int, default=24, help="سبدهای خالی مهمان پس از این تعداد ساعت حذف می‌شوند")
+        parser.add_argument('--failed-job-days', type=int, default=90, help="کارهای پس‌زمینه ناموفق پس از این تعداد روز حذف می‌شوند")
+        parser.add_argument('--chunk-size', type=int, default=500, help="تعداد ردیف در هر تراکنش")
+        parser.add_argument('--pause', type=float, default=0, help="مکث (ثانیه) بین هر دسته")
+        parser.add_argument('--include-user-carts', action='store_true', help="آیتم‌های سبدهای قدیمی کاربران را هم پاک کن")
+
+    def handle(self, *args, **options):
+        report = purge_stale_data(
+            days=options['days'],
+            empty_after_hours=options['empty_after_hours'],
+            chunk_size=options['chunk_size'],
+            pause=options['pause'],
+            include_user_carts=options['include_user_carts'],
+            failed_job_days=options['failed_job_days'],
+        )
+        for name, count in report.items():
+            self.stdout.write(f"{name}: {count}")
+        self.stdout.write(self.style.SUCCESS(f"{sum(report.values())} ردیف حذف شد."))
@@ -0,0 +1,25 @@
+# shop/management/commands/rebuild_sales_rollups.py
+
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from shop.sales import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = "بازسازی جداول خلاصه فروش روزانه از روی سفارشات به صورت دسته‌ای"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', help="فقط روزهای از این تاریخ به بعد بازسازی شوند (YYYY-MM-DD)")
+        parser.add_argument('--chunk-size', type=int, default=1000, help="تعداد تقریبی سفارش در هر تراکنش")
+
+    def handle(self, *args, **options):
+        since = None
+        if options['since']:
+            try:
+                since = date.fromisoformat(options['since'])
+            except ValueError:
+                raise CommandError("تاریخ نامعتبر است. قالب درست: YYYY-MM-DD")
+        count = rebuild_rollups(chunk_size=options['chunk_size'], since=since)
+        self.stdout.write(self.style.SUCCESS(f"آمار {count} سفارش بازسازی شد."))
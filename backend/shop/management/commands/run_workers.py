@@ -0,0 +1,43 @@
+# shop/management/commands/run_workers.py
+
+import signal
+
+from django.core.management.base import BaseCommand, CommandError
+
+from shop.jobs import TASK_QUEUES, WorkerPool
+
+
+class Command(BaseCommand):
+    help = "اجرای کارهای پس‌زمینه صف‌ها (تا زمان توقف با Ctrl+C)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--queue', action='append', dest='queues', metavar='NAME[=CONCURRENCY]',
+            help="صف و تعداد پردازشگر همزمان آن، مثلاً --queue notifications=2 (پیش‌فرض: TASK_QUEUES)"
+        )
+        parser.add_argument('--poll-interval', type=float, default=1.0, help="فاصله بررسی صف خالی (ثانیه)")
+
+    def handle(self, *args, **options):
+        queues = dict(TASK_QUEUES)
+        if options['queues']:
+            queues = {}
+            for value in options['queues']:
+                name, _, concurrency = value.partition('=')
+                try:
+                    queues[name] = int(concurrency or TASK_QUEUES.get(name, 1))
+                except ValueError:
+                    raise CommandError(f"تعداد پردازشگر نامعتبر است: {value}")
+
+        pool = WorkerPool(queues, poll_interval=options['poll_interval'])
+
+        def shutdown(signum, frame):
+            self.stdout.write("در حال توقف پردازشگرها...")
+            pool.stop_event.set()
+
+        signal.signal(signal.SIGINT, shutdown)
+        signal.signal(signal.SIGTERM, shutdown)
+
+        self.stdout.write(", ".join(f"{name}={count}" for name, count in queues.items()))
+        pool.run_forever()
+        pool.stop()
+        self.stdout.write(self.style.SUCCESS("پردازشگرها متوقف شدند."))
@@ -0,0 +1,306 @@
+# shop/metrics.py
+
+import atexit
+import functools
+import hmac
+import threading
+import time
+from bisect import bisect_left
+from contextlib import nullcontext
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache.backends import locmem
+from django.http import HttpResponse, HttpResponseForbidden
+
+from .querybudget import QueryRecorder
+from .sqlitestore import SQLiteStore, StoreRegistry
+
+# Upper bounds (seconds) of the request latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# Seconds between flushes of a process's counters to the shared store
+FLUSH_INTERVAL = getattr(settings, 'METRICS_FLUSH_INTERVAL', 5)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# name -> (type, help) of every exported metric family
+METRICS = {
+    'shop_http_requests_total': ('counter', 'Requests by view, method and response status.'),
+    'shop_http_request_duration_seconds': ('histogram', 'Request latency by view and method.'),
+    'shop_db_queries_total': ('counter', 'Database queries run by requests, by view.'),
+    'shop_db_query_duration_seconds_total': ('counter', 'Time spent in database queries, by view.'),
+    'shop_cache_requests_total': ('counter', 'Cache lookups by view and result (hit/miss).'),
+}
+
+_HISTOGRAM_SUFFIXES = ('_bucket', '_sum', '_count')
+
+_LE_LABELS = [f'le="{bound}"' for bound in LATENCY_BUCKETS] + ['le="+Inf"']
+
+# Label of the view the current request resolved to; cache lookups outside requests count as "none"
+current_view = ContextVar('metrics_view', default='none')
+
+_UPSERT_SQL = """
+INSERT INTO metric (name, labels, value) VALUES (?, ?, ?)
+ON CONFLICT (name, labels) DO UPDATE SET value = value + excluded.value
+"""
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(**labels):
+    return ','.join(f'{name}="{_escape(value)}"' for name, value in labels.items())
+
+
+class MetricsStore(SQLiteStore):
+    # Counters of all worker processes of the host, summed in an SQLite file.
+    # Processes add their counts in one transaction every FLUSH_INTERVAL seconds, never per request.
+    schema = (
+        'CREATE TABLE IF NOT EXISTS metric ('
+        'name TEXT NOT NULL, labels TEXT NOT NULL, value REAL NOT NULL, PRIMARY KEY (name, labels)'
+        ') WITHOUT ROWID'
+    )
+
+    def add(self, counters):
+        # counters: {(name, labels): amount}
+        connection = self._connect()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            connection.executemany(_UPSERT_SQL, [(name, labels, value) for (name, labels), value in counters.items()])
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        connection.execute('COMMIT')
+
+    def read(self):
+        return self._connect().execute('SELECT name, labels, value FROM metric').fetchall()
+
+    def reset(self):
+        self._connect().execute('DELETE FROM metric')
+
+
+_stores = StoreRegistry(MetricsStore, 'METRICS_STORE_PATH', 'metrics.sqlite3')
+
+
+def get_metrics_store():
+    return _stores.get()
+
+
+@functools.lru_cache(maxsize=4096)
+def _request_keys(view, method):
+    # The (name, labels) keys of one view/method's series, built once instead of on every request
+    labels = format_labels(view=view, method=method)
+    view_labels = format_labels(view=view)
+    return (
+        [('shop_http_request_duration_seconds_bucket', f'{labels},{le}') for le in _LE_LABELS],
+        ('shop_http_request_duration_seconds_sum', labels),
+        ('shop_http_request_duration_seconds_count', labels),
+        ('shop_db_queries_total', view_labels),
+        ('shop_db_query_duration_seconds_total', view_labels),
+    )
+
+
+class MetricsRegistry:
+    # The counters of this process since its last flush. Recording a request is a handful of
+    # dict updates; the shared store is only written when FLUSH_INTERVAL has passed.
+    def __init__(self):
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+
+    def _add(self, key, value=1):
+        self._pending[key] = self._pending.get(key, 0) + value
+
+    def observe_request(self, view, method, status, duration, queries, query_duration):
+        bucket_keys, sum_key, count_key, queries_key, query_duration_key = _request_keys(view, method)
+        status_key = ('shop_http_requests_total', format_labels(view=view, method=method, status=status))
+        # Buckets are cumulative: a request counts in every bucket whose bound it is within.
+        # The others get 0 so every series has all its buckets.
+        first = bisect_left(LATENCY_BUCKETS, duration)
+        with self._lock:
+            self._add(status_key)
+            for i, key in enumerate(bucket_keys):
+                self._add(key, i >= first)
+            self._add(sum_key, duration)
+            self._add(count_key)
+            if queries:
+                self._add(queries_key, queries)
+                self._add(query_duration_key, query_duration)
+
+    def observe_cache(self, hits, misses):
+        view = current_view.get()
+        with self._lock:
+            if hits:
+                self._add(('shop_cache_requests_total', format_labels(view=view, result='hit')), hits)
+            if misses:
+                self._add(('shop_cache_requests_total', format_labels(view=view, result='miss')), misses)
+
+    def maybe_flush(self):
+        if time.monotonic() - self._last_flush >= FLUSH_INTERVAL:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._last_flush = time.monotonic()
+        if pending:
+            get_metrics_store().add(pending)
+
+    def clear(self):
+        with self._lock:
+            self._pending = {}
+
+
+registry = MetricsRegistry()
+atexit.register(registry.flush)
+
+
+def get_view_label(view_func, method):
+    # "ProductViewSet.list", "CartViewSet.apply_coupon", "SalesReportView.get": one label per
+    # route and action, never per URL, so the number of series stays bounded
+    view_class = getattr(view_func, 'cls', None) or getattr(view_func, 'view_class', None)
+    if view_class is None:
+        return f"{view_func.__module__}.{view_func.__name__}"
+    actions = getattr(view_func, 'actions', None)
+    if actions:
+        return f"{view_class.__name__}.{actions.get(method.lower(), method.lower())}"
+    return f"{view_class.__name__}.{method.lower()}"
+
+
+class MetricsMiddleware:
+    # Records latency, status and database queries of every request per view.
+    # Goes before QueryBudgetMiddleware so the latency includes it, and reuses its query counts.
+    # Runs sync under WSGI and async under ASGI (see shop/asyncviews.py).
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.count_queries = 'shop.querybudget.QueryBudgetMiddleware' not in settings.MIDDLEWARE
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        start = time.perf_counter()
+        token = self.start(request)
+        try:
+            with self.recording() as recorder:
+                response = self.get_response(request)
+        finally:
+            current_view.reset(token)
+        return self.finish(request, response, start, recorder)
+
+    async def __acall__(self, request):
+        start = time.perf_counter()
+        token = self.start(request)
+        try:
+            with self.recording() as recorder:
+                response = await self.get_response(request)
+        finally:
+            current_view.reset(token)
+        return self.finish(request, response, start, recorder)
+
+    def start(self, request):
+        request.metrics_view = 'unmatched'
+        return current_view.set('unmatched')
+
+    def recording(self):
+        # Without QueryBudgetMiddleware (whose recorder already counts the queries) count them here
+        return QueryRecorder().recording() if self.count_queries else nullcontext()
+
+    def finish(self, request, response, start, recorder):
+        recorder = recorder or getattr(request, 'query_recorder', None)
+        registry.observe_request(
+            request.metrics_view, request.method, response.status_code, time.perf_counter() - start,
+            recorder.count if recorder else 0, recorder.duration if recorder else 0.0,
+        )
+        registry.maybe_flush()
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.metrics_view = get_view_label(view_func, request.method)
+        current_view.set(request.metrics_view)
+
+
+class MetricsCacheMixin:
+    # Counts hits and misses of get()/get_many() per view. Combine with any cache backend;
+    # LocMemCache below is the one used by default (see CACHES).
+    _miss = object()
+
+    def get(self, key, default=None, version=None):
+        if default is self._missing_key:
+            # BaseCache.get_many() looking up one of its keys, counted there
+            return super().get(key, default, version)
+        value = super().get(key, self._miss, version)
+        if value is self._miss:
+            registry.observe_cache(0, 1)
+            return default
+        registry.observe_cache(1, 0)
+        return value
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        values = super().get_many(keys, version)
+        registry.observe_cache(len(values), len(keys) - len(values))
+        return values
+
+
+class LocMemCache(MetricsCacheMixin, locmem.LocMemCache):
+    pass
+
+
+def _family(name):
+    if name in METRICS:
+        return name
+    for suffix in _HISTOGRAM_SUFFIXES:
+        if name.endswith(suffix) and name[:-len(suffix)] in METRICS:
+            return name[:-len(suffix)]
+    return name
+
+
+def _sort_key(row):
+    name, labels, _ = row
+    if name.endswith('_bucket'):
+        labels, _, le = labels.rpartition(',le="')
+        return (_family(name), labels, 0, float(le[:-1]))
+    # _sum and _count after the buckets of the same series
+    return (_family(name), labels, 1 if name.endswith('_sum') else 2 if name.endswith('_count') else 0, 0)
+
+
+def render_metrics(rows):
+    # Prometheus text exposition format (version 0.0.4)
+    lines = []
+    family = None
+    for name, labels, value in sorted(rows, key=_sort_key):
+        if _family(name) != family:
+            family = _family(name)
+            if family in METRICS:
+                kind, help_text = METRICS[family]
+                lines.append(f"# HELP {family} {help_text}")
+                lines.append(f"# TYPE {family} {kind}")
+        value = int(value) if float(value).is_integer() else value
+        lines.append(f"{name}{{{labels}}} {value}")
+    return '\n'.join(lines) + '\n'
+
+
+def metrics_view(request):
+    # GET /metrics/ for the scraper. Allowed with `Authorization: Bearer <METRICS_TOKEN>`, for
+    # staff sessions, and for anyone in DEBUG when no token is configured. This process's counters
+    # are flushed first; other workers' may be up to FLUSH_INTERVAL seconds behind.
+    token = getattr(settings, 'METRICS_TOKEN', None)
+    header = request.headers.get('Authorization', '')
+    if token:
+        allowed = hmac.compare_digest(header, f'Bearer {token}')
+    else:
+        allowed = settings.DEBUG
+    user = getattr(request, 'user', None)
+    if not allowed and not (user is not None and user.is_staff):
+        return HttpResponseForbidden()
+
+    registry.flush()
+    return HttpResponse(render_metrics(get_metrics_store().read()), content_type=CONTENT_TYPE)
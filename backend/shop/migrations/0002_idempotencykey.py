@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-19 07:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IdempotencyKey',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scope', models.CharField(max_length=64, verbose_name='دامنه (کاربر/نشست)')),
+                ('key', models.CharField(max_length=255, verbose_name='کلید')),
+                ('request_fingerprint', models.CharField(max_length=64, verbose_name='اثر انگشت درخواست')),
+                ('response_status', models.PositiveIntegerField(blank=True, null=True, verbose_name='کد وضعیت پاسخ')),
+                ('response_body', models.JSONField(blank=True, null=True, verbose_name='بدنه پاسخ')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='تاریخ ایجاد')),
+                ('expires_at', models.DateTimeField(db_index=True, verbose_name='تاریخ انقضا')),
+            ],
+            options={
+                'verbose_name': 'کلید یکتایی درخواست',
+                'verbose_name_plural': 'کلیدهای یکتایی درخواست',
+                'unique_together': {('scope', 'key')},
+            },
+        ),
+    ]
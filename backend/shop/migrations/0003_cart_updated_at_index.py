@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 07:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0002_idempotencykey'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='cart',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True, verbose_name='تاریخ بروزرسانی'),
+        ),
+    ]
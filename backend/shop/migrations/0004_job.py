@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-19 07:14
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0003_cart_updated_at_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Job',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('queue', models.CharField(default='default', max_length=50, verbose_name='صف')),
+                ('task', models.CharField(max_length=200, verbose_name='وظیفه')),
+                ('args', models.JSONField(blank=True, default=list, verbose_name='آرگومان\u200cها')),
+                ('kwargs', models.JSONField(blank=True, default=dict, verbose_name='آرگومان\u200cهای نام\u200cدار')),
+                ('status', models.CharField(choices=[('pending', 'در انتظار اجرا'), ('running', 'در حال اجرا'), ('done', 'انجام شده'), ('failed', 'ناموفق')], default='pending', max_length=20, verbose_name='وضعیت')),
+                ('run_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='زمان اجرا')),
+                ('attempts', models.PositiveIntegerField(default=0, verbose_name='تعداد تلاش')),
+                ('max_attempts', models.PositiveIntegerField(default=5, verbose_name='حداکثر تلاش')),
+                ('dedup_key', models.CharField(blank=True, max_length=255, null=True, verbose_name='کلید جلوگیری از تکرار')),
+                ('last_error', models.TextField(blank=True, verbose_name='آخرین خطا')),
+                ('locked_by', models.CharField(blank=True, max_length=100, verbose_name='پردازشگر')),
+                ('locked_at', models.DateTimeField(blank=True, null=True, verbose_name='زمان شروع اجرا')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='تاریخ ایجاد')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='تاریخ بروزرسانی')),
+            ],
+            options={
+                'verbose_name': 'کار پس\u200cزمینه',
+                'verbose_name_plural': 'کارهای پس\u200cزمینه',
+                'indexes': [models.Index(fields=['queue', 'status', 'run_at'], name='job_queue_status_run_at')],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('status__in', ['pending', 'running'])), fields=('dedup_key',), name='unique_active_job_dedup_key')],
+            },
+        ),
+    ]
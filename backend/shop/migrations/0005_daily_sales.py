@@ -0,0 +1,48 @@
+# Generated by Django 5.2.18 on 2026-10-19 07:16
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0004_job'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyCategorySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(verbose_name='روز')),
+                ('units', models.IntegerField(default=0, verbose_name='تعداد فروش')),
+                ('gross', models.DecimalField(decimal_places=0, default=0, max_digits=14, verbose_name='مبلغ فروش')),
+                ('discount', models.DecimalField(decimal_places=0, default=0, max_digits=14, verbose_name='مبلغ تخفیف')),
+                ('category', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='daily_sales', to='shop.category', verbose_name='دسته بندی')),
+            ],
+            options={
+                'verbose_name': 'فروش روزانه دسته بندی',
+                'verbose_name_plural': 'فروش روزانه دسته بندی ها',
+                'ordering': ['-day'],
+                'unique_together': {('day', 'category')},
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyVariantSales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(verbose_name='روز')),
+                ('units', models.IntegerField(default=0, verbose_name='تعداد فروش')),
+                ('gross', models.DecimalField(decimal_places=0, default=0, max_digits=14, verbose_name='مبلغ فروش')),
+                ('discount', models.DecimalField(decimal_places=0, default=0, max_digits=14, verbose_name='مبلغ تخفیف')),
+                ('product_variant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to='shop.productvariant', verbose_name='تنوع محصول')),
+            ],
+            options={
+                'verbose_name': 'فروش روزانه تنوع محصول',
+                'verbose_name_plural': 'فروش روزانه تنوع محصولات',
+                'ordering': ['-day'],
+                'unique_together': {('day', 'product_variant')},
+            },
+        ),
+    ]
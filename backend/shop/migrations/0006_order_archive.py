@@ -0,0 +1,75 @@
+# Generated by Django 5.2.18 on 2026-10-19 07:18
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0005_daily_sales'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='status_changed_at',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now, verbose_name='تاریخ آخرین تغییر وضعیت'),
+        ),
+        migrations.CreateModel(
+            name='ArchivedOrder',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False, verbose_name='شماره سفارش')),
+                ('username', models.CharField(blank=True, max_length=150, verbose_name='نام کاربری')),
+                ('order_date', models.DateTimeField(db_index=True, verbose_name='تاریخ سفارش')),
+                ('total_amount', models.DecimalField(decimal_places=0, max_digits=10, verbose_name='مبلغ کل سفارش')),
+                ('shipping_address', models.JSONField(blank=True, null=True, verbose_name='آدرس ارسال')),
+                ('shipping_method', models.CharField(choices=[('free_delivery', 'ارسال رایگان'), ('post_office', 'پست پیشتاز')], max_length=50, verbose_name='روش ارسال')),
+                ('shipping_cost', models.DecimalField(decimal_places=0, default=0, max_digits=10, verbose_name='هزینه ارسال')),
+                ('discount_amount', models.DecimalField(decimal_places=0, default=0, max_digits=10, verbose_name='مبلغ تخفیف')),
+                ('status', models.CharField(choices=[('pending', 'در انتظار پرداخت'), ('paid', 'پرداخت شده'), ('processing', 'در حال آماده\u200cسازی'), ('shipped', 'ارسال شده'), ('delivered', 'تحویل شده'), ('cancelled', 'لغو شده'), ('refunded', 'بازگشت وجه')], max_length=20, verbose_name='وضعیت سفارش')),
+                ('status_changed_at', models.DateTimeField(verbose_name='تاریخ آخرین تغییر وضعیت')),
+                ('tracking_code', models.CharField(blank=True, max_length=100, null=True, unique=True, verbose_name='کد پیگیری')),
+                ('coupon_used_code', models.CharField(blank=True, max_length=50, null=True, verbose_name='کد کوپن استفاده شده')),
+                ('item_count', models.PositiveIntegerField(default=0, verbose_name='تعداد اقلام')),
+                ('thumbnail', models.CharField(blank=True, max_length=255, verbose_name='تصویر اولین قلم')),
+                ('archived_at', models.DateTimeField(auto_now_add=True, verbose_name='تاریخ بایگانی')),
+                ('user', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='archived_orders', to=settings.AUTH_USER_MODEL, verbose_name='کاربر')),
+            ],
+            options={
+                'verbose_name': 'سفارش بایگانی شده',
+                'verbose_name_plural': 'سفارشات بایگانی شده',
+                'ordering': ['-order_date'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedOrderItem',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False, verbose_name='شناسه')),
+                ('product_variant_id', models.BigIntegerField(verbose_name='شناسه تنوع محصول')),
+                ('product_id', models.BigIntegerField(verbose_name='شناسه محصول')),
+                ('category_id', models.BigIntegerField(blank=True, null=True, verbose_name='شناسه دسته بندی')),
+                ('product_name', models.CharField(max_length=255, verbose_name='نام محصول')),
+                ('color', models.CharField(max_length=50, verbose_name='رنگ')),
+                ('size_id', models.BigIntegerField(verbose_name='شناسه سایز')),
+                ('size_name', models.CharField(max_length=20, verbose_name='سایز')),
+                ('size_order', models.PositiveIntegerField(default=0, verbose_name='ترتیب سایز')),
+                ('variant_price', models.DecimalField(decimal_places=0, max_digits=10, verbose_name='قیمت واحد تنوع')),
+                ('quantity', models.PositiveIntegerField(verbose_name='تعداد')),
+                ('price_at_order', models.DecimalField(decimal_places=0, max_digits=10, verbose_name='قیمت هنگام سفارش')),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='items', to='shop.archivedorder', verbose_name='سفارش')),
+            ],
+            options={
+                'verbose_name': 'آیتم سفارش بایگانی شده',
+                'verbose_name_plural': 'آیتم\u200cهای سفارش بایگانی شده',
+                'ordering': ['id'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='archivedorder',
+            index=models.Index(fields=['user', '-order_date'], name='archived_order_user_date'),
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 5.2.18 on 2026-10-19 07:22
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_redemptions(apps, schema_editor):
+    # Existing orders only record the coupon code as a string; match it once here
+    Coupon = apps.get_model('shop', 'Coupon')
+    CouponRedemption = apps.get_model('shop', 'CouponRedemption')
+    Order = apps.get_model('shop', 'Order')
+    coupons = {code.upper(): pk for pk, code in Coupon.objects.values_list('pk', 'code')}
+    orders = Order.objects.filter(coupon_used_code__isnull=False, user__isnull=False).values_list(
+        'id', 'user_id', 'coupon_used_code', 'discount_amount', 'order_date'
+    ).order_by('id')
+    redemptions = [
+        CouponRedemption(
+            coupon_id=coupons[code.strip().upper()], user_id=user_id, order_id=order_id,
+            discount_amount=discount_amount, redeemed_at=order_date,
+        )
+        for order_id, user_id, code, discount_amount, order_date in orders.iterator()
+        if code.strip().upper() in coupons
+    ]
+    CouponRedemption.objects.bulk_create(redemptions, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0006_order_archive'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CouponRedemption',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('discount_amount', models.DecimalField(decimal_places=0, default=0, max_digits=10, verbose_name='مبلغ تخفیف')),
+                ('redeemed_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='تاریخ استفاده')),
+                ('coupon', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='redemptions', to='shop.coupon', verbose_name='کوپن')),
+                ('order', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='coupon_redemptions', to='shop.order', verbose_name='سفارش')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='coupon_redemptions', to=settings.AUTH_USER_MODEL, verbose_name='کاربر')),
+            ],
+            options={
+                'verbose_name': 'استفاده از کوپن',
+                'verbose_name_plural': 'استفاده\u200cهای کوپن',
+                'indexes': [models.Index(fields=['coupon', 'user'], name='shop_coupon_coupon__e6c9e7_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_redemptions, migrations.RunPython.noop),
+    ]
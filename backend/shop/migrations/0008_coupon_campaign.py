@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-19 07:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0007_coupon_redemption'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='coupon',
+            name='campaign',
+            field=models.CharField(blank=True, db_index=True, max_length=100, verbose_name='کمپین'),
+        ),
+        migrations.AddField(
+            model_name='coupon',
+            name='max_uses',
+            field=models.PositiveIntegerField(blank=True, null=True, verbose_name='محدودیت کل تعداد استفاده'),
+        ),
+    ]
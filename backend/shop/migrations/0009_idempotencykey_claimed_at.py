@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-19 08:28
+
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import F
+
+
+def backfill_claimed_at(apps, schema_editor):
+    # Existing keys were claimed when they were created
+    IdempotencyKey = apps.get_model('shop', 'IdempotencyKey')
+    IdempotencyKey.objects.update(claimed_at=F('created_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0008_coupon_campaign'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='idempotencykey',
+            name='claimed_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, verbose_name='زمان شروع پردازش'),
+        ),
+        migrations.RunPython(backfill_claimed_at, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,38 @@
+from django.db import migrations
+from django.db.migrations.recorder import MigrationRecorder
+from django.db.models import F
+
+
+def backfill_status_changed_at(model_name):
+    # 0006 gave every order that existed then the time of the migration. Status changes weren't
+    # recorded before it, so those orders get their order date: closed orders placed long ago
+    # become due for archiving rather than waiting ORDER_ARCHIVE_AFTER_DAYS from the migration.
+    # Their stamp is no later than the time 0006 was recorded as applied; any later value is real.
+    def backfill(apps, schema_editor):
+        applied = MigrationRecorder(schema_editor.connection).migration_qs.filter(
+            app='shop', name='0006_order_archive'
+        ).values_list('applied', flat=True).first()
+        if applied is None:
+            return
+        model = apps.get_model('shop', model_name)
+        model.objects.using(schema_editor.connection.alias).filter(
+            status_changed_at__lte=applied, order_date__lt=F('status_changed_at')
+        ).update(status_changed_at=F('order_date'))
+    return backfill
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0009_idempotencykey_claimed_at'),
+    ]
+
+    operations = [
+        # Archived orders carry the stamp over; they may live in the 'archive' database
+        migrations.RunPython(
+            backfill_status_changed_at('Order'), migrations.RunPython.noop, hints={'model_name': 'order'}
+        ),
+        migrations.RunPython(
+            backfill_status_changed_at('ArchivedOrder'), migrations.RunPython.noop, hints={'model_name': 'archivedorder'}
+        ),
+    ]
@@ -0,0 +1,23 @@
+from django.db import migrations
+from django.db.models import F
+
+
+def copy_usage_limit_to_max_uses(apps, schema_editor):
+    # Until usage_limit became a per-user limit (with the redemption table of 0007) it also
+    # capped the uses of all users together (used_count < usage_limit). max_uses, the overall
+    # cap since then, was added empty by 0008, which left those coupons unlimited; they get
+    # their old cap back. A coupon created after 0008 with max_uses left empty on purpose is
+    # capped too; set it back to empty in the admin.
+    Coupon = apps.get_model('shop', 'Coupon')
+    Coupon.objects.filter(max_uses__isnull=True).update(max_uses=F('usage_limit'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0010_backfill_status_changed_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(copy_usage_limit_to_max_uses, migrations.RunPython.noop),
+    ]
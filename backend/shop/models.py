@@ -269,7 +269,7 @@ class Cart(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, null=True, blank=True, related_name='cart', verbose_name="کاربر")
     session_key = models.CharField(max_length=40, null=True, blank=True, unique=True, verbose_name="کلید نشست (برای کاربران مهمان)")
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="تاریخ ایجاد")
-    updated_at = models.DateTimeField(auto_now=True, verbose_name="تاریخ بروزرسانی")
+    updated_at = models.DateTimeField(auto_now=True, db_index=True, verbose_name="تاریخ بروزرسانی") # Indexed for purging abandoned carts
 
     class Meta:
         verbose_name = "سبد خرید"
@@ -334,6 +334,7 @@ class Order(models.Model):
     shipping_cost = models.DecimalField(max_digits=10, decimal_places=0, default=0, verbose_name="هزینه ارسال")
     discount_amount = models.DecimalField(max_digits=10, decimal_places=0, default=0, verbose_name="مبلغ تخفیف")
     status = models.CharField(max_length=20, choices=ORDER_STATUS_CHOICES, default='pending', verbose_name="وضعیت سفارش")
+    status_changed_at = models.DateTimeField(default=timezone.now, db_index=True, verbose_name="تاریخ آخرین تغییر وضعیت") # Used to archive closed orders
     tracking_code = models.CharField(max_length=100, unique=True, blank=True, null=True, verbose_name="کد پیگیری")
     coupon_used_code = models.CharField(max_length=50, blank=True, null=True, verbose_name="کد کوپن استفاده شده") # Store the coupon code used
 
@@ -375,7 +376,9 @@ class Coupon(models.Model):
     valid_to = models.DateTimeField(verbose_name="معتبر تا تاریخ")
     is_active = models.BooleanField(default=True, verbose_name="فعال")
     usage_limit = models.PositiveIntegerField(default=1, verbose_name="محدودیت تعداد استفاده (برای هر کاربر)") # Per user limit
+    max_uses = models.PositiveIntegerField(blank=True, null=True, verbose_name="محدودیت کل تعداد استفاده") # All users together, empty = unlimited
     used_count = models.PositiveIntegerField(default=0, verbose_name="تعداد دفعات استفاده شده")
+    campaign = models.CharField(max_length=100, blank=True, db_index=True, verbose_name="کمپین") # Set on codes made by generate_coupons
     min_cart_amount = models.DecimalField(max_digits=10, decimal_places=0, default=0, verbose_name="حداقل مبلغ سبد برای اعمال")
     max_discount_amount = models.DecimalField(
         max_digits=10, decimal_places=0, blank=True, null=True,
@@ -401,9 +404,10 @@ class Coupon(models.Model):
 
     def is_valid(self):
         now = timezone.now()
+        # usage_limit is per user and is checked against CouponRedemption (see shop/coupons.py)
         return (self.is_active and
                 self.valid_from <= now <= self.valid_to and
-                self.used_count < self.usage_limit)
+                (self.max_uses is None or self.used_count < self.max_uses))
 
     def get_discount_value(self, cart_total):
         if not self.is_valid():
@@ -419,3 +423,193 @@ class Coupon(models.Model):
             discount_value = self.max_discount_amount
 
         return discount_value.quantize(Decimal('1.')) # Round to nearest integer
+
+class CouponRedemption(models.Model):
+    # One row per use of a coupon, written by checkout. The per-user limit is an indexed
+    # count on (coupon, user); per coupon stats are read from here instead of the orders.
+    coupon = models.ForeignKey(Coupon, on_delete=models.CASCADE, related_name='redemptions', verbose_name="کوپن")
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='coupon_redemptions', verbose_name="کاربر")
+    # Archived orders keep their id, so the reference is kept when the order leaves the hot table
+    order = models.ForeignKey(
+        Order, on_delete=models.DO_NOTHING, db_constraint=False, null=True, blank=True,
+        related_name='coupon_redemptions', verbose_name="سفارش"
+    )
+    discount_amount = models.DecimalField(max_digits=10, decimal_places=0, default=0, verbose_name="مبلغ تخفیف")
+    redeemed_at = models.DateTimeField(default=timezone.now, verbose_name="تاریخ استفاده")
+
+    class Meta:
+        verbose_name = "استفاده از کوپن"
+        verbose_name_plural = "استفاده‌های کوپن"
+        indexes = [models.Index(fields=['coupon', 'user'])]
+
+    def __str__(self):
+        return f"{self.coupon} - {self.user}"
+
+# ----------------------------------------------------
+# Archived Orders
+# Closed orders are moved here by `manage.py archive_orders` (see shop/archive.py).
+# These tables may live in a separate database (see shop/routers.py), so they don't
+# reference the hot tables with database constraints and keep a snapshot of what
+# the order history shows.
+# ----------------------------------------------------
+
+class ArchivedOrder(models.Model):
+    id = models.BigIntegerField(primary_key=True, verbose_name="شماره سفارش") # Same id as the original order
+    user = models.ForeignKey(User, on_delete=models.DO_NOTHING, db_constraint=False, null=True, blank=True, related_name='archived_orders', verbose_name="کاربر")
+    username = models.CharField(max_length=150, blank=True, verbose_name="نام کاربری")
+    order_date = models.DateTimeField(db_index=True, verbose_name="تاریخ سفارش")
+    total_amount = models.DecimalField(max_digits=10, decimal_places=0, verbose_name="مبلغ کل سفارش")
+    shipping_address = models.JSONField(blank=True, null=True, verbose_name="آدرس ارسال")
+    shipping_method = models.CharField(max_length=50, choices=Order.SHIPPING_METHOD_CHOICES, verbose_name="روش ارسال")
+    shipping_cost = models.DecimalField(max_digits=10, decimal_places=0, default=0, verbose_name="هزینه ارسال")
+    discount_amount = models.DecimalField(max_digits=10, decimal_places=0, default=0, verbose_name="مبلغ تخفیف")
+    status = models.CharField(max_length=20, choices=Order.ORDER_STATUS_CHOICES, verbose_name="وضعیت سفارش")
+    status_changed_at = models.DateTimeField(verbose_name="تاریخ آخرین تغییر وضعیت")
+    tracking_code = models.CharField(max_length=100, unique=True, blank=True, null=True, verbose_name="کد پیگیری")
+    coupon_used_code = models.CharField(max_length=50, blank=True, null=True, verbose_name="کد کوپن استفاده شده")
+    item_count = models.PositiveIntegerField(default=0, verbose_name="تعداد اقلام")
+    thumbnail = models.CharField(max_length=255, blank=True, verbose_name="تصویر اولین قلم")
+    archived_at = models.DateTimeField(auto_now_add=True, verbose_name="تاریخ بایگانی")
+
+    class Meta:
+        verbose_name = "سفارش بایگانی شده"
+        verbose_name_plural = "سفارشات بایگانی شده"
+        ordering = ['-order_date']
+        indexes = [
+            models.Index(fields=['user', '-order_date'], name='archived_order_user_date'),
+        ]
+
+    def __str__(self):
+        return f"سفارش شماره {self.id} - {self.username or 'کاربر مهمان'}"
+
+class ArchivedOrderItem(models.Model):
+    id = models.BigIntegerField(primary_key=True, verbose_name="شناسه") # Same id as the original order item
+    order = models.ForeignKey(ArchivedOrder, on_delete=models.CASCADE, related_name='items', verbose_name="سفارش")
+    product_variant_id = models.BigIntegerField(verbose_name="شناسه تنوع محصول")
+    product_id = models.BigIntegerField(verbose_name="شناسه محصول")
+    category_id = models.BigIntegerField(blank=True, null=True, verbose_name="شناسه دسته بندی")
+    product_name = models.CharField(max_length=255, verbose_name="نام محصول")
+    color = models.CharField(max_length=50, verbose_name="رنگ")
+    size_id = models.BigIntegerField(verbose_name="شناسه سایز")
+    size_name = models.CharField(max_length=20, verbose_name="سایز")
+    size_order = models.PositiveIntegerField(default=0, verbose_name="ترتیب سایز")
+    variant_price = models.DecimalField(max_digits=10, decimal_places=0, verbose_name="قیمت واحد تنوع")
+    quantity = models.PositiveIntegerField(verbose_name="تعداد")
+    price_at_order = models.DecimalField(max_digits=10, decimal_places=0, verbose_name="قیمت هنگام سفارش")
+
+    class Meta:
+        verbose_name = "آیتم سفارش بایگانی شده"
+        verbose_name_plural = "آیتم‌های سفارش بایگانی شده"
+        ordering = ['id']
+
+    def __str__(self):
+        return f"{self.quantity} x {self.product_name} ({self.color}, {self.size_name})"
+
+# ----------------------------------------------------
+# Infrastructure Models
+# ----------------------------------------------------
+
+class IdempotencyKey(models.Model):
+    # Stores the response of the first attempt of a request sent with an Idempotency-Key header
+    # so that retries are answered from here instead of running the view again.
+    scope = models.CharField(max_length=64, verbose_name="دامنه (کاربر/نشست)")
+    key = models.CharField(max_length=255, verbose_name="کلید")
+    request_fingerprint = models.CharField(max_length=64, verbose_name="اثر انگشت درخواست")
+    response_status = models.PositiveIntegerField(blank=True, null=True, verbose_name="کد وضعیت پاسخ") # Null while the first attempt is still running
+    response_body = models.JSONField(blank=True, null=True, verbose_name="بدنه پاسخ")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="تاریخ ایجاد")
+    claimed_at = models.DateTimeField(default=timezone.now, verbose_name="زمان شروع پردازش") # Attempts unanswered for long are taken over
+    expires_at = models.DateTimeField(db_index=True, verbose_name="تاریخ انقضا")
+
+    class Meta:
+        verbose_name = "کلید یکتایی درخواست"
+        verbose_name_plural = "کلیدهای یکتایی درخواست"
+        unique_together = ('scope', 'key')
+
+    def __str__(self):
+        return f"{self.scope} - {self.key}"
+
+class Job(models.Model):
+    # Background work queued by the request path and executed by `manage.py run_workers`
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'در انتظار اجرا'),
+        (STATUS_RUNNING, 'در حال اجرا'),
+        (STATUS_DONE, 'انجام شده'),
+        (STATUS_FAILED, 'ناموفق'),
+    ]
+
+    queue = models.CharField(max_length=50, default='default', verbose_name="صف")
+    task = models.CharField(max_length=200, verbose_name="وظیفه")
+    args = models.JSONField(default=list, blank=True, verbose_name="آرگومان‌ها")
+    kwargs = models.JSONField(default=dict, blank=True, verbose_name="آرگومان‌های نام‌دار")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING, verbose_name="وضعیت")
+    run_at = models.DateTimeField(default=timezone.now, verbose_name="زمان اجرا")
+    attempts = models.PositiveIntegerField(default=0, verbose_name="تعداد تلاش")
+    max_attempts = models.PositiveIntegerField(default=5, verbose_name="حداکثر تلاش")
+    dedup_key = models.CharField(max_length=255, blank=True, null=True, verbose_name="کلید جلوگیری از تکرار")
+    last_error = models.TextField(blank=True, verbose_name="آخرین خطا")
+    locked_by = models.CharField(max_length=100, blank=True, verbose_name="پردازشگر")
+    locked_at = models.DateTimeField(blank=True, null=True, verbose_name="زمان شروع اجرا")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="تاریخ ایجاد")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="تاریخ بروزرسانی")
+
+    class Meta:
+        verbose_name = "کار پس‌زمینه"
+        verbose_name_plural = "کارهای پس‌زمینه"
+        indexes = [
+            models.Index(fields=['queue', 'status', 'run_at'], name='job_queue_status_run_at'),
+        ]
+        constraints = [
+            # Only one pending/running job per dedup key; finished jobs don't block new ones
+            models.UniqueConstraint(
+                fields=['dedup_key'],
+                condition=models.Q(status__in=['pending', 'running']),
+                name='unique_active_job_dedup_key'
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.task} ({self.get_status_display()})"
+
+# ----------------------------------------------------
+# Reporting Models
+# ----------------------------------------------------
+
+class DailyVariantSales(models.Model):
+    # Sales per day and product variant, kept up to date at checkout and on order status changes
+    # (see shop/sales.py). Cancelled and refunded orders are not counted.
+    day = models.DateField(verbose_name="روز")
+    product_variant = models.ForeignKey(ProductVariant, on_delete=models.CASCADE, related_name='daily_sales', verbose_name="تنوع محصول")
+    units = models.IntegerField(default=0, verbose_name="تعداد فروش")
+    gross = models.DecimalField(max_digits=14, decimal_places=0, default=0, verbose_name="مبلغ فروش")
+    discount = models.DecimalField(max_digits=14, decimal_places=0, default=0, verbose_name="مبلغ تخفیف")
+
+    class Meta:
+        verbose_name = "فروش روزانه تنوع محصول"
+        verbose_name_plural = "فروش روزانه تنوع محصولات"
+        unique_together = ('day', 'product_variant')
+        ordering = ['-day']
+
+    def __str__(self):
+        return f"{self.day} - {self.product_variant_id}"
+
+class DailyCategorySales(models.Model):
+    # Sales per day and category; category is empty for products without a category
+    day = models.DateField(verbose_name="روز")
+    category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True, blank=True, related_name='daily_sales', verbose_name="دسته بندی")
+    units = models.IntegerField(default=0, verbose_name="تعداد فروش")
+    gross = models.DecimalField(max_digits=14, decimal_places=0, default=0, verbose_name="مبلغ فروش")
+    discount = models.DecimalField(max_digits=14, decimal_places=0, default=0, verbose_name="مبلغ تخفیف")
+
+    class Meta:
+        verbose_name = "فروش روزانه دسته بندی"
+        verbose_name_plural = "فروش روزانه دسته بندی ها"
+        unique_together = ('day', 'category')
+        ordering = ['-day']
+
+    def __str__(self):
+        return f"{self.day} - {self.category or 'بدون دسته بندی'}"
@@ -0,0 +1,28 @@
+# shop/orders.py
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Order
+from .sales import record_status_changes
+from .tracking import invalidate_tracking
+
+
+def change_order_status(queryset, status):
+    # Bulk status change (admin actions) that keeps the sales rollups in sync
+    with transaction.atomic():
+        rows = [row for row in queryset.values_list('id', 'status', 'tracking_code') if row[1] != status]
+        if not rows:
+            return 0
+        changes = [(order_id, old_status, status) for order_id, old_status, _ in rows]
+        Order.objects.filter(pk__in=[order_id for order_id, _, _ in changes]).update(status=status, status_changed_at=timezone.now())
+        record_status_changes(changes)
+        transaction.on_commit(lambda: invalidate_tracking([code for _, _, code in rows]))
+    return len(changes)
+
+
+def order_status_changed(order, old_status):
+    # Called after a single order was saved (with the status it had before). The save itself
+    # invalidates the tracking info (see shop/tracking.py).
+    if old_status != order.status:
+        record_status_changes([(order.id, old_status, order.status)])
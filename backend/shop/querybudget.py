@@ -0,0 +1,221 @@
+# shop/querybudget.py
+
+import logging
+import re
+import time
+import traceback
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+logger = logging.getLogger(__name__)
+
+# QUERY_BUDGET = {
+#     'DEFAULT': 50,                  # Queries allowed per request
+#     'VIEWS': {'product-list': 10},  # Per URL name; a view's `query_budget` attribute wins
+#     'REPEAT_LIMIT': 5,              # Same SQL shape more often than this is reported as N+1
+#     'HEADER': True,                 # Add the X-Query-Budget response header
+#     'RAISE': False,                 # Raise QueryBudgetExceeded instead of logging (tests/CI)
+# }
+QUERY_BUDGET_DEFAULTS = {
+    'DEFAULT': 50,
+    'VIEWS': {},
+    'REPEAT_LIMIT': 5,
+    'HEADER': False,
+    'RAISE': False,
+}
+
+QUERY_BUDGET_HEADER = 'X-Query-Budget'
+
+_IN_LIST = re.compile(r'IN \((?:%s, )*%s\)')
+_WHITESPACE = re.compile(r'\s+')
+
+# Recorders active in the current context. A context variable rather than a wrapper per
+# connection: async views run their queries in sync_to_async threads, whose connections are
+# not the request's, but the context (and so the request's recorders) is copied to them.
+_active_recorders = ContextVar('query_recorders', default=())
+
+
+def get_query_budget_settings():
+    return {**QUERY_BUDGET_DEFAULTS, **getattr(settings, 'QUERY_BUDGET', {})}
+
+
+def get_sql_shape(sql):
+    # Queries that differ only in their parameters (or the length of an IN list) have one shape
+    return _IN_LIST.sub('IN (...)', _WHITESPACE.sub(' ', sql)).strip()
+
+
+def _get_stack():
+    # The application frames of the current stack, innermost last
+    base_dir = str(settings.BASE_DIR)
+    frames = [
+        frame for frame in traceback.extract_stack()
+        if frame.filename.startswith(base_dir) and frame.filename != __file__ and 'site-packages' not in frame.filename
+    ]
+    return ''.join(traceback.format_list(frames))
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def _record_query(execute, sql, params, many, context):
+    recorders = _active_recorders.get()
+    if not recorders:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duration = time.perf_counter() - start
+        for recorder in recorders:
+            recorder.record(sql, duration)
+
+
+def install_query_hook(connection, **kwargs):
+    # Every connection runs its queries through _record_query (a no-op outside recording()).
+    # Inserted first, so execute_wrapper() blocks around it still pop their own wrapper.
+    if _record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, _record_query)
+
+
+connection_created.connect(install_query_hook)
+
+
+class QueryRecorder:
+    # Counts the queries of all database connections while recording() is active, with their
+    # total time and how often each SQL shape ran. The stack is captured once per problem:
+    # when the budget is first exceeded and when a shape first goes over the repeat limit.
+    def __init__(self, budget=None, repeat_limit=None):
+        self.budget = budget
+        self.repeat_limit = repeat_limit
+        self.count = 0
+        self.duration = 0.0
+        self.shapes = Counter()
+        self.repeat_stacks = {}
+        self.budget_stack = None
+
+    def record(self, sql, duration):
+        self.duration += duration
+        self.count += 1
+        if self.repeat_limit is not None:
+            shape = get_sql_shape(sql)
+            self.shapes[shape] += 1
+            if self.shapes[shape] == self.repeat_limit + 1:
+                self.repeat_stacks[shape] = _get_stack()
+        if self.budget is not None and self.count == self.budget + 1:
+            self.budget_stack = _get_stack()
+
+    @contextmanager
+    def recording(self):
+        # Connections opened before the hook was registered (none in a running server)
+        for connection in connections.all(initialized_only=True):
+            install_query_hook(connection)
+        token = _active_recorders.set(_active_recorders.get() + (self,))
+        try:
+            yield self
+        finally:
+            _active_recorders.reset(token)
+
+    @property
+    def repeated(self):
+        if self.repeat_limit is None:
+            return {}
+        return {shape: count for shape, count in self.shapes.items() if count > self.repeat_limit}
+
+    @property
+    def over_budget(self):
+        return self.budget is not None and self.count > self.budget
+
+    def get_problems(self):
+        problems = []
+        if self.over_budget:
+            problems.append(f"{self.count} queries, budget is {self.budget}. Query {self.budget + 1} ran from:\n{self.budget_stack}")
+        for shape, count in self.repeated.items():
+            problems.append(f"Same query ran {count} times (limit {self.repeat_limit}): {shape}\nFrom:\n{self.repeat_stacks[shape]}")
+        return problems
+
+    def get_header(self):
+        return (
+            f"queries={self.count}; budget={self.budget}; time_ms={self.duration * 1000:.1f}; "
+            f"repeated={len(self.repeated)}"
+        )
+
+
+def get_view_budget(view_func, resolver_match, budget_settings):
+    view_class = getattr(view_func, 'cls', None) or getattr(view_func, 'view_class', None)
+    budget = getattr(view_class, 'query_budget', None)
+    if budget is None and resolver_match is not None:
+        budget = budget_settings['VIEWS'].get(resolver_match.url_name)
+    return budget_settings['DEFAULT'] if budget is None else budget
+
+
+class QueryBudgetMiddleware:
+    # Records the queries of every request and warns (with the offending stack) when a view goes
+    # over its query budget or runs the same query shape more than REPEAT_LIMIT times.
+    # Runs sync under WSGI and async under ASGI (see shop/asyncviews.py).
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        budget_settings = get_query_budget_settings()
+        recorder = self.start(request, budget_settings)
+        with recorder.recording():
+            response = self.get_response(request)
+        return self.finish(request, response, recorder, budget_settings)
+
+    async def __acall__(self, request):
+        budget_settings = get_query_budget_settings()
+        recorder = self.start(request, budget_settings)
+        with recorder.recording():
+            response = await self.get_response(request)
+        return self.finish(request, response, recorder, budget_settings)
+
+    def start(self, request, budget_settings):
+        recorder = QueryRecorder(budget_settings['DEFAULT'], budget_settings['REPEAT_LIMIT'])
+        request.query_recorder = recorder
+        return recorder
+
+    def finish(self, request, response, recorder, budget_settings):
+        problems = recorder.get_problems()
+        if problems:
+            message = f"Query budget problems in {request.method} {request.path}:\n" + "\n".join(problems)
+            if budget_settings['RAISE']:
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+        if budget_settings['HEADER']:
+            response[QUERY_BUDGET_HEADER] = recorder.get_header()
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.query_recorder.budget = get_view_budget(
+            view_func, request.resolver_match, get_query_budget_settings()
+        )
+
+
+@contextmanager
+def assert_query_budget(max_queries, repeat_limit=None):
+    # Test helper:
+    #
+    #     with assert_query_budget(5, repeat_limit=1):
+    #         self.client.get('/api/products/')
+    #
+    # fails with the stack of the first extra query and of every repeated query shape.
+    recorder = QueryRecorder(max_queries, repeat_limit)
+    with recorder.recording():
+        yield recorder
+    problems = recorder.get_problems()
+    if problems:
+        raise QueryBudgetExceeded("\n".join(problems))
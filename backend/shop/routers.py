@@ -0,0 +1,101 @@
+# shop/routers.py
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+
+ARCHIVE_DATABASE = 'archive'
+REPLICA_DATABASE = 'replica'
+
+_use_replica = ContextVar('use_replica', default=False)
+ARCHIVE_MODELS = {'archivedorder', 'archivedorderitem'}
+
+
+def get_archive_database():
+    # Archived orders live in the 'archive' database if one is configured, otherwise in 'default'
+    return ARCHIVE_DATABASE if ARCHIVE_DATABASE in settings.DATABASES else 'default'
+
+
+def get_replica_database():
+    # The 'replica' connection if one is configured and it is a database of its own. In tests it
+    # mirrors default (DATABASES['replica']['TEST']['MIRROR']); a second connection to the test
+    # database wouldn't see the rows of the test's open transaction, so reads stay on default.
+    if REPLICA_DATABASE not in settings.DATABASES:
+        return None
+    if connections[REPLICA_DATABASE].settings_dict['NAME'] == connections['default'].settings_dict['NAME']:
+        return None
+    return REPLICA_DATABASE
+
+
+def is_archive_model(model):
+    return model._meta.app_label == 'shop' and model._meta.model_name in ARCHIVE_MODELS
+
+
+class ArchiveRouter:
+    # Routes the archive tables to their own SQLite file when DATABASES['archive'] exists.
+    # The archive database contains nothing else.
+
+    def db_for_read(self, model, **hints):
+        if is_archive_model(model):
+            return get_archive_database()
+        return None
+
+    def db_for_write(self, model, **hints):
+        if is_archive_model(model):
+            return get_archive_database()
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Archived orders point to users without a database constraint
+        if is_archive_model(type(obj1)) or is_archive_model(type(obj2)):
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if app_label == 'shop' and model_name in ARCHIVE_MODELS:
+            return db == get_archive_database()
+        if db == ARCHIVE_DATABASE:
+            return False
+        return None
+
+
+@contextmanager
+def read_replica():
+    # Reads inside the block go to the 'replica' connection if one is configured
+    token = _use_replica.set(True)
+    try:
+        yield
+    finally:
+        _use_replica.reset(token)
+
+
+class ReadReplicaRouter:
+    # Sends reads made inside read_replica() (the catalog viewsets' GET requests, see
+    # ReplicaReadMixin in shop/views.py) to the read-only 'replica' connection.
+    # Everything else, and every write, uses the default database.
+
+    def db_for_read(self, model, **hints):
+        if _use_replica.get():
+            return get_replica_database()
+        return None
+
+    def db_for_write(self, model, **hints):
+        # Django would write an object back to the database it was read from
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db == REPLICA_DATABASE:
+            return 'default'
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replica is the same data as default
+        databases = {obj1._state.db, obj2._state.db}
+        if databases <= {'default', REPLICA_DATABASE}:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db == REPLICA_DATABASE:
+            return False
+        return None
@@ -0,0 +1,247 @@
+# shop/sales.py
+
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.db import connections, router, transaction
+from django.utils import timezone
+
+from .models import (
+    ArchivedOrder, ArchivedOrderItem, Category, DailyCategorySales, DailyVariantSales,
+    Order, OrderItem, ProductVariant
+)
+
+# Orders in these states don't count as sales
+VOID_STATUSES = ('cancelled', 'refunded')
+
+
+def is_counted(status):
+    return status not in VOID_STATUSES
+
+
+def _new_totals():
+    return defaultdict(lambda: [0, Decimal(0), Decimal(0)]) # units, gross, discount
+
+
+def _add_order(variant_totals, category_totals, order_date, discount_amount, lines, sign):
+    # lines: (variant_id, category_id, quantity, unit_price) of one order.
+    # The order discount is split over the lines in proportion to their value;
+    # the last line gets the remainder so the parts add up exactly.
+    day = timezone.localdate(order_date)
+    grosses = [quantity * unit_price for _, _, quantity, unit_price in lines]
+    order_gross = sum(grosses)
+    remaining = Decimal(discount_amount or 0)
+    for index, ((variant_id, category_id, quantity, _), gross) in enumerate(zip(lines, grosses)):
+        if index == len(lines) - 1 or not order_gross:
+            discount = remaining
+        else:
+            discount = (Decimal(discount_amount or 0) * gross / order_gross).quantize(Decimal('1.'))
+        remaining -= discount
+        for totals, key in ((variant_totals, (day, variant_id)), (category_totals, (day, category_id))):
+            row = totals[key]
+            row[0] += sign * quantity
+            row[1] += sign * gross
+            row[2] += sign * discount
+
+
+def _apply(model, key_field, totals):
+    # Add the totals to the rollup rows: one SELECT of the affected rows, one bulk INSERT of
+    # the missing rows (with their totals) and one bulk UPDATE that increments the existing
+    # ones in the database (units = units + delta).
+    if not totals:
+        return
+    days = {day for day, _ in totals}
+    keys = {key for _, key in totals}
+    rows = model.objects.filter(day__in=days)
+    non_null_keys = [key for key in keys if key is not None]
+    if None in keys:
+        rows = rows.filter(**{f'{key_field}__in': non_null_keys}) | rows.filter(**{f'{key_field}__isnull': True})
+    else:
+        rows = rows.filter(**{f'{key_field}__in': non_null_keys})
+    existing = {(row.day, getattr(row, key_field)): row for row in rows}
+
+    to_create = []
+    to_update = []
+    for (day, key), (units, gross, discount) in totals.items():
+        row = existing.get((day, key))
+        if row is None:
+            to_create.append(model(day=day, units=units, gross=gross, discount=discount, **{key_field: key}))
+            continue
+        to_update.append((units, gross, discount, row.pk))
+    if to_create:
+        model.objects.bulk_create(to_create)
+    if to_update:
+        # One UPDATE per row sent with executemany: bulk_update's CASE expressions take about
+        # a millisecond per row to build, which made rebuilds of busy days slow
+        connection = connections[router.db_for_write(model)]
+        quote = connection.ops.quote_name
+        sql = (
+            f"UPDATE {quote(model._meta.db_table)} SET "
+            + ", ".join(f"{quote(name)} = {quote(name)} + %s" for name in ('units', 'gross', 'discount'))
+            + f" WHERE {quote(model._meta.pk.column)} = %s"
+        )
+        with connection.cursor() as cursor:
+            cursor.executemany(sql, to_update)
+
+
+def _apply_totals(variant_totals, category_totals):
+    _apply(DailyVariantSales, 'product_variant_id', variant_totals)
+    _apply(DailyCategorySales, 'category_id', category_totals)
+
+
+def record_order(order, lines, sign=1):
+    # Called in the checkout transaction with the lines already in memory:
+    # lines are (variant_id, category_id, quantity, unit_price)
+    variant_totals, category_totals = _new_totals(), _new_totals()
+    _add_order(variant_totals, category_totals, order.order_date, order.discount_amount, lines, sign)
+    _apply_totals(variant_totals, category_totals)
+
+
+def _collect_orders(order_ids, sign, variant_totals, category_totals):
+    orders = {
+        order['id']: order
+        for order in Order.objects.filter(pk__in=order_ids).values('id', 'order_date', 'discount_amount')
+    }
+    lines = defaultdict(list)
+    for item in OrderItem.objects.filter(order_id__in=order_ids).order_by('id').values(
+        'order_id', 'product_variant_id', 'product_variant__product__category_id', 'quantity', 'price_at_order'
+    ):
+        lines[item['order_id']].append((
+            item['product_variant_id'], item['product_variant__product__category_id'],
+            item['quantity'], item['price_at_order'],
+        ))
+    for order_id, order_lines in lines.items():
+        order = orders[order_id]
+        _add_order(variant_totals, category_totals, order['order_date'], order['discount_amount'], order_lines, sign)
+
+
+def _collect_archived_orders(orders, variant_totals, category_totals):
+    # Archived orders keep a snapshot of their lines; variants and categories deleted
+    # since then have no rollup rows any more and are skipped/left uncategorized.
+    order_ids = [order.id for order in orders]
+    items = list(ArchivedOrderItem.objects.filter(order_id__in=order_ids).order_by('id'))
+    variant_ids = set(ProductVariant.objects.filter(
+        id__in={item.product_variant_id for item in items}
+    ).values_list('id', flat=True))
+    category_ids = set(Category.objects.filter(
+        id__in={item.category_id for item in items if item.category_id}
+    ).values_list('id', flat=True))
+    lines = defaultdict(list)
+    for item in items:
+        if item.product_variant_id in variant_ids:
+            category_id = item.category_id if item.category_id in category_ids else None
+            lines[item.order_id].append((item.product_variant_id, category_id, item.quantity, item.price_at_order))
+    for order in orders:
+        if lines.get(order.id):
+            _add_order(variant_totals, category_totals, order.order_date, order.discount_amount, lines[order.id], 1)
+
+
+def record_orders(order_ids, sign=1):
+    # Add (sign=1) or remove (sign=-1) whole orders, loaded with two queries
+    if not order_ids:
+        return
+    variant_totals, category_totals = _new_totals(), _new_totals()
+    _collect_orders(order_ids, sign, variant_totals, category_totals)
+    _apply_totals(variant_totals, category_totals)
+
+
+def record_status_changes(changes):
+    # changes: (order_id, old_status, new_status). Orders that become cancelled/refunded are
+    # removed from the rollups, orders that come back from those states are added again.
+    removed = [order_id for order_id, old, new in changes if is_counted(old) and not is_counted(new)]
+    restored = [order_id for order_id, old, new in changes if not is_counted(old) and is_counted(new)]
+    variant_totals, category_totals = _new_totals(), _new_totals()
+    if removed:
+        _collect_orders(removed, -1, variant_totals, category_totals)
+    if restored:
+        _collect_orders(restored, 1, variant_totals, category_totals)
+    _apply_totals(variant_totals, category_totals)
+
+
+def _day_start(day):
+    # Local days start at local midnight
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def _counted_orders(start, end):
+    # Live and archived orders counted as sales, placed on local days start <= day < end (None: open)
+    querysets = []
+    for queryset in (Order.objects.all(), ArchivedOrder.objects.all()):
+        queryset = queryset.exclude(status__in=VOID_STATUSES)
+        if start:
+            queryset = queryset.filter(order_date__gte=_day_start(start))
+        if end:
+            queryset = queryset.filter(order_date__lt=_day_start(end))
+        querysets.append(queryset)
+    return querysets
+
+
+def _next_boundary(start, chunk_size):
+    # The day after the one that holds about the next chunk_size orders (of either table) from
+    # `start` on, or None if fewer are left
+    ends = []
+    for queryset in _counted_orders(start, None):
+        order_dates = list(queryset.order_by('order_date').values_list('order_date', flat=True)[chunk_size - 1:chunk_size])
+        if order_dates:
+            ends.append(timezone.localdate(order_dates[0]) + timedelta(days=1))
+    return min(ends, default=None)
+
+
+def _rebuild_days(start, end, chunk_size):
+    # Replace the rollup rows of days start <= day < end (None: open) with totals recomputed
+    # from the orders, in one transaction. Reports never see the days half rebuilt, and an order
+    # placed or changed meanwhile is counted exactly once: its checkout/status change either
+    # commits before this transaction (and is in the orders read here) or after it (and is
+    # applied to the rebuilt rows). Checkouts wait for the transaction since SQLite runs one
+    # write transaction at a time (see DATABASES in settings.py).
+    orders, archived_orders = _counted_orders(start, end)
+    count = 0
+    with transaction.atomic():
+        for model in (DailyVariantSales, DailyCategorySales):
+            rows = model.objects.all()
+            if start:
+                rows = rows.filter(day__gte=start)
+            if end:
+                rows = rows.filter(day__lt=end)
+            rows.delete()
+
+        last_id = 0
+        while True:
+            order_ids = list(orders.filter(pk__gt=last_id).order_by('pk').values_list('pk', flat=True)[:chunk_size])
+            if not order_ids:
+                break
+            record_orders(order_ids)
+            last_id = order_ids[-1]
+            count += len(order_ids)
+
+        # Orders that were moved to the archive still count as sales. archive_orders() writes an
+        # order to the archive before deleting it here, so one found in both was counted above.
+        archived_orders = archived_orders.only('id', 'order_date', 'discount_amount')
+        last_id = 0
+        while True:
+            chunk = list(archived_orders.filter(pk__gt=last_id).order_by('pk')[:chunk_size])
+            if not chunk:
+                break
+            last_id = chunk[-1].id
+            live_ids = set(Order.objects.filter(pk__in=[order.id for order in chunk]).values_list('pk', flat=True))
+            chunk = [order for order in chunk if order.id not in live_ids]
+            variant_totals, category_totals = _new_totals(), _new_totals()
+            _collect_archived_orders(chunk, variant_totals, category_totals)
+            _apply_totals(variant_totals, category_totals)
+            count += len(chunk)
+    return count
+
+
+def rebuild_rollups(chunk_size=1000, since=None):
+    # Recompute the rollups from the orders, a range of days (about chunk_size orders) at a time,
+    # each range in its own transaction (see _rebuild_days()). With `since` (a date) only days
+    # from that date on are rebuilt. Returns the number of orders counted.
+    count = 0
+    start = since
+    while True:
+        end = _next_boundary(start, chunk_size)
+        count += _rebuild_days(start, end, chunk_size)
+        if end is None:
+            return count
+        start = end
@@ -3,10 +3,12 @@
 from rest_framework import serializers
 from django.contrib.auth.models import User
 from django.db import models # Import models for Min/Max aggregation
+from django.core.files.storage import default_storage
 from .models import (
     Category, Slider, Tag, Product, ProductBatch,
     Size, SizeQuantity, ProductVariant, Review,
-    UserProfile, Address, Cart, CartItem, Order, OrderItem, Coupon
+    UserProfile, Address, Cart, CartItem, Order, OrderItem, Coupon,
+    ArchivedOrder, ArchivedOrderItem
 )
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 from rest_framework.validators import UniqueTogetherValidator
@@ -123,17 +125,15 @@ class ProductListSerializer(serializers.ModelSerializer):
     def get_active_discount_percentage(self, obj):
         return obj.get_discount_percentage()
 
+    def _in_stock_prices(self, obj):
+        # From the prefetched variants (see ProductViewSet.get_queryset); no query per product
+        return [variant.get_discounted_price() for variant in obj.variants.all() if variant.online_stock > 0]
+
     def get_min_price(self, obj):
-        variants = obj.variants.filter(online_stock__gt=0)
-        if variants.exists():
-            return min(variant.get_discounted_price() for variant in variants)
-        return None
+        return min(self._in_stock_prices(obj), default=None)
 
     def get_max_price(self, obj):
-        variants = obj.variants.filter(online_stock__gt=0)
-        if variants.exists():
-            return max(variant.get_discounted_price() for variant in variants)
-        return None
+        return max(self._in_stock_prices(obj), default=None)
 
 
 class ProductDetailSerializer(ProductListSerializer):
@@ -145,7 +145,10 @@ class ProductDetailSerializer(ProductListSerializer):
         fields = ProductListSerializer.Meta.fields + ['variants', 'batches', 'reviews']
 
     def get_reviews(self, obj):
-        approved_reviews = obj.reviews.filter(is_approved=True)
+        # Prefetched by ProductViewSet as `approved_reviews`
+        approved_reviews = getattr(obj, 'approved_reviews', None)
+        if approved_reviews is None:
+            approved_reviews = obj.reviews.filter(is_approved=True).select_related('user')
         return ReviewSerializer(approved_reviews, many=True, context=self.context).data
 
 class ReviewSerializer(serializers.ModelSerializer):
@@ -289,8 +292,14 @@ class CartSerializer(serializers.ModelSerializer):
     def get_total_items(self, obj):
         return obj.get_total_items()
 
+class OrderProductVariantSerializer(ProductVariantSerializer):
+    # Variant as shown on an order line: the current discount and stock don't apply
+    # to a historical order, so they are left out (and never loaded)
+    class Meta(ProductVariantSerializer.Meta):
+        fields = ['id', 'product', 'product_name', 'size_id', 'size_name', 'size_order', 'color', 'price', 'display_price']
+
 class OrderItemSerializer(serializers.ModelSerializer):
-    product_variant = ProductVariantSerializer(read_only=True)
+    product_variant = OrderProductVariantSerializer(read_only=True)
 
     class Meta:
         model = OrderItem
@@ -319,13 +328,67 @@ class OrderSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("آدرس ارسال باید متعلق به کاربر فعلی باشد.")
         return value
 
+class OrderSummarySerializer(serializers.ModelSerializer):
+    # Order header for history lists; expects item_count and thumbnail annotations
+    # (see OrderViewSet.get_queryset), so the whole list is one query
+    item_count = serializers.IntegerField(read_only=True)
+    thumbnail_url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Order
+        fields = [
+            'id', 'order_date', 'total_amount', 'shipping_method', 'shipping_cost',
+            'discount_amount', 'status', 'tracking_code', 'item_count', 'thumbnail_url'
+        ]
+        read_only_fields = fields
+
+    def get_thumbnail_url(self, obj):
+        if obj.thumbnail:
+            return self.context['request'].build_absolute_uri(default_storage.url(obj.thumbnail))
+        return None
+
+class ArchivedOrderItemSerializer(serializers.ModelSerializer):
+    # Same shape as OrderItemSerializer, built from the snapshot taken at archive time
+    product_variant = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ArchivedOrderItem
+        fields = ['id', 'product_variant', 'quantity', 'price_at_order']
+
+    def get_product_variant(self, obj):
+        return {
+            'id': obj.product_variant_id,
+            'product': obj.product_id,
+            'product_name': obj.product_name,
+            'size_id': obj.size_id,
+            'size_name': obj.size_name,
+            'size_order': obj.size_order,
+            'color': obj.color,
+            'price': serializers.DecimalField(max_digits=10, decimal_places=0).to_representation(obj.variant_price),
+            'display_price': f"{int(obj.variant_price):,} تومان",
+        }
+
+class ArchivedOrderSerializer(serializers.ModelSerializer):
+    # Same shape as OrderSerializer for orders moved to the archive tables
+    items = ArchivedOrderItemSerializer(many=True, read_only=True)
+    user = serializers.CharField(source='username', read_only=True)
+
+    class Meta:
+        model = ArchivedOrder
+        fields = OrderSerializer.Meta.fields
+        read_only_fields = fields
+
+class ArchivedOrderSummarySerializer(OrderSummarySerializer):
+    class Meta(OrderSummarySerializer.Meta):
+        model = ArchivedOrder
+
 class CouponSerializer(serializers.ModelSerializer):
     class Meta:
         model = Coupon
         fields = [
             'id', 'code', 'discount_percentage', 'discount_amount',
-            'valid_from', 'valid_to', 'is_active', 'usage_limit',
-            'used_count', 'min_cart_amount', 'max_discount_amount'
+            'valid_from', 'valid_to', 'is_active', 'usage_limit', 'max_uses',
+            'used_count', 'min_cart_amount', 'max_discount_amount', 'campaign'
         ]
         read_only_fields = ['used_count']
 
@@ -0,0 +1,46 @@
+# shop/sqlitestore.py
+
+import sqlite3
+import threading
+
+from django.conf import settings
+
+
+class SQLiteStore:
+    # Base of the small SQLite files the worker processes of the host share outside the Django
+    # database (throttle buckets, metrics). Every thread gets its own autocommit connection;
+    # WAL lets the processes read while one of them writes. Subclasses set `schema`, the
+    # CREATE TABLE IF NOT EXISTS statement of their table.
+    schema = None
+
+    def __init__(self, path):
+        self.path = str(path)
+        self._local = threading.local()
+        self._connect().execute(self.schema)
+
+    def _connect(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self._local.connection = connection
+        return connection
+
+
+class StoreRegistry:
+    # One store per path, the path read from the `setting_name` setting on every call so tests
+    # can point it somewhere else
+    def __init__(self, store_class, setting_name, default_filename):
+        self.store_class = store_class
+        self.setting_name = setting_name
+        self.default_filename = default_filename
+        self._stores = {}
+        self._lock = threading.Lock()
+
+    def get(self):
+        path = str(getattr(settings, self.setting_name, settings.BASE_DIR / self.default_filename))
+        with self._lock:
+            if path not in self._stores:
+                self._stores[path] = self.store_class(path)
+            return self._stores[path]
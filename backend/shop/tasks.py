@@ -0,0 +1,37 @@
+# shop/tasks.py
+# Background tasks executed by `manage.py run_workers` (see shop/jobs.py)
+# Catalog saves enqueue nothing on purpose: their only side work is dropping the cached catalog
+# responses (shop/catalog.py), and that cache is per process, so a worker can't do it for the
+# web processes.
+
+from django.core.mail import mail_admins, send_mail
+
+from .jobs import task
+from .models import Order, Review
+
+
+@task(queue='notifications')
+def send_order_confirmation(order_id):
+    order = Order.objects.select_related('user').filter(pk=order_id).first()
+    if order is None or not order.user or not order.user.email:
+        return
+    send_mail(
+        subject=f"ثبت سفارش شماره {order.id}",
+        message=(
+            f"{order.user.get_full_name() or order.user.username} عزیز، سفارش شما با موفقیت ثبت شد.\n"
+            f"مبلغ کل سفارش: {int(order.total_amount):,} تومان"
+        ),
+        from_email=None,
+        recipient_list=[order.user.email],
+    )
+
+
+@task(queue='notifications')
+def notify_new_review(review_id):
+    review = Review.objects.select_related('product').filter(pk=review_id).first()
+    if review is None or review.is_approved:
+        return
+    mail_admins(
+        subject=f"نظر جدید برای {review.product.name}",
+        message=f"{review.user_name} (امتیاز {review.rating}):\n{review.comment}\n\nاین نظر در انتظار تایید است.",
+    )
@@ -0,0 +1,64 @@
+# shop/test_accounts.py
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from .authentication import user_cache
+from .models import Cart, UserProfile
+from .throttling import get_throttle_store
+
+
+class AccountQueryCountTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        user_cache.clear()
+        get_throttle_store().reset()
+
+    def test_register_is_a_single_insert(self):
+        # Username uniqueness check + INSERT; profile and cart are created on first use
+        with self.assertNumQueries(2):
+            response = self.client.post('/api/register/', {
+                'username': 'sara', 'password': 'secret-pass-1', 'password2': 'secret-pass-1',
+                'email': 'sara@example.com', 'first_name': 'Sara', 'last_name': 'Ahmadi',
+            }, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertFalse(UserProfile.objects.exists())
+        self.assertFalse(Cart.objects.exists())
+
+    def test_login(self):
+        User.objects.create_user('sara', password='secret-pass-1')
+        # User lookup + profile lookup for the phone number claim
+        with self.assertNumQueries(2):
+            response = self.client.post('/api/token/', {'username': 'sara', 'password': 'secret-pass-1'}, format='json')
+        self.assertEqual(response.status_code, 200)
+
+    def test_profile_is_created_on_first_access(self):
+        user = User.objects.create_user('sara', password='secret-pass-1')
+        self.client.force_authenticate(user)
+        response = self.client.get('/api/profile/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['user']['first_name'], '')
+        self.assertEqual(UserProfile.objects.filter(user=user).count(), 1)
+
+    def test_profile_update(self):
+        user = User.objects.create_user('sara', password='secret-pass-1')
+        profile = UserProfile.objects.create(user=user)
+        self.client.force_authenticate(user)
+        # Profile with user, UPDATE user, UPDATE profile
+        with self.assertNumQueries(3):
+            response = self.client.patch(f'/api/profile/{profile.pk}/', {
+                'phone_number': '09120000000', 'user': {'first_name': 'Sara'},
+            }, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['phone_number'], '09120000000')
+        self.assertEqual(response.data['user']['first_name'], 'Sara')
+
+    def test_user_save_does_not_touch_cart(self):
+        user = User.objects.create_user('sara', password='secret-pass-1')
+        cart = Cart.objects.create(user=user)
+        UserProfile.objects.create(user=user)
+        user.first_name = 'Sara'
+        with self.assertNumQueries(1):
+            user.save()
+        self.assertEqual(Cart.objects.get(pk=cart.pk).updated_at, cart.updated_at)
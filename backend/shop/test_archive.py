@@ -0,0 +1,97 @@
+# shop/test_archive.py
+
+import importlib
+from datetime import timedelta
+from unittest import mock
+
+from django.apps import apps
+from django.contrib.auth.models import User
+from django.db import connection
+from django.db.models.query import QuerySet
+from django.db.migrations.recorder import MigrationRecorder
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from .archive import CombinedOrderList, archive_orders, get_archived_orders
+from .models import ArchivedOrder, Order
+from .orders import change_order_status
+from .throttling import get_throttle_store
+
+backfill_migration = importlib.import_module('shop.migrations.0010_backfill_status_changed_at')
+
+
+class ArchiveTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('sara')
+
+    def make_order(self, days_ago, status='delivered', changed_days_ago=None):
+        order = Order.objects.create(user=self.user, total_amount=100000, status=status)
+        now = timezone.now()
+        Order.objects.filter(pk=order.pk).update(
+            order_date=now - timedelta(days=days_ago),
+            status_changed_at=now - timedelta(days=days_ago if changed_days_ago is None else changed_days_ago),
+        )
+        return order
+
+    def combined_ids(self):
+        orders = CombinedOrderList(Order.objects.filter(user=self.user).order_by('-order_date'), get_archived_orders(self.user))
+        return [order.id for order in orders[:]]
+
+    def test_archive_and_restore(self):
+        archived = self.make_order(days_ago=400)
+        restored = self.make_order(days_ago=300, status='cancelled')
+        recent = self.make_order(days_ago=10)
+        # Cancelled long ago, then taken up again: it was changed just now and isn't closed
+        change_order_status(Order.objects.filter(pk=restored.pk), 'processing')
+        self.assertEqual(self.combined_ids(), [recent.pk, restored.pk, archived.pk])
+
+        self.assertEqual(archive_orders(), 1)
+        self.assertTrue(ArchivedOrder.objects.filter(pk=archived.pk).exists())
+        self.assertFalse(Order.objects.filter(pk=archived.pk).exists())
+        # Cancelled again: closed, but only just, so it stays
+        change_order_status(Order.objects.filter(pk=restored.pk), 'cancelled')
+        self.assertEqual(archive_orders(), 0)
+
+        self.assertEqual(self.combined_ids(), [recent.pk, restored.pk, archived.pk])
+        orders = CombinedOrderList(Order.objects.filter(user=self.user).order_by('-order_date'), get_archived_orders(self.user))
+        self.assertEqual(orders.count(), 3)
+        self.assertEqual([order.id for order in orders[1:3]], [restored.pk, archived.pk])
+        self.assertIsInstance(orders[2], ArchivedOrder)
+
+        client = APIClient()
+        client.force_authenticate(self.user)
+        get_throttle_store().reset()
+        response = client.get('/api/orders/')
+        self.assertEqual(response.status_code, 200)
+        results = response.data['results'] if isinstance(response.data, dict) else response.data
+        self.assertEqual([order['id'] for order in results], [recent.pk, restored.pk, archived.pk])
+
+    def test_interrupted_batch_rolled_back(self):
+        # Stopped after writing the archive: the order is still only in the order tables
+        order = self.make_order(days_ago=400)
+        with mock.patch.object(QuerySet, 'delete', side_effect=RuntimeError("interrupted")):
+            with self.assertRaises(RuntimeError):
+                archive_orders()
+        self.assertFalse(ArchivedOrder.objects.exists())
+        self.assertEqual(self.combined_ids(), [order.pk])
+
+        self.assertEqual(archive_orders(), 1)
+        self.assertEqual(self.combined_ids(), [order.pk])
+        self.assertFalse(Order.objects.filter(pk=order.pk).exists())
+
+    def test_status_changed_at_backfill(self):
+        # Orders that existed when 0006 ran carry its time; later status changes are kept
+        applied = MigrationRecorder.Migration.objects.get(app='shop', name='0006_order_archive').applied
+        stamped = self.make_order(days_ago=400)
+        Order.objects.filter(pk=stamped.pk).update(status_changed_at=applied)
+        changed = self.make_order(days_ago=400, changed_days_ago=0)
+
+        backfill_migration.backfill_status_changed_at('Order')(apps, connection.schema_editor())
+        stamped.refresh_from_db()
+        changed.refresh_from_db()
+        self.assertEqual(stamped.status_changed_at, stamped.order_date)
+        self.assertGreater(changed.status_changed_at, applied)
+        self.assertEqual(archive_orders(), 1)
+        self.assertTrue(ArchivedOrder.objects.filter(pk=stamped.pk).exists())
@@ -0,0 +1,87 @@
+# shop/test_asyncviews.py
+
+from urllib.parse import quote
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from .models import Category, Product, ProductBatch, ProductVariant, Review, Size, SizeQuantity, Slider, Tag
+from .querybudget import QUERY_BUDGET_HEADER, QueryRecorder
+from .throttling import get_throttle_store
+
+
+class AsyncCatalogTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        # Product slugs are ASCII: Django's async test client mangles non-ASCII paths (not query strings)
+        cls.category = Category.objects.create(name="مانتو", slug="مانتو")
+        Category.objects.create(name="شال", slug="شال", is_active=False)
+        Slider.objects.create(title="تخفیف", image='images/slide.jpg', order=1)
+        size = Size.objects.create(size='M')
+        tag = Tag.objects.create(name="تابستانه", slug="تابستانه")
+        for i in range(12):
+            product = Product.objects.create(
+                name=f"مانتو {i}", slug=f"manto-{i}", category=cls.category, fixed_discount_percentage=10,
+            )
+            product.tags.add(tag)
+            batch = ProductBatch.objects.create(product=product, color="مشکی", total_quantity=5)
+            quantity = SizeQuantity.objects.create(product_batch=batch, size=size, quantity=5, price=100000 + i)
+            ProductVariant.objects.create(
+                product=product, size=quantity, color="مشکی", price=100000 + i, stock=5, online_stock=5,
+            )
+            Review.objects.create(product=product, user_name="سارا", rating=5, is_approved=True)
+        cls.product = product
+
+    def setUp(self):
+        self.client = APIClient()
+        cache.clear()
+        get_throttle_store().reset()
+
+    async def assertSameResponse(self, path, async_path):
+        # The WSGI test client wants the path percent-encoded, the ASGI one as is
+        expected = await self.async_client.get(async_path)
+        response = await sync_to_async(self.client.get)(quote(path, safe='/?=&'))
+        self.assertEqual(expected.status_code, response.status_code)
+        # Pagination links point to the route they were requested from
+        self.assertEqual(expected.content.replace(b'/api/async/', b'/api/'), response.content)
+
+    async def test_same_json_as_viewsets(self):
+        await self.assertSameResponse('/api/products/', '/api/async/products/')
+        await self.assertSameResponse('/api/products/?page=2', '/api/async/products/?page=2')
+        await self.assertSameResponse('/api/products/?page=9', '/api/async/products/?page=9')
+        await self.assertSameResponse('/api/products/?category_slug=مانتو', '/api/async/products/?category_slug=مانتو')
+        await self.assertSameResponse(f'/api/products/{self.product.slug}/', f'/api/async/products/{self.product.slug}/')
+        await self.assertSameResponse('/api/products/missing/', '/api/async/products/missing/')
+        await self.assertSameResponse('/api/categories/', '/api/async/categories/')
+        await self.assertSameResponse('/api/sliders/', '/api/async/sliders/')
+
+    async def test_homepage(self):
+        response = await self.async_client.get('/api/async/home/')
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual([category['slug'] for category in data['categories']], ["مانتو"])
+        self.assertEqual(len(data['sliders']), 1)
+        self.assertEqual(len(data['products']), 12)
+
+    async def test_read_only(self):
+        response = await self.async_client.post('/api/async/products/')
+        self.assertEqual(response.status_code, 405)
+
+    @override_settings(QUERY_BUDGET={'HEADER': True})
+    async def test_queries_recorded_under_asgi(self):
+        # The async ORM runs queries in other threads; the middleware still counts them
+        response = await self.async_client.get('/api/async/products/')
+        self.assertTrue(response[QUERY_BUDGET_HEADER].startswith('queries=4;'))
+
+    async def test_cached_until_catalog_changes(self):
+        await self.async_client.get('/api/async/home/')
+        with QueryRecorder().recording() as recorder:
+            await self.async_client.get('/api/async/home/')
+        self.assertEqual(recorder.count, 0)
+
+        self.category.name = "مانتو و تونیک"
+        await self.category.asave()
+        response = await self.async_client.get('/api/async/home/')
+        self.assertEqual(response.json()['categories'][0]['name'], "مانتو و تونیک")
@@ -0,0 +1,98 @@
+# shop/test_authentication.py
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+
+from .authentication import StatelessJWTAuthentication, TokenClaimsUser, user_cache
+from .serializers import MyTokenObtainPairSerializer
+
+
+class StatelessJWTAuthenticationTests(TestCase):
+    def setUp(self):
+        user_cache.clear()
+        self.factory = APIRequestFactory()
+        self.user = User.objects.create_user('sara', password='secret-pass-1', first_name='Sara')
+        self.token = str(MyTokenObtainPairSerializer.get_token(self.user).access_token)
+
+    def authenticate(self, method='get'):
+        request = getattr(self.factory, method)('/api/orders/', HTTP_AUTHORIZATION=f'Bearer {self.token}')
+        return StatelessJWTAuthentication().authenticate(request)
+
+    def deactivate(self):
+        # update() sends no post_save, like a change made by another process
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+
+    def test_read_runs_no_query(self):
+        with self.assertNumQueries(0):
+            user, _ = self.authenticate()
+            self.assertIsInstance(user, TokenClaimsUser)
+            self.assertIsInstance(user, User)
+            self.assertEqual(user.pk, self.user.pk)
+            self.assertEqual(user.username, 'sara')
+            self.assertEqual(user.first_name, 'Sara')
+
+    def test_user_loaded_on_first_other_attribute(self):
+        user, _ = self.authenticate()
+        with self.assertNumQueries(1):
+            self.assertFalse(user.is_staff)
+        with self.assertNumQueries(0):
+            self.assertTrue(user.check_password('secret-pass-1'))
+            # The next request is served from the cache
+            cached, _ = self.authenticate()
+        self.assertNotIsInstance(cached, TokenClaimsUser)
+        self.assertEqual(cached, self.user)
+
+    def test_inactive_user_rejected_on_load(self):
+        self.deactivate()
+        user, _ = self.authenticate()
+        with self.assertRaises(AuthenticationFailed):
+            user.is_staff
+
+    def test_inactive_cached_user_rejected(self):
+        self.user.is_active = False
+        user_cache.set(self.user.pk, self.user)
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate()
+
+    def test_write_loads_user_past_the_cache(self):
+        user_cache.load(self.user.pk)
+        with self.assertNumQueries(1):
+            user, _ = self.authenticate('post')
+        self.assertNotIsInstance(user, TokenClaimsUser)
+        self.deactivate()
+        # Still in the cache, so reads go through until it expires
+        self.assertTrue(self.authenticate()[0].is_active)
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate('post')
+        # The fresh row replaced the stale one
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate()
+
+    def test_write_by_deleted_user_rejected(self):
+        user_cache.load(self.user.pk)
+        User.objects.filter(pk=self.user.pk).delete()
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate('delete')
+        self.assertIsNone(user_cache.get(self.user.pk))
+
+    def test_cache_invalidated_on_save_and_delete(self):
+        user_cache.load(self.user.pk)
+        self.user.is_active = False
+        self.user.save()
+        self.assertIsNone(user_cache.get(self.user.pk))
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate()[0].is_staff
+
+        user_cache.set(self.user.pk, self.user)
+        self.user.delete()
+        self.assertIsNone(user_cache.get(self.user.pk))
+
+    def test_deactivated_user_cannot_write_through_the_api(self):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.token}')
+        user_cache.load(self.user.pk)
+        self.deactivate()
+        response = client.post('/api/cart/clear_cart/')
+        self.assertEqual(response.status_code, 401)
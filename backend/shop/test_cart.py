@@ -0,0 +1,206 @@
+# shop/test_cart.py
+
+from django.contrib.auth.models import User
+from django.contrib.sessions.backends.db import SessionStore
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from .authentication import user_cache
+from .cart import merge_guest_cart
+from .models import Cart, CartItem, Category, Product, ProductBatch, ProductVariant, Size, SizeQuantity
+from .throttling import get_throttle_store
+
+
+class CartTestData:
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('sara', password='secret-pass-1')
+        cls.category = Category.objects.create(name="مانتو", slug="manto")
+        cls.size = Size.objects.create(size='M')
+
+    def make_variant(self, price=100000, online_stock=10, discount=0, is_active=True):
+        product = Product.objects.create(
+            name="مانتو کتان", slug=f"manto-{Product.objects.count()}", category=self.category,
+            fixed_discount_percentage=discount, is_active=is_active,
+        )
+        batch = ProductBatch.objects.create(product=product, color="مشکی", total_quantity=online_stock)
+        quantity = SizeQuantity.objects.create(product_batch=batch, size=self.size, quantity=online_stock, price=price)
+        return ProductVariant.objects.create(
+            product=product, size=quantity, color="مشکی", price=price, stock=online_stock, online_stock=online_stock,
+        )
+
+
+class MergeGuestCartTests(CartTestData, TestCase):
+    def setUp(self):
+        self.guest_cart = Cart.objects.create(session_key='guest-session')
+
+    def add(self, cart, variant, quantity, price=1):
+        return CartItem.objects.create(cart=cart, product_variant=variant, quantity=quantity, price_at_addition=price)
+
+    def test_duplicate_variants_are_summed(self):
+        variant = self.make_variant()
+        cart = Cart.objects.create(user=self.user)
+        self.add(cart, variant, 2)
+        self.add(self.guest_cart, variant, 3)
+
+        merged, adjustments = merge_guest_cart(self.user, 'guest-session')
+        self.assertEqual(merged, cart)
+        self.assertEqual(adjustments, [])
+        self.assertEqual(list(cart.items.values_list('product_variant', 'quantity')), [(variant.id, 5)])
+        self.assertFalse(Cart.objects.filter(session_key='guest-session').exists())
+
+    def test_quantity_capped_at_stock(self):
+        variant = self.make_variant(online_stock=4)
+        cart = Cart.objects.create(user=self.user)
+        self.add(cart, variant, 3)
+        self.add(self.guest_cart, variant, 2)
+        other = self.make_variant(online_stock=1)
+        self.add(self.guest_cart, other, 5)
+
+        cart, adjustments = merge_guest_cart(self.user, 'guest-session')
+        self.assertEqual(dict(cart.items.values_list('product_variant', 'quantity')), {variant.id: 4, other.id: 1})
+        self.assertCountEqual(adjustments, [
+            {'product_variant_id': variant.id, 'requested': 5, 'quantity': 4, 'reason': 'stock'},
+            {'product_variant_id': other.id, 'requested': 5, 'quantity': 1, 'reason': 'stock'},
+        ])
+
+    def test_unavailable_lines_dropped(self):
+        inactive = self.make_variant(is_active=False)
+        sold_out = self.make_variant(online_stock=0)
+        self.add(self.guest_cart, inactive, 1)
+        self.add(self.guest_cart, sold_out, 2)
+
+        cart, adjustments = merge_guest_cart(self.user, 'guest-session')
+        self.assertFalse(cart.items.exists())
+        self.assertCountEqual(adjustments, [
+            {'product_variant_id': inactive.id, 'requested': 1, 'quantity': 0, 'reason': 'unavailable'},
+            {'product_variant_id': sold_out.id, 'requested': 2, 'quantity': 0, 'reason': 'unavailable'},
+        ])
+
+    def test_repriced_with_current_discount(self):
+        variant = self.make_variant(price=200000, discount=25)
+        cart = Cart.objects.create(user=self.user)
+        self.add(cart, variant, 1, price=200000)
+        fresh = self.make_variant(price=100000, discount=10)
+        self.add(self.guest_cart, variant, 1, price=200000)
+        self.add(self.guest_cart, fresh, 1, price=100000)
+
+        merge_guest_cart(self.user, 'guest-session')
+        prices = dict(cart.items.values_list('product_variant', 'price_at_addition'))
+        self.assertEqual(prices, {variant.id: 150000, fresh.id: 90000})
+
+    def test_without_guest_cart(self):
+        self.assertEqual(merge_guest_cart(self.user, None), (None, []))
+        self.assertEqual(merge_guest_cart(self.user, 'guest-session'), (None, []))
+        self.assertFalse(Cart.objects.filter(session_key='guest-session').exists())
+
+
+class LoginMergeTests(CartTestData, TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        user_cache.clear()
+        get_throttle_store().reset()
+
+    def login(self, session_key):
+        self.client.cookies['sessionid'] = session_key
+        return self.client.post('/api/token/', {'username': 'sara', 'password': 'secret-pass-1'}, format='json')
+
+    def test_login_reports_adjusted_lines(self):
+        session = SessionStore()
+        session.create()
+        variant = self.make_variant(online_stock=2)
+        guest_cart = Cart.objects.create(session_key=session.session_key)
+        CartItem.objects.create(cart=guest_cart, product_variant=variant, quantity=3, price_at_addition=1)
+
+        response = self.login(session.session_key)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('access', response.data)
+        self.assertEqual(response.data['cart_adjustments'], [
+            {'product_variant_id': variant.id, 'requested': 3, 'quantity': 2, 'reason': 'stock'},
+        ])
+
+    def test_login_without_adjustments(self):
+        response = self.login('no-such-session')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('cart_adjustments', response.data)
+
+
+class CartBatchTests(CartTestData, TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        get_throttle_store().reset()
+        self.cart = Cart.objects.create(user=self.user)
+
+    def batch(self, *operations):
+        return self.client.post('/api/cart/batch/', {'operations': list(operations)}, format='json')
+
+    def lines(self):
+        return dict(self.cart.items.values_list('product_variant', 'quantity'))
+
+    def test_operations_applied_together(self):
+        kept = self.make_variant()
+        removed = self.make_variant()
+        kept_item = CartItem.objects.create(cart=self.cart, product_variant=kept, quantity=1, price_at_addition=1)
+        removed_item = CartItem.objects.create(cart=self.cart, product_variant=removed, quantity=1, price_at_addition=1)
+        added = self.make_variant(price=50000)
+
+        response = self.batch(
+            {'op': 'add', 'product_variant_id': added.id, 'quantity': 2},
+            {'op': 'add', 'product_variant_id': added.id},
+            {'op': 'update', 'cart_item_id': kept_item.id, 'quantity': 4},
+            {'op': 'remove', 'cart_item_id': removed_item.id},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.lines(), {kept.id: 4, added.id: 3})
+        self.assertEqual(response.data['total_items'], 7)
+
+    def test_failing_operation_rolls_back_the_batch(self):
+        variant = self.make_variant(online_stock=5)
+        item = CartItem.objects.create(cart=self.cart, product_variant=variant, quantity=1, price_at_addition=1)
+        scarce = self.make_variant(online_stock=1)
+
+        for operations, status_code in (
+            # Out of stock after an otherwise valid add and update
+            ([{'op': 'update', 'cart_item_id': item.id, 'quantity': 3},
+              {'op': 'add', 'product_variant_id': scarce.id, 'quantity': 2}], 400),
+            # Unknown line after a clear
+            ([{'op': 'clear'}, {'op': 'remove', 'cart_item_id': item.id + 1000}], 404),
+            # Unknown variant
+            ([{'op': 'remove', 'cart_item_id': item.id}, {'op': 'add', 'product_variant_id': 999999}], 404),
+            # Invalid quantity, invalid operation
+            ([{'op': 'remove', 'cart_item_id': item.id}, {'op': 'update', 'cart_item_id': item.id, 'quantity': -1}], 404),
+            ([{'op': 'add', 'product_variant_id': scarce.id}, {'op': 'update', 'cart_item_id': item.id, 'quantity': 'x'}], 400),
+            ([{'op': 'add', 'product_variant_id': scarce.id}, {'op': 'explode'}], 400),
+        ):
+            with self.subTest(operations=operations):
+                response = self.batch(*operations)
+                self.assertEqual(response.status_code, status_code)
+                self.assertEqual(self.lines(), {variant.id: 1})
+                self.assertEqual(CartItem.objects.get(pk=item.pk).price_at_addition, 1)
+
+    def test_untouched_lines_are_not_revalidated(self):
+        # A line that is now over the stock (or of a deactivated product) stays as it is and
+        # doesn't fail a batch that doesn't touch it
+        short = self.make_variant(online_stock=1)
+        inactive = self.make_variant(is_active=False)
+        CartItem.objects.create(cart=self.cart, product_variant=short, quantity=3, price_at_addition=1)
+        CartItem.objects.create(cart=self.cart, product_variant=inactive, quantity=1, price_at_addition=1)
+        added = self.make_variant()
+
+        with CaptureQueriesContext(connection) as captured:
+            response = self.batch({'op': 'add', 'product_variant_id': added.id})
+        self.assertEqual(response.status_code, 200)
+        # The new line is inserted and the cart's updated_at set; no other line is written
+        writes = [q['sql'] for q in captured.captured_queries if q['sql'].startswith(('INSERT', 'UPDATE', 'DELETE'))]
+        self.assertEqual(len(writes), 2)
+        self.assertTrue(writes[0].startswith('INSERT INTO "shop_cartitem"'))
+        self.assertTrue(writes[1].startswith('UPDATE "shop_cart" SET "updated_at"'))
+        self.assertEqual(self.lines(), {short.id: 3, inactive.id: 1, added.id: 1})
+        # Untouched lines keep their price too
+        self.assertEqual(CartItem.objects.get(product_variant=short).price_at_addition, 1)
+
+        response = self.batch({'op': 'update', 'cart_item_id': CartItem.objects.get(product_variant=short).id, 'quantity': 2})
+        self.assertEqual(response.status_code, 400)
@@ -0,0 +1,97 @@
+# shop/test_checkout.py
+
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework import serializers
+
+from . import checkout
+from .checkout import place_order
+from .models import (
+    Cart, CartItem, Coupon, CouponRedemption, DailyVariantSales, Job, Order, OrderItem, ProductVariant
+)
+from .test_cart import CartTestData
+
+
+class PlaceOrderTests(CartTestData, TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def fill_cart(self, user, variant, quantity):
+        cart, _ = Cart.objects.get_or_create(user=user)
+        CartItem.objects.create(cart=cart, product_variant=variant, quantity=quantity, price_at_addition=variant.price)
+
+    def assertNothingWritten(self, user, cart_quantity, stock):
+        # The whole checkout was rolled back: no order, lines, redemption, rollups or job,
+        # and the cart and stock are as they were
+        self.assertFalse(Order.objects.filter(user=user).exists())
+        self.assertFalse(OrderItem.objects.filter(order__user=user).exists())
+        self.assertFalse(CouponRedemption.objects.filter(user=user).exists())
+        self.assertEqual(CartItem.objects.filter(cart__user=user).get().quantity, cart_quantity)
+        self.assertEqual(ProductVariant.objects.get(pk=self.variant.pk).online_stock, stock)
+        self.assertEqual(self.snapshot(), self.before)
+
+    def snapshot(self):
+        return list(DailyVariantSales.objects.values_list('day', 'product_variant', 'units')), Job.objects.count()
+
+    def test_oversold_by_concurrent_order(self):
+        # Another checkout takes the stock after this one read it: the stock UPDATE hits the
+        # CHECK (online_stock >= 0) constraint
+        self.variant = self.make_variant(online_stock=2)
+        self.fill_cart(self.user, self.variant, 2)
+        create_order = checkout._create_order
+
+        def concurrent_order_first(**fields):
+            ProductVariant.objects.filter(pk=self.variant.pk).update(online_stock=1)
+            return create_order(**fields)
+
+        self.before = self.snapshot()
+        with self.captureOnCommitCallbacks(execute=True):
+            with mock.patch.object(checkout, '_create_order', side_effect=concurrent_order_first):
+                with self.assertRaisesMessage(serializers.ValidationError, "در این فاصله به پایان رسید"):
+                    place_order(self.user)
+        self.assertNothingWritten(self.user, cart_quantity=2, stock=2)
+
+    def test_stock_read_too_low(self):
+        self.variant = self.make_variant(online_stock=1)
+        self.fill_cart(self.user, self.variant, 2)
+        self.before = self.snapshot()
+        with self.assertRaises(serializers.ValidationError):
+            place_order(self.user)
+        self.assertNothingWritten(self.user, cart_quantity=2, stock=1)
+
+    def test_coupon_exhausted(self):
+        now = timezone.now()
+        coupon = Coupon.objects.create(
+            code='SUMMER', discount_percentage=10, valid_from=now - timedelta(days=1),
+            valid_to=now + timedelta(days=1), max_uses=1,
+        )
+        self.variant = self.make_variant(online_stock=5)
+        other = User.objects.create_user('nima')
+        self.fill_cart(self.user, self.variant, 1)
+        self.fill_cart(other, self.variant, 1)
+
+        order = place_order(self.user, coupon_code='summer')
+        self.assertEqual(order.discount_amount, 10000)
+        self.assertEqual(order.coupon_used_code, 'SUMMER')
+
+        # The cached coupon still shows it unused; the conditional UPDATE turns the second use down
+        self.before = self.snapshot()
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertRaises(serializers.ValidationError) as raised:
+                place_order(other, coupon_code='SUMMER')
+        self.assertIn('max_uses', raised.exception.detail)
+        self.assertNothingWritten(other, cart_quantity=1, stock=4)
+        coupon.refresh_from_db()
+        self.assertEqual(coupon.used_count, 1)
+
+        # Once the cache has the count, the coupon is turned down before anything is written
+        cache.clear()
+        with self.assertRaises(serializers.ValidationError) as raised:
+            place_order(other, coupon_code='SUMMER')
+        self.assertIn('max_uses', raised.exception.detail)
+        self.assertEqual(place_order(other).discount_amount, 0)
@@ -0,0 +1,84 @@
+# shop/test_compression.py
+
+import gzip
+
+from django.core.cache import cache
+from django.test import RequestFactory, TestCase
+from rest_framework.test import APIClient
+
+from .catalog import aget_catalog_cache_key
+from .compression import ENCODINGS, get_encoding
+from .models import Category, Product
+from .querybudget import QueryRecorder
+from .throttling import get_throttle_store
+
+
+class EncodingNegotiationTests(TestCase):
+    def assertEncoding(self, accept_encoding, expected):
+        request = RequestFactory().get('/', HTTP_ACCEPT_ENCODING=accept_encoding)
+        self.assertEqual(get_encoding(request), expected)
+
+    def test_accept_encoding(self):
+        best = ENCODINGS[0] # br with the brotli package installed
+        self.assertEncoding('', None)
+        self.assertEncoding('gzip', 'gzip')
+        self.assertEncoding('GZIP;q=0.5', 'gzip')
+        self.assertEncoding('gzip, deflate, br', best)
+        self.assertEncoding('deflate, gzip;q=0', None)
+        self.assertEncoding('identity', None)
+        self.assertEncoding('*', best)
+        self.assertEncoding('*;q=0.1, gzip;q=0', 'br' if 'br' in ENCODINGS else None)
+        self.assertEncoding('br;q=0.2, gzip;q=0.8', 'gzip')
+        self.assertEncoding('gzip;q=bad', None)
+
+
+class CompressionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name="مانتو", slug="manto")
+        for i in range(10):
+            Product.objects.create(
+                name=f"مانتو کتان {i}", slug=f"manto-{i}", category=category, description="مانتو کتان نخی تابستانه " * 5,
+            )
+
+    def setUp(self):
+        self.client = APIClient()
+        cache.clear()
+        get_throttle_store().reset()
+
+    def test_compressed_when_accepted(self):
+        plain = self.client.get('/api/products/')
+        self.assertNotIn('Content-Encoding', plain)
+        self.assertIn('Accept-Encoding', plain['Vary'])
+
+        response = self.client.get('/api/products/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(int(response['Content-Length']), len(response.content))
+        self.assertLess(len(response.content), len(plain.content) / 3)
+        self.assertEqual(gzip.decompress(response.content), plain.content)
+
+    def test_small_responses_left_alone(self):
+        response = self.client.get('/api/tags/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('Content-Encoding', response)
+        with self.settings(COMPRESSION_MIN_SIZE=10 ** 6):
+            response = self.client.get('/api/products/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertNotIn('Content-Encoding', response)
+
+    async def test_catalog_cache_keeps_compressed_copy(self):
+        plain = await self.async_client.get('/api/async/products/')
+        self.assertNotIn('Content-Encoding', plain)
+
+        response = await self.async_client.get('/api/async/products/', ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(gzip.decompress(response.content), plain.content)
+
+        # Cached with the JSON, so later requests are neither rendered nor compressed again
+        entry = await cache.aget(await aget_catalog_cache_key('http://testserver/api/async/products/'))
+        self.assertEqual(set(entry), {'identity', 'gzip'})
+        with QueryRecorder().recording() as recorder:
+            again = await self.async_client.get('/api/async/products/', ACCEPT_ENCODING='gzip')
+        self.assertEqual(recorder.count, 0)
+        self.assertEqual(again.content, entry['gzip'])
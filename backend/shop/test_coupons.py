@@ -0,0 +1,180 @@
+# shop/test_coupons.py
+
+import csv
+import io
+import os
+import tempfile
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+from rest_framework import serializers
+
+from . import coupons
+from .coupons import generate_coupons, get_coupon, redeem_coupon
+from .models import Coupon, CouponRedemption, Order
+
+
+def make_coupon(**fields):
+    now = timezone.now()
+    fields.setdefault('code', 'SUMMER')
+    fields.setdefault('discount_percentage', 10)
+    return Coupon.objects.create(
+        valid_from=now - timedelta(days=1), valid_to=now + timedelta(days=1), **fields,
+    )
+
+
+class RedeemCouponTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [User.objects.create_user(f'user{i}') for i in range(3)]
+
+    def redeem(self, coupon, user):
+        order = Order.objects.create(user=user, total_amount=100000)
+        redeem_coupon(coupon, user, order, 10000)
+
+    def test_uses_capped_for_all_users_together(self):
+        coupon = make_coupon(usage_limit=1, max_uses=2)
+        self.redeem(coupon, self.users[0])
+        self.redeem(coupon, self.users[1])
+        with self.assertRaises(serializers.ValidationError) as raised:
+            self.redeem(coupon, self.users[2])
+        self.assertIn('max_uses', raised.exception.detail)
+        coupon.refresh_from_db()
+        self.assertEqual(coupon.used_count, 2)
+
+    def test_uses_capped_per_user(self):
+        coupon = make_coupon(usage_limit=1)
+        self.redeem(coupon, self.users[0])
+        with self.assertRaises(serializers.ValidationError) as raised:
+            self.redeem(coupon, self.users[0])
+        self.assertIn('usage_limit', raised.exception.detail)
+        self.assertEqual(CouponRedemption.objects.filter(coupon=coupon).count(), 1)
+
+
+class GenerateCouponsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.template = make_coupon(discount_percentage=15, usage_limit=2, max_uses=100, min_cart_amount=50000)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_codes_created(self):
+        self.assertIsNone(get_coupon('SPRING-ABC')) # Cached as unknown
+        with mock.patch.object(coupons.secrets.SystemRandom, 'choices', side_effect=[list('ABC'), list('XYZ'), list('QRS')]):
+            chunks = list(generate_coupons(self.template, 3, 'spring', prefix='spring-', length=3, chunk_size=2))
+        self.assertEqual(chunks, [['SPRING-ABC', 'SPRING-XYZ'], ['SPRING-QRS']])
+        created = Coupon.objects.filter(campaign='spring')
+        self.assertEqual(created.count(), 3)
+        for coupon in created:
+            self.assertEqual(
+                (coupon.discount_percentage, coupon.usage_limit, coupon.max_uses, coupon.min_cart_amount, coupon.used_count),
+                (15, 2, 100, 50000, 0),
+            )
+        self.assertIsNotNone(get_coupon('spring-abc'))
+
+    def test_taken_codes_generated_again(self):
+        # SPRINGAAA exists already, SPRINGBBB is created by another run of the same campaign
+        # after the existing codes were loaded; neither is reported as created by this call
+        make_coupon(code='SPRINGAAA')
+        draws = iter(['AAA', 'BBB', 'CCC', 'DDD', 'EEE'])
+
+        def choices(alphabet, k):
+            code = next(draws)
+            if code == 'BBB':
+                Coupon.objects.create(
+                    code='SPRINGBBB', campaign='spring', valid_from=timezone.now(), valid_to=timezone.now(), discount_percentage=5,
+                )
+            return list(code)
+
+        with mock.patch.object(coupons.secrets.SystemRandom, 'choices', side_effect=choices):
+            chunks = list(generate_coupons(self.template, 3, 'spring', prefix='SPRING', length=3, chunk_size=3))
+        self.assertEqual(chunks, [['SPRINGCCC', 'SPRINGDDD'], ['SPRINGEEE']])
+        self.assertEqual(sum(len(codes) for codes in chunks), 3)
+        self.assertEqual(Coupon.objects.get(code='SPRINGBBB').discount_percentage, 5)
+        self.assertEqual(Coupon.objects.filter(campaign='spring', discount_percentage=15).count(), 3)
+
+    def test_invalid_arguments(self):
+        for kwargs in ({'campaign': ''}, {'alphabet': 'A'}, {'length': 0}, {'prefix': 'X' * 50}, {'count': 10 ** 6, 'length': 2}):
+            with self.subTest(**kwargs):
+                arguments = {'count': 1, 'campaign': 'spring', **kwargs}
+                with self.assertRaises(ValueError):
+                    next(generate_coupons(self.template, arguments.pop('count'), arguments.pop('campaign'), **arguments))
+        self.assertFalse(Coupon.objects.filter(campaign='spring').exists())
+
+    def test_command_writes_csv(self):
+        stdout, stderr = io.StringIO(), io.StringIO()
+        call_command('generate_coupons', 5, template='summer', campaign='spring', chunk_size=2, stdout=stdout, stderr=stderr)
+        rows = list(csv.reader(io.StringIO(stdout.getvalue())))
+        self.assertEqual(rows[0], ['code', 'campaign'])
+        self.assertCountEqual([code for code, _ in rows[1:]], Coupon.objects.filter(campaign='spring').values_list('code', flat=True))
+        self.assertEqual(len(rows), 6)
+        self.assertEqual(set(Coupon.objects.filter(campaign='spring').values_list('max_uses', flat=True)), {1})
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'codes.csv')
+            call_command('generate_coupons', 2, template='SUMMER', campaign='autumn', max_uses=0, output=path, stderr=stderr)
+            with open(path, newline='') as output:
+                rows = list(csv.reader(output))
+        self.assertEqual([campaign for _, campaign in rows[1:]], ['autumn', 'autumn'])
+        self.assertEqual(set(Coupon.objects.filter(campaign='autumn').values_list('max_uses', flat=True)), {100})
+
+    def test_admin_action(self):
+        self.client.force_login(User.objects.create_superuser('admin', password='x'))
+
+        def generate(**fields):
+            data = {'action': 'generate_codes', '_selected_action': [self.template.pk], 'prefix': 'vip', **fields}
+            return self.client.post('/admin/shop/coupon/', data)
+
+        response = generate(count=3, campaign='vip')
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        rows = list(csv.reader(io.StringIO(b''.join(response.streaming_content).decode())))
+        self.assertEqual(rows[0], ['code', 'campaign'])
+        self.assertEqual(len(rows), 4)
+        created = Coupon.objects.filter(campaign='vip')
+        self.assertCountEqual([code for code, _ in rows[1:]], created.values_list('code', flat=True))
+        self.assertTrue(all(code.startswith('VIP') for code, _ in rows[1:]))
+        self.assertEqual(set(created.values_list('max_uses', flat=True)), {1})
+
+        # Without a campaign nothing is created
+        response = generate(count=3, campaign='')
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(Coupon.objects.count(), 4)
+
+
+class CouponMaxUsesMigrationTests(TransactionTestCase):
+    def migrate(self, target):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate([('shop', target)])
+        return executor.loader.project_state([('shop', target)]).apps.get_model('shop', 'Coupon')
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def test_existing_coupons_keep_their_cap(self):
+        # usage_limit used to cap all uses together; existing coupons get it as max_uses
+        now = timezone.now()
+        dates = {'discount_percentage': 10, 'valid_from': now, 'valid_to': now}
+        OldCoupon = self.migrate('0007_coupon_redemption')
+        OldCoupon.objects.create(code='ONCE', usage_limit=1, **dates)
+        OldCoupon.objects.create(code='FIFTY', usage_limit=50, **dates)
+
+        Coupon = self.migrate('0010_backfill_status_changed_at')
+        Coupon.objects.create(code='CAPPED', usage_limit=1, max_uses=5, **dates)
+        self.assertEqual(
+            dict(Coupon.objects.values_list('code', 'max_uses')), {'ONCE': None, 'FIFTY': None, 'CAPPED': 5},
+        )
+
+        Coupon = self.migrate('0011_coupon_max_uses_from_usage_limit')
+        self.assertEqual(
+            dict(Coupon.objects.values_list('code', 'max_uses')), {'ONCE': 1, 'FIFTY': 50, 'CAPPED': 5},
+        )
@@ -0,0 +1,129 @@
+# shop/test_fastjson.py
+
+import datetime
+from decimal import Decimal
+from unittest import skipIf
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import RequestFactory, TestCase
+from django.utils import timezone
+from django.utils.translation import gettext_lazy
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from . import renderers
+from .catalog import get_product_queryset
+from .fastserializers import compile_serializer
+from .models import Cart, CartItem, Category, Product, ProductBatch, ProductVariant, Size, SizeQuantity, Tag
+from .renderers import ORJSONRenderer
+from .serializers import CartSerializer, ProductDetailSerializer, ProductListSerializer
+from .throttling import get_throttle_store
+
+
+@skipIf(renderers.orjson is None, "orjson is not installed")
+class ORJSONRendererTests(TestCase):
+    def assertSameJSON(self, data, accepted_media_type=None, renderer_context=None):
+        self.assertEqual(
+            ORJSONRenderer().render(data, accepted_media_type, renderer_context),
+            JSONRenderer().render(data, accepted_media_type, renderer_context),
+        )
+
+    def test_same_bytes_as_json_renderer(self):
+        tehran = timezone.get_default_timezone()
+        self.assertSameJSON({
+            'price': Decimal('1250000'),
+            'ratio': Decimal('0.125'),
+            'utc': datetime.datetime(2024, 3, 20, 8, 30, tzinfo=datetime.timezone.utc),
+            'local': datetime.datetime(2024, 3, 20, 12, 0, 0, 5, tzinfo=tehran),
+            'naive': datetime.datetime(2024, 3, 20, 12, 0),
+            'date': datetime.date(2024, 3, 20),
+            'time': datetime.time(9, 15, 30),
+            'text': "مانتو کتان  \"نخی\" \\ </script>",
+            'lazy': gettext_lazy("Active"),
+            'nested': [{'id': 1, 'tags': ()}, None, True, 12.5, -3],
+            1: 'int key',
+        })
+        self.assertSameJSON(None)
+
+    def test_falls_back_to_json_renderer(self):
+        self.assertSameJSON({'big': 2 ** 70})
+        self.assertSameJSON({'id': 1}, 'application/json; indent=4')
+
+
+class CompiledSerializerTests(TestCase):
+    # Compiled serializers give the DRF serializers' data (compared rendered, so key order
+    # counts too), and the responses the same bytes
+
+    @classmethod
+    def setUpTestData(cls):
+        now = timezone.now()
+        cls.user = User.objects.create_user('sara', password='secret-pass-1')
+        category = Category.objects.create(name="مانتو", slug="manto", image='categories/manto.jpg')
+        size = Size.objects.create(size='M')
+        tag = Tag.objects.create(name="تابستانه", slug="summer")
+        for i in range(12):
+            product = Product.objects.create(
+                name=f"مانتو {i}", slug=f"manto-{i}", category=category if i % 3 else None,
+                main_image=f'products/manto-{i}.jpg' if i % 2 else '', fixed_discount_percentage=i,
+                timed_discount_percentage=25 if i % 4 == 0 else 0,
+                timed_discount_start_date=now - datetime.timedelta(days=1),
+                timed_discount_end_date=now + datetime.timedelta(days=1),
+            )
+            if i % 2:
+                product.tags.add(tag)
+            batch = ProductBatch.objects.create(product=product, color="مشکی", total_quantity=5)
+            quantity = SizeQuantity.objects.create(product_batch=batch, size=size, quantity=5, price=100000 + i)
+            for j in range(i % 3):
+                ProductVariant.objects.create(
+                    product=product, size=quantity, color=f"رنگ {j}", price=100000 + 1000 * i + j,
+                    stock=5, online_stock=j,
+                )
+        cls.cart = Cart.objects.create(user=cls.user)
+        cls.guest_cart = Cart.objects.create(session_key='guest-session')
+        for variant in ProductVariant.objects.all()[:4]:
+            CartItem.objects.create(cart=cls.cart, product_variant=variant, quantity=2, price_at_addition=variant.price)
+        CartItem.objects.create(cart=cls.guest_cart, product_variant=variant, quantity=1, price_at_addition=variant.price)
+
+    def setUp(self):
+        cache.clear()
+        get_throttle_store().reset()
+
+    def assertSameData(self, serializer_class, instance, many=False):
+        context = {'request': RequestFactory().get('/api/')}
+        renderer = JSONRenderer()
+        self.assertEqual(
+            renderer.render(compile_serializer(serializer_class)(instance, many=many, context=context).data),
+            renderer.render(serializer_class(instance, many=many, context=context).data),
+        )
+
+    def test_product_list(self):
+        self.assertSameData(ProductListSerializer, list(get_product_queryset()), many=True)
+
+    def test_product_detail(self):
+        # Not used for it, but nested lists, method fields and ids work the same
+        for product in get_product_queryset(detail=True):
+            self.assertSameData(ProductDetailSerializer, product)
+
+    def test_cart(self):
+        # A guest cart has no user.username; DRF leaves "user" out and so does the compiled one
+        for cart in (self.cart, self.guest_cart):
+            self.assertSameData(CartSerializer, cart)
+
+    def test_same_responses(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        responses = {}
+        for fast_json in (False, True):
+            with self.settings(FAST_JSON=fast_json):
+                responses[fast_json] = [
+                    client.get(path)
+                    for path in ('/api/products/', '/api/products/?page=2', '/api/products/?category_slug=manto', '/api/cart/')
+                ]
+        self.assertEqual(
+            [response.content for response in responses[True]],
+            [response.content for response in responses[False]],
+        )
+        # The renderer is picked at startup; render the compiled data with it too
+        for response in responses[True]:
+            self.assertEqual(ORJSONRenderer().render(response.data), response.content)
@@ -0,0 +1,95 @@
+# shop/test_idempotency.py
+
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from .idempotency import _claim, _owned
+from .models import Cart, CartItem, Category, IdempotencyKey, Product, ProductBatch, ProductVariant, Size, SizeQuantity
+from .throttling import get_throttle_store
+
+
+@override_settings(IDEMPOTENCY_LOCK_TIMEOUT=0.2)
+class IdempotencyTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('sara', password='secret-pass-1')
+        category = Category.objects.create(name="مانتو", slug="manto")
+        size = Size.objects.create(size='M')
+        product = Product.objects.create(name="مانتو کتان", slug="manto-katan", category=category)
+        batch = ProductBatch.objects.create(product=product, color="مشکی", total_quantity=10)
+        quantity = SizeQuantity.objects.create(product_batch=batch, size=size, quantity=10, price=100000)
+        cls.variant = ProductVariant.objects.create(
+            product=product, size=quantity, color="مشکی", price=100000, stock=10, online_stock=10,
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        get_throttle_store().reset()
+
+    def add_item(self, key, quantity=1):
+        return self.client.post(
+            '/api/cart/add_item/', {'product_variant_id': self.variant.id, 'quantity': quantity},
+            format='json', headers={'Idempotency-Key': key},
+        )
+
+    def cart_quantity(self):
+        return CartItem.objects.get(cart=Cart.objects.get(user=self.user)).quantity
+
+    def test_retry_replays_the_response(self):
+        first = self.add_item('key-1')
+        self.assertEqual(first.status_code, 200)
+        self.assertNotIn('Idempotent-Replayed', first)
+
+        retry = self.add_item('key-1')
+        self.assertEqual(retry.status_code, 200)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(retry.content, first.content)
+        self.assertEqual(self.cart_quantity(), 1)
+
+        self.add_item('key-2')
+        self.assertEqual(self.cart_quantity(), 2)
+
+    def test_key_reused_for_another_request(self):
+        self.add_item('key-1')
+        response = self.add_item('key-1', quantity=3)
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(self.cart_quantity(), 1)
+
+    def test_concurrent_duplicate(self):
+        # The first attempt is still running (no response stored yet): the duplicate waits
+        # IDEMPOTENCY_LOCK_TIMEOUT for it, then gives up without running the view
+        self.add_item('key-1')
+        IdempotencyKey.objects.update(response_status=None, response_body=None)
+        response = self.add_item('key-1')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(self.cart_quantity(), 1)
+
+    def test_abandoned_attempt_is_taken_over(self):
+        # A worker died mid-request, leaving its key in progress; once the claim is older than
+        # IDEMPOTENCY_LOCK_TTL a retry runs the view and stores its response
+        self.add_item('key-1')
+        IdempotencyKey.objects.update(
+            response_status=None, response_body=None, claimed_at=timezone.now() - timedelta(minutes=5),
+        )
+        response = self.add_item('key-1')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('Idempotent-Replayed', response)
+        self.assertEqual(self.cart_quantity(), 2)
+        self.assertEqual(IdempotencyKey.objects.get().response_status, 200)
+        self.assertEqual(self.add_item('key-1')['Idempotent-Replayed'], 'true')
+
+    def test_superseded_attempt_does_not_store_its_response(self):
+        # A slow attempt whose key was taken over meanwhile leaves the new owner's row alone
+        record, created = _claim('user:0', 'key-1', 'fingerprint')
+        self.assertTrue(created)
+        IdempotencyKey.objects.filter(pk=record.pk).update(claimed_at=timezone.now() - timedelta(minutes=5))
+        record.claimed_at = timezone.now() - timedelta(minutes=5)
+        retry, created = _claim('user:0', 'key-1', 'fingerprint')
+        self.assertTrue(created)
+        self.assertEqual(_owned(record).update(response_status=200), 0)
+        self.assertEqual(_owned(retry).update(response_status=201), 1)
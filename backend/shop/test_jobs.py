@@ -0,0 +1,126 @@
+# shop/test_jobs.py
+
+import time
+from datetime import timedelta
+from unittest import mock
+
+from django.test import TestCase
+from django.utils import timezone
+
+from . import jobs
+from .jobs import claim_next_job, enqueue, execute_job, heartbeat, requeue_stale_jobs, run_pending_jobs, task
+from .models import Job
+
+calls = []
+
+
+@task(name='test.record', max_attempts=3)
+def record(value):
+    calls.append(value)
+
+
+@task(name='test.slow')
+def slow():
+    time.sleep(0.1)
+
+
+@task(name='test.fail', max_attempts=2)
+def fail():
+    raise RuntimeError("boom")
+
+
+class JobQueueTests(TestCase):
+    def setUp(self):
+        calls.clear()
+
+    def make_job(self, name='test.record', **fields):
+        fields.setdefault('args', [1])
+        return Job.objects.create(task=name, max_attempts=jobs.get_task(name).max_attempts, **fields)
+
+    def test_enqueue_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            enqueue(record, args=['a'], dedup_key='k')
+            enqueue(record, args=['b'], dedup_key='k')
+            self.assertFalse(Job.objects.exists())
+        self.assertEqual(list(Job.objects.values_list('args', flat=True)), [['a']])
+        self.assertEqual(run_pending_jobs(), 1)
+        self.assertEqual(calls, ['a'])
+
+    def test_claim(self):
+        now = timezone.now()
+        later = self.make_job(run_at=now - timedelta(seconds=1))
+        first = self.make_job(run_at=now - timedelta(seconds=5))
+        self.make_job(run_at=now + timedelta(minutes=5))
+        self.make_job(queue='notifications')
+
+        job = claim_next_job('default', 'w1')
+        self.assertEqual(job.pk, first.pk)
+        self.assertEqual((job.status, job.locked_by, job.attempts), (Job.STATUS_RUNNING, 'w1', 1))
+        # A claimed job isn't handed out again; jobs not yet due never are
+        self.assertEqual(claim_next_job('default', 'w2').pk, later.pk)
+        self.assertIsNone(claim_next_job('default', 'w3'))
+
+    def test_retry_then_fail(self):
+        job = self.make_job('test.fail', args=[])
+        self.assertFalse(execute_job(claim_next_job('default', 'w1')))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts, job.locked_by, job.locked_at), (Job.STATUS_PENDING, 1, '', None))
+        self.assertIn("boom", job.last_error)
+        self.assertGreater(job.run_at, timezone.now())
+        self.assertIsNone(claim_next_job('default', 'w1'))
+
+        Job.objects.filter(pk=job.pk).update(run_at=timezone.now())
+        self.assertFalse(execute_job(claim_next_job('default', 'w1')))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.STATUS_FAILED, 2))
+        self.assertIsNone(claim_next_job('default', 'w1'))
+
+    def test_stale_jobs_requeued_or_failed(self):
+        stale = timezone.now() - timedelta(seconds=jobs.TASK_STALE_AFTER + 1)
+        retried = self.make_job(status=Job.STATUS_RUNNING, attempts=1, locked_by='w1', locked_at=stale)
+        exhausted = self.make_job(status=Job.STATUS_RUNNING, attempts=3, locked_by='w2', locked_at=stale)
+        alive = self.make_job(status=Job.STATUS_RUNNING, attempts=1, locked_by='w3', locked_at=timezone.now())
+
+        self.assertEqual(requeue_stale_jobs(), (1, 1))
+        retried.refresh_from_db()
+        exhausted.refresh_from_db()
+        alive.refresh_from_db()
+        self.assertEqual((retried.status, retried.locked_by, retried.locked_at), (Job.STATUS_PENDING, '', None))
+        self.assertEqual((exhausted.status, exhausted.locked_by), (Job.STATUS_FAILED, ''))
+        self.assertIn("heartbeat", exhausted.last_error)
+        self.assertEqual((alive.status, alive.locked_by), (Job.STATUS_RUNNING, 'w3'))
+
+        job = claim_next_job('default', 'w4')
+        self.assertEqual((job.pk, job.attempts), (retried.pk, 2))
+
+    def test_heartbeat_keeps_job_fresh(self):
+        self.make_job()
+        job = claim_next_job('default', 'w1')
+        Job.objects.filter(pk=job.pk).update(locked_at=timezone.now() - timedelta(seconds=jobs.TASK_STALE_AFTER + 1))
+        self.assertEqual(heartbeat(job), 1)
+        self.assertEqual(requeue_stale_jobs(), (0, 0))
+
+    def test_superseded_attempt_leaves_job_alone(self):
+        # The worker was taken for dead and the job requeued and claimed again; when the first
+        # worker finishes after all it neither beats nor marks the job done
+        self.make_job()
+        first = claim_next_job('default', 'w1')
+        Job.objects.filter(pk=first.pk).update(locked_at=timezone.now() - timedelta(seconds=jobs.TASK_STALE_AFTER + 1))
+        requeue_stale_jobs()
+        second = claim_next_job('default', 'w1')
+
+        self.assertEqual(heartbeat(first), 0)
+        self.assertTrue(execute_job(first))
+        second.refresh_from_db()
+        self.assertEqual((second.status, second.attempts), (Job.STATUS_RUNNING, 2))
+        self.assertTrue(execute_job(second))
+        second.refresh_from_db()
+        self.assertEqual(second.status, Job.STATUS_DONE)
+
+    def test_heartbeat_while_running(self):
+        self.make_job('test.slow', args=[])
+        job = claim_next_job('default', 'w1')
+        with mock.patch.object(jobs, 'TASK_HEARTBEAT_INTERVAL', 0.01), mock.patch.object(jobs, 'heartbeat') as beat:
+            self.assertTrue(execute_job(job))
+        self.assertGreater(beat.call_count, 1)
+        beat.assert_called_with(job)
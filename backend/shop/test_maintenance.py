@@ -0,0 +1,112 @@
+# shop/test_maintenance.py
+
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.contrib.sessions.backends.db import SessionStore
+from django.contrib.sessions.models import Session
+from django.test import TestCase
+from django.utils import timezone
+
+from .maintenance import _delete_guest_carts, _delete_in_chunks, purge_stale_data
+from .models import Cart, CartItem, Category, Job, Product, ProductBatch, ProductVariant, Size, SizeQuantity
+
+
+class PurgeStaleDataTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name="مانتو", slug="manto")
+        size = Size.objects.create(size='M')
+        product = Product.objects.create(name="مانتو کتان", slug="manto-katan", category=category)
+        batch = ProductBatch.objects.create(product=product, color="مشکی", total_quantity=10)
+        quantity = SizeQuantity.objects.create(product_batch=batch, size=size, quantity=10, price=100000)
+        cls.variant = ProductVariant.objects.create(
+            product=product, size=quantity, color="مشکی", price=100000, stock=10, online_stock=10,
+        )
+
+    def make_cart(self, age, items=1, user=None):
+        session_key = None
+        if user is None:
+            session = SessionStore()
+            session.create()
+            session_key = session.session_key
+        cart = Cart.objects.create(user=user, session_key=session_key)
+        for _ in range(items):
+            CartItem.objects.create(cart=cart, product_variant=self.variant, quantity=1, price_at_addition=1)
+        Cart.objects.filter(pk=cart.pk).update(updated_at=timezone.now() - age)
+        return cart
+
+    def test_purge(self):
+        stale = self.make_cart(timedelta(days=40))
+        empty = self.make_cart(timedelta(days=2), items=0)
+        fresh = self.make_cart(timedelta(hours=1))
+        fresh_empty = self.make_cart(timedelta(hours=1), items=0)
+        user_cart = self.make_cart(timedelta(days=40), user=User.objects.create_user('sara'))
+
+        report = purge_stale_data(chunk_size=1)
+        self.assertEqual(report['carts'], 2)
+        self.assertEqual(report['cart_items'], 1)
+        self.assertEqual(report['sessions'], 2)
+        self.assertCountEqual(Cart.objects.values_list('pk', flat=True), [fresh.pk, fresh_empty.pk, user_cart.pk])
+        self.assertEqual(user_cart.items.count(), 1)
+        self.assertCountEqual(
+            Session.objects.values_list('session_key', flat=True), [fresh.session_key, fresh_empty.session_key],
+        )
+        self.assertFalse(Session.objects.filter(session_key__in=[stale.session_key, empty.session_key]).exists())
+
+        report = purge_stale_data(include_user_carts=True)
+        self.assertEqual(report['cart_items'], 1)
+        self.assertTrue(Cart.objects.filter(pk=user_cart.pk).exists())
+        self.assertFalse(user_cart.items.exists())
+
+    def test_finished_jobs_purged(self):
+        def job(status, age):
+            job = Job.objects.create(task='shop.tasks.notify_new_review', status=status)
+            Job.objects.filter(pk=job.pk).update(updated_at=timezone.now() - age)
+            return job.pk
+
+        kept = [
+            job(Job.STATUS_DONE, timedelta(days=10)),
+            job(Job.STATUS_FAILED, timedelta(days=40)),
+            job(Job.STATUS_PENDING, timedelta(days=400)),
+            job(Job.STATUS_RUNNING, timedelta(days=400)),
+        ]
+        job(Job.STATUS_DONE, timedelta(days=40))
+        job(Job.STATUS_FAILED, timedelta(days=100))
+
+        self.assertEqual(purge_stale_data()['jobs'], 2)
+        self.assertCountEqual(Job.objects.values_list('pk', flat=True), kept)
+        self.assertEqual(purge_stale_data(failed_job_days=30)['jobs'], 1)
+
+    def test_cart_changed_after_select_is_kept(self):
+        # Between selecting a chunk and deleting it, one stale cart is touched and one empty
+        # cart gets an item; both are kept, with their sessions
+        touched = self.make_cart(timedelta(days=40))
+        abandoned = self.make_cart(timedelta(days=40))
+        filled = self.make_cart(timedelta(days=2), items=0)
+        empty = self.make_cart(timedelta(days=2), items=0)
+
+        def touch_then_delete(carts):
+            Cart.objects.filter(pk=touched.pk).update(updated_at=timezone.now())
+            return _delete_guest_carts(carts)
+
+        def fill_then_delete(carts):
+            CartItem.objects.create(cart=filled, product_variant=self.variant, quantity=1, price_at_addition=1)
+            return _delete_guest_carts(carts)
+
+        stale = _delete_in_chunks(
+            Cart.objects.filter(user__isnull=True, updated_at__lt=timezone.now() - timedelta(days=30)).order_by('pk'),
+            touch_then_delete, 10, 0,
+        )
+        empties = _delete_in_chunks(
+            Cart.objects.filter(
+                user__isnull=True, updated_at__lt=timezone.now() - timedelta(hours=24), items__isnull=True
+            ).order_by('pk'),
+            fill_then_delete, 10, 0,
+        )
+        self.assertEqual(stale['carts'], 1)
+        self.assertEqual(empties['carts'], 1)
+        self.assertCountEqual(Cart.objects.values_list('pk', flat=True), [touched.pk, filled.pk])
+        self.assertCountEqual(
+            Session.objects.values_list('session_key', flat=True), [touched.session_key, filled.session_key],
+        )
@@ -0,0 +1,59 @@
+# shop/test_metrics.py
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from .metrics import LATENCY_BUCKETS, get_metrics_store, registry, render_metrics
+from .models import Category
+from .throttling import get_throttle_store
+
+
+@override_settings(METRICS_TOKEN='secret')
+class MetricsTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        registry.clear()
+        get_metrics_store().reset()
+        get_throttle_store().reset()
+        Category.objects.create(name="category", slug="category")
+
+    def scrape(self):
+        response = self.client.get('/metrics/', HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, 200)
+        return response.content.decode()
+
+    def test_requires_token(self):
+        self.assertEqual(self.client.get('/metrics/').status_code, 403)
+        self.assertEqual(self.client.get('/metrics/', HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+
+    def test_request_counters_per_view(self):
+        self.client.get('/api/categories/')
+        self.client.get('/api/categories/')
+        self.client.get('/api/categories/404/')
+        body = self.scrape()
+        self.assertIn('shop_http_requests_total{view="CategoryViewSet.list",method="GET",status="200"} 2', body)
+        self.assertIn('shop_http_requests_total{view="CategoryViewSet.retrieve",method="GET",status="404"} 1', body)
+        self.assertIn('shop_http_request_duration_seconds_count{view="CategoryViewSet.list",method="GET"} 2', body)
+        self.assertIn('shop_http_request_duration_seconds_bucket{view="CategoryViewSet.list",method="GET",le="+Inf"} 2', body)
+        self.assertRegex(body, r'shop_db_queries_total\{view="CategoryViewSet.list"\} [1-9]')
+        self.assertIn('# TYPE shop_http_request_duration_seconds histogram', body)
+
+    def test_cache_hits_and_misses(self):
+        cache.get('metrics-test')
+        cache.set('metrics-test', 1)
+        cache.get('metrics-test')
+        cache.get_many(['metrics-test', 'metrics-test-2'])
+        body = self.scrape()
+        self.assertIn('shop_cache_requests_total{view="none",result="hit"} 2', body)
+        self.assertIn('shop_cache_requests_total{view="none",result="miss"} 2', body)
+
+    def test_buckets_are_cumulative_and_ordered(self):
+        registry.observe_request('View.get', 'GET', 200, 0.02, 0, 0.0)
+        registry.flush()
+        lines = [
+            line for line in render_metrics(get_metrics_store().read()).splitlines()
+            if line.startswith('shop_http_request_duration_seconds_bucket')
+        ]
+        self.assertEqual(len(lines), len(LATENCY_BUCKETS) + 1)
+        self.assertEqual([line.rsplit(' ', 1)[1] for line in lines], ['0', '0', '1', '1', '1', '1', '1', '1', '1', '1', '1', '1'])
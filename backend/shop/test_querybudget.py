@@ -0,0 +1,49 @@
+# shop/test_querybudget.py
+
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from .models import Category
+from .querybudget import QUERY_BUDGET_HEADER, QueryBudgetExceeded, assert_query_budget, get_sql_shape
+from .throttling import get_throttle_store
+
+
+class QueryBudgetTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        get_throttle_store().reset()
+        Category.objects.bulk_create([Category(name=f"category {i}", slug=f"category-{i}") for i in range(3)])
+
+    def test_sql_shape_ignores_in_list_length(self):
+        self.assertEqual(
+            get_sql_shape('SELECT * FROM t WHERE id IN (%s, %s)'),
+            get_sql_shape('SELECT *  FROM t\n WHERE id IN (%s)'),
+        )
+
+    def test_helper_reports_repeated_queries(self):
+        with self.assertRaisesMessage(QueryBudgetExceeded, 'Same query ran 3 times (limit 1)'):
+            with assert_query_budget(10, repeat_limit=1):
+                for category in Category.objects.all():
+                    Category.objects.filter(pk=category.pk).exists()
+
+    def test_helper_reports_budget(self):
+        with self.assertRaisesMessage(QueryBudgetExceeded, '2 queries, budget is 1'):
+            with assert_query_budget(1):
+                list(Category.objects.all())
+                list(Category.objects.all())
+
+    @override_settings(QUERY_BUDGET={'HEADER': True, 'VIEWS': {'category-list': 5}})
+    def test_header(self):
+        response = self.client.get('/api/categories/')
+        self.assertRegex(response[QUERY_BUDGET_HEADER], r'^queries=\d+; budget=5; time_ms=[\d.]+; repeated=0$')
+
+    @override_settings(QUERY_BUDGET={'VIEWS': {'category-list': 0}, 'RAISE': True})
+    def test_over_budget_request_fails_in_strict_mode(self):
+        with self.assertRaises(QueryBudgetExceeded):
+            self.client.get('/api/categories/')
+
+    @override_settings(QUERY_BUDGET={'VIEWS': {'category-list': 0}})
+    def test_over_budget_request_is_logged(self):
+        with self.assertLogs('shop.querybudget', 'WARNING') as logs:
+            self.client.get('/api/categories/')
+        self.assertIn('GET /api/categories/', logs.output[0])
@@ -0,0 +1,353 @@
+# shop/test_querycounts.py
+
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.contrib.sessions.backends.db import SessionStore
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from .authentication import user_cache
+from .coupons import redeem_coupon
+from .models import (
+    Address, Cart, CartItem, Category, Coupon, Order, OrderItem, Product, ProductBatch, ProductVariant,
+    Review, Size, SizeQuantity, Slider, Tag, UserProfile
+)
+from .sales import record_order
+from .serializers import MyTokenObtainPairSerializer
+from .throttling import get_throttle_store
+
+# Every route is requested with this many items behind it (products, variants, reviews,
+# cart lines, orders, ...); the query count must be the same for all of them
+SIZES = (1, 50)
+
+
+@override_settings(METRICS_TOKEN='secret')
+class RouteQueryCountTests(TestCase):
+    # Exact query counts for every route in shiva_gallery/urls.py (the Django admin aside),
+    # each at both SIZES. A count that grows with the data is an N+1 in a view or serializer.
+    # Authenticated unsafe requests include the user row StatelessJWTAuthentication checks.
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('sara', password='secret-pass-1', first_name='Sara')
+        cls.profile = UserProfile.objects.create(user=cls.user, phone_number='09120000000')
+        cls.admin = User.objects.create_user('admin', password='secret-pass-1', is_staff=True)
+        cls.category = Category.objects.create(name="مانتو", slug="manto")
+        cls.size = Size.objects.create(size='M')
+
+    def token(self, user):
+        return str(MyTokenObtainPairSerializer.get_token(user).access_token)
+
+    def count_queries(self, size, build, method, path, body=None, user=None, headers=None):
+        # Builds the data for `size`, requests the route and rolls everything back
+        with transaction.atomic():
+            context = build(size) or {}
+            client = APIClient()
+            if user is not None:
+                client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.token(user)}")
+            if 'session_key' in context:
+                client.cookies['sessionid'] = context['session_key']
+            resolved_path = path(context) if callable(path) else path
+            resolved_body = body(context) if callable(body) else body
+            user_cache.clear()
+            cache.clear()
+            get_throttle_store().reset()
+            with CaptureQueriesContext(connection) as captured:
+                response = getattr(client, method)(resolved_path, resolved_body, format='json', headers=headers)
+            transaction.set_rollback(True)
+        self.assertLess(response.status_code, 400, f"{method.upper()} {resolved_path}: {getattr(response, 'data', response)}")
+        return len(captured.captured_queries)
+
+    def assertRouteQueries(self, expected, build, method, path, body=None, user=None, headers=None):
+        counts = {size: self.count_queries(size, build, method, path, body, user, headers) for size in SIZES}
+        self.assertEqual(counts, {size: expected for size in SIZES})
+
+    # Data builders: each creates `n` of something and returns what the request needs
+
+    def make_product(self, variants=1, name="مانتو کتان", **fields):
+        product = Product.objects.create(name=name, slug=f"{name}-{Product.objects.count()}", category=self.category, **fields)
+        batches = ProductBatch.objects.bulk_create([
+            ProductBatch(product=product, color=f"رنگ {i}", total_quantity=10) for i in range(variants)
+        ])
+        quantities = SizeQuantity.objects.bulk_create([
+            SizeQuantity(product_batch=batch, size=self.size, quantity=10, price=100000) for batch in batches
+        ])
+        ProductVariant.objects.bulk_create([
+            ProductVariant(product=product, size=quantity, color=batch.color, price=100000, stock=10, online_stock=10)
+            for batch, quantity in zip(batches, quantities)
+        ])
+        return product
+
+    def make_users(self, n):
+        return User.objects.bulk_create([User(username=f"user-{i}", first_name=f"نام {i}") for i in range(n)])
+
+    def categories(self, n):
+        Category.objects.bulk_create([Category(name=f"دسته {i}", slug=f"category-{i}") for i in range(n)])
+        return {'category': self.category}
+
+    def sliders(self, n):
+        sliders = Slider.objects.bulk_create([Slider(title=f"اسلاید {i}", image='images/slide.jpg', order=i) for i in range(n)])
+        return {'slider': sliders[0]}
+
+    def tags(self, n):
+        tags = Tag.objects.bulk_create([Tag(name=f"تگ {i}", slug=f"tag-{i}") for i in range(n)])
+        return {'tag': tags[0]}
+
+    def products(self, n):
+        # n products, each with two variants, two tags and a review
+        tags = Tag.objects.bulk_create([Tag(name=f"تگ {i}", slug=f"tag-{i}") for i in range(2)])
+        for i in range(n):
+            product = self.make_product(variants=2, name=f"محصول {i}", fixed_discount_percentage=10)
+            product.tags.set(tags)
+            Review.objects.create(product=product, user=self.user, user_name='Sara', rating=5, is_approved=True)
+        return {'product': product}
+
+    def product_items(self, n):
+        # One product with n variants, n tags and n reviews by different users
+        product = self.make_product(variants=n)
+        product.tags.set(Tag.objects.bulk_create([Tag(name=f"تگ {i}", slug=f"tag-{i}") for i in range(n)]))
+        Review.objects.bulk_create([
+            Review(product=product, user=user, user_name=user.username, rating=4, is_approved=True)
+            for user in self.make_users(n)
+        ])
+        return {'product': product}
+
+    def reviews(self, n):
+        product = self.make_product()
+        reviews = Review.objects.bulk_create([
+            Review(product=product, user=user, user_name=user.username, rating=4, is_approved=True)
+            for user in self.make_users(n)
+        ])
+        return {'product': product, 'review': reviews[0]}
+
+    def cart_items(self, n):
+        product = self.make_product(variants=n + 1)
+        variants = list(product.variants.order_by('id'))
+        cart = Cart.objects.create(user=self.user)
+        items = CartItem.objects.bulk_create([
+            CartItem(cart=cart, product_variant=variant, quantity=1, price_at_addition=variant.price)
+            for variant in variants[:n]
+        ])
+        Coupon.objects.create(
+            code='OFF10', discount_percentage=10, usage_limit=5,
+            valid_from=timezone.now() - timedelta(days=1), valid_to=timezone.now() + timedelta(days=1),
+        )
+        return {'item': items[0], 'new_variant': variants[n]}
+
+    def guest_cart(self, n):
+        session = SessionStore()
+        session.create()
+        product = self.make_product(variants=n)
+        cart = Cart.objects.create(session_key=session.session_key)
+        CartItem.objects.bulk_create([
+            CartItem(cart=cart, product_variant=variant, quantity=1, price_at_addition=variant.price)
+            for variant in product.variants.all()
+        ])
+        return {'session_key': session.session_key}
+
+    def orders(self, n):
+        # n orders of the user, each with two lines, recorded in the sales rollups
+        product = self.make_product(variants=2)
+        variants = list(product.variants.all())
+        for i in range(n):
+            order = Order.objects.create(
+                user=self.user, total_amount=200000, tracking_code=f"TRACK{i:05d}", status='paid',
+            )
+            OrderItem.objects.bulk_create([
+                OrderItem(order=order, product_variant=variant, quantity=1, price_at_order=variant.price)
+                for variant in variants
+            ])
+            record_order(order, [(variant.id, self.category.id, 1, variant.price) for variant in variants])
+        return {'order': order}
+
+    def order_items(self, n):
+        product = self.make_product(variants=n)
+        order = Order.objects.create(user=self.user, total_amount=100000 * n, tracking_code='TRACK00001')
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product_variant=variant, quantity=1, price_at_order=variant.price)
+            for variant in product.variants.all()
+        ])
+        return {'order': order}
+
+    def addresses(self, n):
+        addresses = Address.objects.bulk_create([
+            Address(
+                user=self.user, province='تهران', city='تهران', street=f"خیابان {i}", postal_code='1234567890',
+                recipient_name='Sara', recipient_phone_number='09120000000', is_default=i == 0,
+            )
+            for i in range(n)
+        ])
+        return {'address': addresses[-1]}
+
+    def users(self, n):
+        self.make_users(n)
+
+    def coupons(self, n):
+        # n coupons, each redeemed once
+        order = Order.objects.create(user=self.user, total_amount=100000)
+        coupons = Coupon.objects.bulk_create([
+            Coupon(
+                code=f"CODE{i}", discount_amount=1000, usage_limit=5,
+                valid_from=timezone.now() - timedelta(days=1), valid_to=timezone.now() + timedelta(days=1),
+            )
+            for i in range(n)
+        ])
+        for coupon in coupons:
+            redeem_coupon(coupon, self.user, order, Decimal(1000))
+
+    # Catalog
+
+    def test_categories(self):
+        self.assertRouteQueries(2, self.categories, 'get', '/api/categories/')
+        self.assertRouteQueries(1, self.categories, 'get', lambda c: f"/api/categories/{c['category'].pk}/")
+
+    def test_sliders(self):
+        self.assertRouteQueries(2, self.sliders, 'get', '/api/sliders/')
+        self.assertRouteQueries(1, self.sliders, 'get', lambda c: f"/api/sliders/{c['slider'].pk}/")
+
+    def test_tags(self):
+        self.assertRouteQueries(2, self.tags, 'get', '/api/tags/')
+        self.assertRouteQueries(1, self.tags, 'get', lambda c: f"/api/tags/{c['tag'].pk}/")
+
+    def test_product_list(self):
+        self.assertRouteQueries(4, self.products, 'get', '/api/products/')
+        self.assertRouteQueries(4, self.products, 'get', "/api/products/?category_slug=manto")
+
+    def test_product_detail(self):
+        self.assertRouteQueries(6, self.product_items, 'get', lambda c: f"/api/products/{c['product'].slug}/")
+
+    def test_async_catalog(self):
+        # Counted on a cold cache; a cached response runs none
+        self.assertRouteQueries(4, self.products, 'get', '/api/async/products/')
+        self.assertRouteQueries(6, self.product_items, 'get', lambda c: f"/api/async/products/{c['product'].slug}/")
+        self.assertRouteQueries(2, self.categories, 'get', '/api/async/categories/')
+        self.assertRouteQueries(2, self.sliders, 'get', '/api/async/sliders/')
+        self.assertRouteQueries(5, self.products, 'get', '/api/async/home/')
+
+    def test_reviews(self):
+        self.assertRouteQueries(2, self.reviews, 'get', '/api/reviews/')
+        self.assertRouteQueries(2, self.reviews, 'get', lambda c: f"/api/reviews/?product_slug={c['product'].slug}")
+        self.assertRouteQueries(1, self.reviews, 'get', lambda c: f"/api/reviews/{c['review'].pk}/")
+        self.assertRouteQueries(
+            3, self.reviews, 'post', '/api/reviews/',
+            lambda c: {'product': c['product'].pk, 'rating': 5, 'comment': 'عالی'}, user=self.user,
+        )
+
+    # Cart
+
+    def test_cart(self):
+        self.assertRouteQueries(4, self.cart_items, 'get', '/api/cart/', user=self.user)
+
+    def test_cart_add_item(self):
+        self.assertRouteQueries(
+            12, self.cart_items, 'post', '/api/cart/add_item/',
+            lambda c: {'product_variant_id': c['new_variant'].pk, 'quantity': 1}, user=self.user,
+        )
+
+    def test_cart_update_item(self):
+        self.assertRouteQueries(
+            10, self.cart_items, 'put', '/api/cart/update_item/',
+            lambda c: {'cart_item_id': c['item'].pk, 'quantity': 2}, user=self.user,
+        )
+
+    def test_cart_remove_item(self):
+        self.assertRouteQueries(
+            8, self.cart_items, 'delete', '/api/cart/remove_item/', lambda c: {'cart_item_id': c['item'].pk}, user=self.user,
+        )
+
+    def test_cart_clear(self):
+        self.assertRouteQueries(7, self.cart_items, 'post', '/api/cart/clear_cart/', user=self.user)
+
+    def test_cart_batch(self):
+        self.assertRouteQueries(
+            12, self.cart_items, 'post', '/api/cart/batch/',
+            lambda c: {'operations': [
+                {'op': 'add', 'product_variant_id': c['new_variant'].pk, 'quantity': 1},
+                {'op': 'update', 'cart_item_id': c['item'].pk, 'quantity': 2},
+            ]},
+            user=self.user,
+        )
+
+    def test_cart_apply_coupon(self):
+        self.assertRouteQueries(
+            5, self.cart_items, 'post', '/api/cart/apply_coupon/', {'coupon_code': 'OFF10'}, user=self.user,
+        )
+
+    # Orders
+
+    def test_order_list(self):
+        self.assertRouteQueries(4, self.orders, 'get', '/api/orders/', user=self.user)
+        self.assertRouteQueries(5, self.orders, 'get', '/api/orders/?view=full', user=self.user)
+
+    def test_order_detail(self):
+        self.assertRouteQueries(2, self.order_items, 'get', lambda c: f"/api/orders/{c['order'].pk}/", user=self.user)
+
+    def test_checkout(self):
+        self.assertRouteQueries(
+            19, self.cart_items, 'post', '/api/orders/', {'shipping_method': 'post_office'}, user=self.user,
+        )
+
+    def test_order_tracking(self):
+        self.assertRouteQueries(1, self.order_items, 'get', lambda c: f"/api/track/{c['order'].tracking_code}/")
+
+    # Addresses and profile
+
+    def test_addresses(self):
+        self.assertRouteQueries(2, self.addresses, 'get', '/api/addresses/', user=self.user)
+        self.assertRouteQueries(1, self.addresses, 'get', lambda c: f"/api/addresses/{c['address'].pk}/", user=self.user)
+        self.assertRouteQueries(
+            2, self.addresses, 'post', '/api/addresses/',
+            {
+                'province': 'تهران', 'city': 'تهران', 'street': 'خیابان آزادی', 'postal_code': '1234567890',
+                'recipient_name': 'Sara', 'recipient_phone_number': '09120000000',
+            },
+            user=self.user,
+        )
+        self.assertRouteQueries(
+            6, self.addresses, 'post', lambda c: f"/api/addresses/{c['address'].pk}/set_default/", user=self.user,
+        )
+
+    def test_profile(self):
+        self.assertRouteQueries(1, self.addresses, 'get', '/api/profile/', user=self.user)
+        self.assertRouteQueries(1, self.addresses, 'get', f"/api/profile/{self.profile.pk}/", user=self.user)
+        self.assertRouteQueries(
+            3, self.addresses, 'patch', f"/api/profile/{self.profile.pk}/", {'phone_number': '09121111111'}, user=self.user,
+        )
+
+    # Accounts
+
+    def test_token(self):
+        self.assertRouteQueries(
+            14, self.guest_cart, 'post', '/api/token/', {'username': 'sara', 'password': 'secret-pass-1'},
+        )
+
+    def test_token_refresh(self):
+        refresh = str(MyTokenObtainPairSerializer.get_token(self.user))
+        self.assertRouteQueries(1, self.users, 'post', '/api/token/refresh/', {'refresh': refresh})
+
+    def test_register(self):
+        self.assertRouteQueries(
+            2, self.users, 'post', '/api/register/',
+            {
+                'username': 'new-user', 'password': 'secret-pass-1', 'password2': 'secret-pass-1',
+                'email': 'new@example.com', 'first_name': 'Ali', 'last_name': 'Rezaei',
+            },
+        )
+
+    # Reports
+
+    def test_sales_report(self):
+        self.assertRouteQueries(2, self.orders, 'get', '/api/reports/sales/', user=self.admin)
+        self.assertRouteQueries(2, self.orders, 'get', '/api/reports/sales/?group=variant', user=self.admin)
+
+    def test_coupon_stats(self):
+        self.assertRouteQueries(2, self.coupons, 'get', '/api/reports/coupons/', user=self.admin)
+
+    def test_metrics(self):
+        self.assertRouteQueries(0, self.users, 'get', '/metrics/', headers={'Authorization': 'Bearer secret'})
@@ -0,0 +1,80 @@
+# shop/test_routers.py
+
+from types import SimpleNamespace
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase, TestCase
+from rest_framework.test import APIClient
+
+from . import routers
+from .models import Category
+from .routers import ReadReplicaRouter, get_replica_database, read_replica
+
+
+def fake_connections(default, replica):
+    return {'default': SimpleNamespace(settings_dict={'NAME': default}), 'replica': SimpleNamespace(settings_dict={'NAME': replica})}
+
+
+class ReplicaDatabaseTests(SimpleTestCase):
+    def test_not_configured(self):
+        with mock.patch.dict(settings.DATABASES):
+            settings.DATABASES.pop('replica', None)
+            self.assertIsNone(get_replica_database())
+
+    def test_separate_database(self):
+        with mock.patch.dict(settings.DATABASES, {'replica': {}}), \
+                mock.patch.object(routers, 'connections', fake_connections('db.sqlite3', 'file:db.sqlite3?mode=ro')):
+            self.assertEqual(get_replica_database(), 'replica')
+
+    def test_test_mirror_reads_default(self):
+        with mock.patch.dict(settings.DATABASES, {'replica': {}}), \
+                mock.patch.object(routers, 'connections', fake_connections('test.sqlite3', 'test.sqlite3')):
+            self.assertIsNone(get_replica_database())
+
+
+@mock.patch.object(routers, 'get_replica_database', return_value='replica')
+class ReadReplicaRouterTests(SimpleTestCase):
+    def setUp(self):
+        self.router = ReadReplicaRouter()
+
+    def test_reads_inside_read_replica(self, replica):
+        self.assertIsNone(self.router.db_for_read(Category))
+        with read_replica():
+            self.assertEqual(self.router.db_for_read(Category), 'replica')
+        self.assertIsNone(self.router.db_for_read(Category))
+
+    def test_writes_never_go_to_the_replica(self, replica):
+        category = Category(name="category", slug="category")
+        category._state.db = 'replica'
+        with read_replica():
+            self.assertEqual(self.router.db_for_write(Category, instance=category), 'default')
+            self.assertIsNone(self.router.db_for_write(Category))
+
+    def test_relations_and_migrations(self, replica):
+        category, other = Category(), Category()
+        category._state.db, other._state.db = 'default', 'replica'
+        self.assertTrue(self.router.allow_relation(category, other))
+        self.assertFalse(self.router.allow_migrate('replica', 'shop', 'category'))
+        self.assertIsNone(self.router.allow_migrate('default', 'shop', 'category'))
+
+
+class ReplicaReadMixinTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        Category.objects.create(name="category", slug="category")
+
+    def test_catalog_reads_use_the_replica(self):
+        # 'default' stands in for the replica, which tests don't have a database of their own for
+        with mock.patch.object(routers, 'get_replica_database', return_value='default') as replica:
+            response = self.client.get('/api/categories/')
+        self.assertEqual(response.status_code, 200)
+        replica.assert_called()
+
+    def test_writes_and_other_views_use_default(self):
+        self.client.force_authenticate(User.objects.create_user('sara', password='secret-pass-1', is_staff=True))
+        with mock.patch.object(routers, 'get_replica_database', return_value='default') as replica:
+            self.assertEqual(self.client.post('/api/categories/', {'name': "new", 'slug': "new"}).status_code, 201)
+            self.assertEqual(self.client.get('/api/orders/').status_code, 200)
+        replica.assert_not_called()
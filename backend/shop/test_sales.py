@@ -0,0 +1,113 @@
+# shop/test_sales.py
+
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.utils import timezone
+
+from . import sales
+from .archive import _archive_rows, archive_orders
+from .models import (
+    ArchivedOrder, ArchivedOrderItem, Category, DailyCategorySales, DailyVariantSales, Order, OrderItem, Product, ProductBatch,
+    ProductVariant, Size, SizeQuantity
+)
+from .orders import change_order_status
+from .sales import rebuild_rollups, record_order
+
+
+class RebuildRollupsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('sara')
+        cls.category = Category.objects.create(name="مانتو", slug="manto")
+        size = Size.objects.create(size='M')
+        product = Product.objects.create(name="مانتو کتان", slug="manto-katan", category=cls.category)
+        batch = ProductBatch.objects.create(product=product, color="مشکی", total_quantity=100)
+        quantity = SizeQuantity.objects.create(product_batch=batch, size=size, quantity=100, price=100000)
+        cls.variant = ProductVariant.objects.create(
+            product=product, size=quantity, color="مشکی", price=100000, stock=100, online_stock=100,
+        )
+
+    def place(self, days_ago=0, quantity=1, status='paid'):
+        # An order as checkout leaves it: its line written and recorded in the rollups
+        order = Order.objects.create(user=self.user, total_amount=100000 * quantity, status=status)
+        Order.objects.filter(pk=order.pk).update(order_date=timezone.now() - timedelta(days=days_ago))
+        order.refresh_from_db()
+        OrderItem.objects.create(order=order, product_variant=self.variant, quantity=quantity, price_at_order=100000)
+        record_order(order, [(self.variant.id, self.category.id, quantity, 100000)])
+        return order
+
+    def rollups(self):
+        return (
+            sorted(DailyVariantSales.objects.values_list('day', 'product_variant', 'units', 'gross')),
+            sorted(DailyCategorySales.objects.values_list('day', 'category', 'units', 'gross')),
+        )
+
+    def units_by_day(self):
+        return dict(DailyVariantSales.objects.values_list('day', 'units'))
+
+    def test_rebuild_after_cancel_and_restore(self):
+        cancelled = self.place(days_ago=3, quantity=2)
+        restored = self.place(days_ago=3, quantity=3)
+        self.place(days_ago=1, quantity=4)
+        self.place(days_ago=0, quantity=5)
+        change_order_status(Order.objects.filter(pk__in=[cancelled.pk, restored.pk]), 'cancelled')
+        change_order_status(Order.objects.filter(pk=restored.pk), 'processing')
+
+        today = timezone.localdate()
+        expected = {today - timedelta(days=3): 3, today - timedelta(days=1): 4, today: 5}
+        self.assertEqual(self.units_by_day(), expected)
+        before = self.rollups()
+        for chunk_size in (1, 2, 1000):
+            with self.subTest(chunk_size=chunk_size):
+                self.assertEqual(rebuild_rollups(chunk_size=chunk_size), 3)
+                self.assertEqual(self.rollups(), before)
+
+        # Rebuilding from a day on leaves the earlier days as they are
+        DailyVariantSales.objects.filter(day=today - timedelta(days=3)).update(units=99)
+        self.assertEqual(rebuild_rollups(since=today - timedelta(days=1)), 2)
+        self.assertEqual(self.units_by_day(), {**expected, today - timedelta(days=3): 99})
+
+    def test_rebuild_replaces_stale_rows(self):
+        self.place(days_ago=2)
+        DailyVariantSales.objects.filter(day=timezone.localdate() - timedelta(days=2)).update(units=50)
+        DailyVariantSales.objects.create(day=timezone.localdate() - timedelta(days=30), product_variant=self.variant, units=7)
+        rebuild_rollups(chunk_size=1)
+        self.assertEqual(self.units_by_day(), {timezone.localdate() - timedelta(days=2): 1})
+
+    def test_order_placed_during_rebuild_counted_once(self):
+        self.place(days_ago=2)
+        self.place(days_ago=1)
+        rebuild_days = sales._rebuild_days
+        placed = []
+
+        def place_between_ranges(start, end, chunk_size):
+            # Checkouts (of today) run between the rebuild's transactions
+            count = rebuild_days(start, end, chunk_size)
+            placed.append(self.place(quantity=2))
+            return count
+
+        with mock.patch.object(sales, '_rebuild_days', side_effect=place_between_ranges):
+            rebuild_rollups(chunk_size=1)
+        self.assertGreater(len(placed), 1)
+        self.assertEqual(self.units_by_day()[timezone.localdate()], 2 * len(placed))
+
+    def test_archived_orders_counted_once(self):
+        archived = self.place(days_ago=400, status='delivered')
+        self.place(days_ago=400, quantity=2)
+        Order.objects.filter(pk=archived.pk).update(status_changed_at=timezone.now() - timedelta(days=300))
+        before = self.rollups()
+
+        # archive_orders() stopped after writing the archive, before deleting the order here
+        archived_orders, archived_items = _archive_rows([archived])
+        ArchivedOrder.objects.bulk_create(archived_orders)
+        ArchivedOrderItem.objects.bulk_create(archived_items)
+        rebuild_rollups(chunk_size=1)
+        self.assertEqual(self.rollups(), before)
+
+        self.assertEqual(archive_orders(older_than_days=180), 1)
+        self.assertFalse(Order.objects.filter(pk=archived.pk).exists())
+        rebuild_rollups(chunk_size=1)
+        self.assertEqual(self.rollups(), before)
@@ -0,0 +1,110 @@
+# shop/test_throttling.py
+
+import os
+import tempfile
+import threading
+import time
+from unittest import mock
+
+from django.conf import settings
+from django.test import SimpleTestCase, TestCase, override_settings
+from rest_framework.test import APIClient
+
+from . import throttling
+from .throttling import BUCKET_IDLE_TIMEOUT, ThrottleStore, get_throttle_store
+
+
+class ThrottleStoreTests(SimpleTestCase):
+    def setUp(self):
+        self.store = ThrottleStore(settings.THROTTLE_STORE_PATH)
+        self.store.reset()
+        self.now = 1_000_000.0
+        patcher = mock.patch.object(throttling.time, 'time', side_effect=lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def consume(self, key='k', capacity=3, duration=60):
+        return self.store.consume(key, capacity, duration)
+
+    def test_burst_then_rejected(self):
+        self.assertEqual([self.consume()[0] for _ in range(3)], [True, True, True])
+        allowed, wait = self.consume()
+        self.assertFalse(allowed)
+        self.assertAlmostEqual(wait, 20) # One token per 20 seconds
+        # Rejected requests don't use up tokens
+        self.now += 10
+        allowed, wait = self.consume()
+        self.assertFalse(allowed)
+        self.assertAlmostEqual(wait, 10)
+
+    def test_refill(self):
+        for _ in range(3):
+            self.consume()
+        self.now += 20
+        self.assertEqual(self.consume(), (True, None))
+        self.assertFalse(self.consume()[0])
+        # Refilled up to the capacity, no further
+        self.now += 3600
+        self.assertEqual([self.consume()[0] for _ in range(4)], [True, True, True, False])
+
+    def test_keys_are_separate(self):
+        for _ in range(3):
+            self.consume('a')
+        self.assertFalse(self.consume('a')[0])
+        self.assertTrue(self.consume('b')[0])
+
+    def test_concurrent_requests(self):
+        # Threads with their own connections, like worker processes: exactly `capacity` get through
+        results = []
+
+        def hit():
+            for _ in range(10):
+                results.append(self.consume(capacity=25)[0])
+
+        threads = [threading.Thread(target=hit) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results.count(True), 25)
+        self.assertEqual(results.count(False), 25)
+
+    def test_idle_buckets_purged(self):
+        self.consume('old')
+        self.now += BUCKET_IDLE_TIMEOUT + 1
+        self.consume('new')
+        self.store.purge()
+        keys = [key for key, in self.store._connect().execute('SELECT key FROM throttle_bucket')]
+        self.assertEqual(keys, ['new'])
+
+    def test_one_store_per_path(self):
+        store = get_throttle_store()
+        self.assertEqual(store.path, str(settings.THROTTLE_STORE_PATH))
+        self.assertIs(get_throttle_store(), store)
+        with tempfile.TemporaryDirectory() as directory:
+            with override_settings(THROTTLE_STORE_PATH=os.path.join(directory, 'other.sqlite3')):
+                other = get_throttle_store()
+            self.assertIsNot(other, store)
+            self.assertTrue(os.path.exists(other.path))
+            other._connect().close()
+
+
+# Failed logins hash the password; the default hasher is slow on purpose
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class ThrottledEndpointTests(TestCase):
+    def setUp(self):
+        get_throttle_store().reset()
+
+    def test_login_rate(self):
+        # 'login': '10/minute'
+        client = APIClient()
+        for _ in range(10):
+            response = client.post('/api/token/', {'username': 'nobody', 'password': 'x'}, format='json')
+            self.assertEqual(response.status_code, 401)
+        response = client.post('/api/token/', {'username': 'nobody', 'password': 'x'}, format='json')
+        self.assertEqual(response.status_code, 429)
+        self.assertIn(int(response['Retry-After']), range(1, 7))
+
+        with mock.patch.object(throttling.time, 'time', return_value=time.time() + 6):
+            response = client.post('/api/token/', {'username': 'nobody', 'password': 'x'}, format='json')
+        self.assertEqual(response.status_code, 401)
@@ -0,0 +1,56 @@
+# shop/test_tracking.py
+
+import time
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from .models import Order
+from .orders import change_order_status
+from .throttling import get_throttle_store
+
+
+class OrderTrackingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.order = Order.objects.create(
+            user=User.objects.create_user('sara'), total_amount=100000, status='paid', tracking_code='ABCDE12345',
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        cache.clear()
+        get_throttle_store().reset()
+
+    def status(self, code='ABCDE12345'):
+        response = self.client.get(f'/api/track/{code}/')
+        self.assertEqual(response.status_code, 200)
+        return response.data['status']
+
+    def test_status_change_is_shown(self):
+        self.assertEqual(self.status('abcde-12345'), 'paid')
+        with self.captureOnCommitCallbacks(execute=True):
+            change_order_status(Order.objects.filter(pk=self.order.pk), 'shipped')
+        self.assertEqual(self.status(), 'shipped')
+
+    def test_status_saved_on_the_model(self):
+        self.assertEqual(self.status(), 'paid')
+        order = Order.objects.get(pk=self.order.pk)
+        order.status = 'delivered'
+        with self.captureOnCommitCallbacks(execute=True):
+            order.save(update_fields=['status'])
+        self.assertEqual(self.status(), 'delivered')
+
+    def test_change_in_another_process_is_shown_after_timeout(self):
+        # The status was changed by another worker process, which cleared its own cache only
+        self.assertEqual(self.status(), 'paid')
+        Order.objects.filter(pk=self.order.pk).update(status='shipped')
+        self.assertEqual(self.status(), 'paid')
+        with mock.patch('time.time', return_value=time.time() + 61):
+            self.assertEqual(self.status(), 'shipped')
+
+    def test_unknown_code(self):
+        self.assertEqual(self.client.get('/api/track/NOSUCHCODE/').status_code, 404)
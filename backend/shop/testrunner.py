@@ -0,0 +1,30 @@
+# shop/testrunner.py
+
+import os
+import tempfile
+
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+from .metrics import registry
+
+
+class ShopTestRunner(DiscoverRunner):
+    # DiscoverRunner with the SQLite side stores (throttle buckets, metrics) in a temporary
+    # directory, so tests never read or fill the ones the dev server uses. The directory is
+    # deleted after the run.
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._store_dir = tempfile.TemporaryDirectory(prefix='shop-test-')
+        self._store_settings = override_settings(
+            THROTTLE_STORE_PATH=os.path.join(self._store_dir.name, 'throttle.sqlite3'),
+            METRICS_STORE_PATH=os.path.join(self._store_dir.name, 'metrics.sqlite3'),
+        )
+        self._store_settings.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        # Counters left by the last requests would be flushed to the real store at exit
+        registry.clear()
+        self._store_settings.disable()
+        self._store_dir.cleanup()
+        super().teardown_test_environment(**kwargs)
@@ -0,0 +1,96 @@
+# shop/throttling.py
+
+import threading
+import time
+
+from rest_framework.throttling import AnonRateThrottle, ScopedRateThrottle, SimpleRateThrottle, UserRateThrottle
+
+from .sqlitestore import SQLiteStore, StoreRegistry
+
+# Buckets untouched for this long are full again (no DRF rate is longer than a day) and are deleted
+BUCKET_IDLE_TIMEOUT = 24 * 60 * 60
+PURGE_EVERY = 1000 # Requests per process between purges
+
+# Take one token from the bucket, refilled by elapsed time, in one statement.
+# SQLite evaluates every SET expression with the old row values, so `allowed` and `tokens`
+# both see the refilled amount before the token is taken.
+_CONSUME_SQL = """
+INSERT INTO throttle_bucket (key, tokens, updated, allowed) VALUES (:key, :capacity - 1, :now, 1)
+ON CONFLICT (key) DO UPDATE SET
+    allowed = MIN(:capacity, tokens + (:now - updated) * :rate) >= 1,
+    tokens = MIN(:capacity, tokens + (:now - updated) * :rate)
+             - (MIN(:capacity, tokens + (:now - updated) * :rate) >= 1),
+    updated = :now
+RETURNING allowed, tokens
+"""
+
+
+class ThrottleStore(SQLiteStore):
+    # Token buckets in an SQLite file shared by all worker processes of the host.
+    # Each request is one indexed UPSERT of a fixed size row, however high the rate.
+    schema = (
+        'CREATE TABLE IF NOT EXISTS throttle_bucket ('
+        'key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL, allowed INTEGER NOT NULL'
+        ') WITHOUT ROWID'
+    )
+
+    def __init__(self, path):
+        super().__init__(path)
+        self._lock = threading.Lock()
+        self._calls = 0
+
+    def consume(self, key, capacity, duration):
+        # Returns (allowed, seconds until the next token if not allowed)
+        rate = capacity / duration
+        connection = self._connect()
+        allowed, tokens = connection.execute(
+            _CONSUME_SQL, {'key': key, 'capacity': capacity, 'rate': rate, 'now': time.time()}
+        ).fetchone()
+        with self._lock:
+            self._calls += 1
+            purge = self._calls % PURGE_EVERY == 0
+        if purge:
+            self.purge()
+        return bool(allowed), None if allowed else (1 - tokens) / rate
+
+    def purge(self):
+        self._connect().execute('DELETE FROM throttle_bucket WHERE updated < ?', (time.time() - BUCKET_IDLE_TIMEOUT,))
+
+    def reset(self):
+        self._connect().execute('DELETE FROM throttle_bucket')
+
+
+_stores = StoreRegistry(ThrottleStore, 'THROTTLE_STORE_PATH', 'throttle.sqlite3')
+
+
+def get_throttle_store():
+    return _stores.get()
+
+
+class TokenBucketThrottle(SimpleRateThrottle):
+    # SimpleRateThrottle with the request history replaced by a token bucket in the shared
+    # store: `num_requests` per `duration` on average, with bursts up to `num_requests`.
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+        allowed, self._wait = get_throttle_store().consume(self.key, self.num_requests, self.duration)
+        return allowed
+
+    def wait(self):
+        return getattr(self, '_wait', None)
+
+
+class AnonBucketThrottle(AnonRateThrottle, TokenBucketThrottle):
+    pass
+
+
+class UserBucketThrottle(UserRateThrottle, TokenBucketThrottle):
+    pass
+
+
+class ScopedBucketThrottle(ScopedRateThrottle, TokenBucketThrottle):
+    # Only applies to views (or actions) with a `throttle_scope`, on top of the anon/user limits
+    pass
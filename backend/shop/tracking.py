@@ -0,0 +1,78 @@
+# shop/tracking.py
+
+import secrets
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import ArchivedOrder, Order
+
+# Crockford base32 without the easily confused I, L, O and U; 10 characters is about 50 bits
+TRACKING_CODE_ALPHABET = '0123456789ABCDEFGHJKMNPQRSTVWXYZ'
+TRACKING_CODE_LENGTH = 10
+TRACKING_CACHE_PREFIX = 'order-tracking:'
+
+TRACKING_FIELDS = ('tracking_code', 'status', 'order_date', 'status_changed_at', 'shipping_method')
+
+
+def generate_tracking_code():
+    return ''.join(secrets.choice(TRACKING_CODE_ALPHABET) for _ in range(TRACKING_CODE_LENGTH))
+
+
+def normalize_tracking_code(code):
+    return code.strip().upper().replace('-', '')
+
+
+def _cache_key(code):
+    return f"{TRACKING_CACHE_PREFIX}{code}"
+
+
+def _project(values):
+    # Minimal public view of an order: no customer, address or amounts
+    status_names = dict(Order.ORDER_STATUS_CHOICES)
+    shipping_names = dict(Order.SHIPPING_METHOD_CHOICES)
+    return {
+        'tracking_code': values['tracking_code'],
+        'status': values['status'],
+        'status_display': status_names.get(values['status'], values['status']),
+        'order_date': values['order_date'],
+        'status_changed_at': values['status_changed_at'],
+        'shipping_method': values['shipping_method'],
+        'shipping_method_display': shipping_names.get(values['shipping_method'], values['shipping_method']),
+    }
+
+
+def get_tracking_info(code):
+    # Cached until the order's status changes (see invalidate_tracking) or for at most
+    # TRACKING_CACHE_TIMEOUT seconds: the cache is per process, and a status change only clears
+    # the entry of the process that made it
+    code = normalize_tracking_code(code)
+    info = cache.get(_cache_key(code))
+    if info is not None:
+        return info
+    values = Order.objects.filter(tracking_code=code).values(*TRACKING_FIELDS).first()
+    if values is None:
+        values = ArchivedOrder.objects.filter(tracking_code=code).values(*TRACKING_FIELDS).first()
+    if values is None:
+        return None
+    info = _project(values)
+    cache.set(_cache_key(code), info, getattr(settings, 'TRACKING_CACHE_TIMEOUT', 60))
+    return info
+
+
+def invalidate_tracking(codes):
+    codes = [code for code in codes if code]
+    if codes:
+        cache.delete_many([_cache_key(code) for code in codes])
+
+
+@receiver(post_save, sender=Order)
+@receiver(post_delete, sender=Order)
+def invalidate_order_tracking(sender, instance, **kwargs):
+    # Every save of an order, wherever it comes from. Bulk status changes (queryset.update())
+    # send no signal and go through change_order_status() (shop/orders.py), which invalidates.
+    code = instance.tracking_code
+    transaction.on_commit(lambda: invalidate_tracking([code]))
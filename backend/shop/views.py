@@ -3,35 +3,69 @@
 from rest_framework import viewsets, status, serializers
 from rest_framework.response import Response
 from rest_framework.decorators import action
-from rest_framework.permissions import IsAuthenticated, AllowAny
+from rest_framework.permissions import IsAuthenticated, AllowAny, IsAdminUser, SAFE_METHODS
 from rest_framework_simplejwt.views import TokenObtainPairView
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
 from rest_framework.views import APIView
 from django.contrib.auth.models import User
 from django.shortcuts import get_object_or_404
-from django.db.models import F, Sum, Case, When, DecimalField, IntegerField
+from django.http import Http404
+from django.db.models import F, Sum, Case, When, DecimalField, IntegerField, OuterRef, Prefetch, Subquery
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 from decimal import Decimal
+from datetime import date
 
 from .models import (
     Category, Slider, Tag, Product, ProductBatch,
     Size, SizeQuantity, ProductVariant, Review,
-    UserProfile, Address, Cart, CartItem, Order, OrderItem, Coupon
+    UserProfile, Address, Cart, CartItem, Order, OrderItem, Coupon,
+    DailyCategorySales, DailyVariantSales, ArchivedOrder
 )
 from .serializers import (
     CategorySerializer, SliderSerializer, TagSerializer,
     ProductListSerializer, ProductDetailSerializer, ProductBatchSerializer,
     SizeSerializer, SizeQuantitySerializer, ProductVariantSerializer, ReviewSerializer,
     MyTokenObtainPairSerializer, RegisterSerializer, UserProfileSerializer,
-    AddressSerializer, CartSerializer, CartItemSerializer, OrderSerializer, CouponSerializer,
-    UserSerializer
+    AddressSerializer, CartSerializer, CartItemSerializer, OrderSerializer, OrderSummarySerializer, CouponSerializer,
+    UserSerializer, ArchivedOrderSerializer, ArchivedOrderSummarySerializer
 )
+from .accounts import get_profile
+from .cart import merge_guest_cart, apply_cart_operations, get_cart_total
+from .coupons import evaluate_coupon, get_coupon, get_redemption_stats
+from .idempotency import idempotent
+from .checkout import place_order
+from .archive import CombinedOrderList, get_archived_orders
+from .tracking import get_tracking_info
+from .catalog import get_product_queryset
+from .fastserializers import fast_serializer
+from .routers import read_replica
+from .jobs import enqueue
+from .tasks import notify_new_review
 
 # JWT Views
 class MyTokenObtainPairView(TokenObtainPairView):
     serializer_class = MyTokenObtainPairSerializer
+    throttle_scope = 'login'
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        try:
+            serializer.is_valid(raise_exception=True)
+        except TokenError as e:
+            raise InvalidToken(e.args[0]) from e
+
+        # Move the guest cart of this session (if any) into the user's cart, telling the
+        # client which lines were dropped or reduced on the way (see merge_guest_cart)
+        data = dict(serializer.validated_data)
+        cart, adjustments = merge_guest_cart(serializer.user, request.session.session_key)
+        if adjustments:
+            data['cart_adjustments'] = adjustments
+        return Response(data, status=status.HTTP_200_OK)
 
 class RegisterView(APIView):
     permission_classes = [AllowAny]
+    throttle_scope = 'register'
 
     def post(self, request):
         serializer = RegisterSerializer(data=request.data)
@@ -48,13 +82,9 @@ class UserProfileViewSet(viewsets.ModelViewSet):
 
     def get_object(self):
         # This method is called for detail actions (retrieve, update, destroy)
-        # Ensure user is authenticated and has a profile
         if not self.request.user.is_authenticated:
             raise serializers.ValidationError("احراز هویت لازم است.", code=status.HTTP_401_UNAUTHORIZED)
-        try:
-            return self.request.user.profile
-        except UserProfile.DoesNotExist:
-            raise serializers.ValidationError("پروفایل کاربر یافت نشد.", code=status.HTTP_404_NOT_FOUND)
+        return get_profile(self.request.user)
 
     def list(self, request, *args, **kwargs):
         # For /api/profile/, return the current user's profile
@@ -65,29 +95,21 @@ class UserProfileViewSet(viewsets.ModelViewSet):
             # If a token exists but is invalid, authenticatedFetch will handle it.
             # Here, we just state that no profile is available for anonymous user.
             return Response({"detail": "کاربر احراز هویت نشده است. پروفایلی برای نمایش وجود ندارد."}, status=status.HTTP_200_OK)
-        
-        try:
-            instance = self.request.user.profile
-            serializer = self.get_serializer(instance)
-            return Response(serializer.data)
-        except UserProfile.DoesNotExist:
-            # If user is authenticated but has no profile, return 404
-            return Response({"detail": "پروفایل کاربر یافت نشد."}, status=status.HTTP_404_NOT_FOUND)
+
+        serializer = self.get_serializer(get_profile(request.user))
+        return Response(serializer.data)
 
 
     def retrieve(self, request, pk=None, *args, **kwargs):
         # For /api/profile/<pk>/, ensure pk matches current user's profile ID
         if not request.user.is_authenticated:
             return Response({"detail": "احراز هویت لازم است."}, status=status.HTTP_401_UNAUTHORIZED)
-        
-        try:
-            profile_instance = self.request.user.profile
-            if int(pk) != profile_instance.id:
-                return Response({"detail": "شما اجازه دسترسی به این پروفایل را ندارید."}, status=status.HTTP_403_FORBIDDEN)
-            serializer = self.get_serializer(profile_instance)
-            return Response(serializer.data)
-        except UserProfile.DoesNotExist:
-            return Response({"detail": "پروفایل کاربر یافت نشد."}, status=status.HTTP_404_NOT_FOUND)
+
+        profile_instance = get_profile(request.user)
+        if int(pk) != profile_instance.id:
+            return Response({"detail": "شما اجازه دسترسی به این پروفایل را ندارید."}, status=status.HTTP_403_FORBIDDEN)
+        serializer = self.get_serializer(profile_instance)
+        return Response(serializer.data)
 
 
     def update(self, request, *args, **kwargs):
@@ -96,10 +118,7 @@ class UserProfileViewSet(viewsets.ModelViewSet):
         if not request.user.is_authenticated:
             return Response({"detail": "احراز هویت لازم است."}, status=status.HTTP_401_UNAUTHORIZED)
 
-        try:
-            instance = self.request.user.profile
-        except UserProfile.DoesNotExist:
-            return Response({"detail": "پروفایل کاربر یافت نشد."}, status=status.HTTP_404_NOT_FOUND)
+        instance = get_profile(request.user)
 
         user_data = request.data.pop('user', None)
         if user_data:
@@ -123,8 +142,18 @@ class UserProfileViewSet(viewsets.ModelViewSet):
         return Response({"detail": "حذف پروفایل از این طریق مجاز نیست."}, status=status.HTTP_405_METHOD_NOT_ALLOWED)
 
 
+class ReplicaReadMixin:
+    # GET/HEAD/OPTIONS requests read from the 'replica' connection when one is configured
+    # (DATABASE_PROFILE=production); writes always go to the default database
+    def dispatch(self, request, *args, **kwargs):
+        if request.method in SAFE_METHODS:
+            with read_replica():
+                return super().dispatch(request, *args, **kwargs)
+        return super().dispatch(request, *args, **kwargs)
+
+
 # Product Views
-class CategoryViewSet(viewsets.ModelViewSet):
+class CategoryViewSet(ReplicaReadMixin, viewsets.ModelViewSet):
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
     permission_classes = [AllowAny]
@@ -139,25 +168,25 @@ class TagViewSet(viewsets.ModelViewSet):
     serializer_class = TagSerializer
     permission_classes = [AllowAny]
 
-class ProductViewSet(viewsets.ReadOnlyModelViewSet):
-    queryset = Product.objects.filter(is_active=True).prefetch_related('category', 'tags', 'variants__size__size', 'batches', 'reviews__user')
+class ProductViewSet(ReplicaReadMixin, viewsets.ReadOnlyModelViewSet):
+    queryset = Product.objects.filter(is_active=True)
     lookup_field = 'slug'
 
     def get_serializer_class(self):
         if self.action == 'list':
-            return ProductListSerializer
+            return fast_serializer(ProductListSerializer)
         return ProductDetailSerializer
 
     def get_queryset(self):
-        queryset = super().get_queryset()
+        queryset = get_product_queryset(detail=self.action != 'list')
         category_slug = self.request.query_params.get('category_slug')
         if category_slug:
             queryset = queryset.filter(category__slug=category_slug)
         return queryset
 
 
-class ReviewViewSet(viewsets.ModelViewSet):
-    queryset = Review.objects.filter(is_approved=True)
+class ReviewViewSet(ReplicaReadMixin, viewsets.ModelViewSet):
+    queryset = Review.objects.filter(is_approved=True).select_related('user')
     serializer_class = ReviewSerializer
     permission_classes = [AllowAny]
 
@@ -170,15 +199,17 @@ class ReviewViewSet(viewsets.ModelViewSet):
 
     def perform_create(self, serializer):
         if self.request.user.is_authenticated:
-            serializer.save(user=self.request.user)
+            review = serializer.save(user=self.request.user)
         else:
             if not serializer.validated_data.get('user_name'):
                 raise serializers.ValidationError({"user_name": "نام کاربر برای کاربران مهمان لازم است."})
-            serializer.save()
+            review = serializer.save()
+        enqueue(notify_new_review, args=[review.id])
 
 
 class CartViewSet(viewsets.ViewSet):
     permission_classes = [AllowAny]
+    throttle_scope = None # Set per action (apply_coupon)
 
     def get_cart(self):
         if self.request.user.is_authenticated:
@@ -191,12 +222,22 @@ class CartViewSet(viewsets.ViewSet):
             cart, created = Cart.objects.get_or_create(session_key=session_key)
         return cart
 
+    def serialize_cart(self, cart):
+        # Re-read with every relation CartSerializer reads, so the response costs the same
+        # number of queries whatever the number of lines
+        cart = Cart.objects.select_related('user').prefetch_related(
+            Prefetch('items', queryset=CartItem.objects.select_related(
+                'product_variant__product', 'product_variant__size__size'
+            ))
+        ).get(pk=cart.pk)
+        return fast_serializer(CartSerializer)(cart, context={'request': self.request}).data
+
     def list(self, request):
         cart = self.get_cart()
-        serializer = CartSerializer(cart, context={'request': request})
-        return Response(serializer.data)
+        return Response(self.serialize_cart(cart))
 
     @action(detail=False, methods=['post'])
+    @idempotent
     def add_item(self, request):
         cart = self.get_cart()
         product_variant_id = request.data.get('product_variant_id')
@@ -227,10 +268,10 @@ class CartViewSet(viewsets.ViewSet):
             cart_item.save()
 
         cart.save()
-        serializer = CartSerializer(cart, context={'request': request})
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        return Response(self.serialize_cart(cart), status=status.HTTP_200_OK)
 
     @action(detail=False, methods=['put'])
+    @idempotent
     def update_item(self, request):
         cart = self.get_cart()
         cart_item_id = request.data.get('cart_item_id')
@@ -257,10 +298,10 @@ class CartViewSet(viewsets.ViewSet):
             cart_item.save()
 
         cart.save()
-        serializer = CartSerializer(cart, context={'request': request})
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        return Response(self.serialize_cart(cart), status=status.HTTP_200_OK)
 
     @action(detail=False, methods=['delete'])
+    @idempotent
     def remove_item(self, request):
         cart = self.get_cart()
         cart_item_id = request.data.get('cart_item_id')
@@ -275,91 +316,124 @@ class CartViewSet(viewsets.ViewSet):
 
         cart_item.delete()
         cart.save()
-        serializer = CartSerializer(cart, context={'request': request})
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        return Response(self.serialize_cart(cart), status=status.HTTP_200_OK)
 
     @action(detail=False, methods=['post'])
+    @idempotent
     def clear_cart(self, request):
         cart = self.get_cart()
         cart.items.all().delete()
         cart.save()
-        serializer = CartSerializer(cart, context={'request': request})
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        return Response(self.serialize_cart(cart), status=status.HTTP_200_OK)
 
     @action(detail=False, methods=['post'])
+    @idempotent
+    def batch(self, request):
+        # Several add/update/remove/clear operations in one request, e.g.
+        # {"operations": [{"op": "add", "product_variant_id": 3, "quantity": 2},
+        #                 {"op": "update", "cart_item_id": 7, "quantity": 1},
+        #                 {"op": "remove", "cart_item_id": 8}]}
+        cart = self.get_cart()
+        apply_cart_operations(cart, request.data.get('operations'))
+        return Response(self.serialize_cart(cart), status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['post'], throttle_scope='coupon')
     def apply_coupon(self, request):
+        # Preview only; the coupon is redeemed when the order is placed
         cart = self.get_cart()
         coupon_code = request.data.get('coupon_code')
 
         if not coupon_code:
             return Response({"detail": "کد کوپن لازم است."}, status=status.HTTP_400_BAD_REQUEST)
 
-        try:
-            coupon = Coupon.objects.get(code=coupon_code, is_active=True)
-        except Coupon.DoesNotExist:
+        if not get_coupon(coupon_code):
             return Response({"detail": "کوپن نامعتبر یا غیرفعال است."}, status=status.HTTP_404_NOT_FOUND)
 
-        validation_errors = {}
-        if coupon.valid_from and timezone.now() < coupon.valid_from:
-            validation_errors['valid_from'] = "کوپن هنوز فعال نشده است."
-        if coupon.valid_to and timezone.now() > coupon.valid_to:
-            validation_errors['valid_to'] = "کوپن منقضی شده است."
-        if coupon.usage_limit and coupon.used_count >= coupon.usage_limit:
-            validation_errors['usage_limit'] = "محدودیت استفاده از کوپن به پایان رسیده است."
-        if coupon.min_cart_amount and cart.get_total_price() < coupon.min_cart_amount:
-            validation_errors['min_cart_amount'] = f"حداقل مبلغ سبد خرید برای این کوپن {coupon.min_cart_amount} تومان است."
-
-        if validation_errors:
-            return Response(validation_errors, status=status.HTTP_400_BAD_REQUEST)
-
-        discount_amount = Decimal(0)
-        if coupon.discount_percentage:
-            discount_amount = (cart.get_total_price() * Decimal(coupon.discount_percentage / 100)).quantize(Decimal('1.'))
-        elif coupon.discount_amount:
-            discount_amount = coupon.discount_amount
-
-        if coupon.max_discount_amount and discount_amount > coupon.max_discount_amount:
-            discount_amount = coupon.max_discount_amount
-
-        cart.applied_coupon = coupon
-        cart.save()
+        total_price = get_cart_total(cart)
+        coupon, discount_amount = evaluate_coupon(coupon_code, total_price, request.user)
 
         return Response({
             "message": "کوپن با موفقیت اعمال شد.",
             "coupon_code": coupon.code,
             "discount_amount": discount_amount,
-            "new_total_price": cart.get_total_price() - discount_amount
+            "new_total_price": total_price - discount_amount
         }, status=status.HTTP_200_OK)
 
 
 class OrderViewSet(viewsets.ModelViewSet):
-    queryset = Order.objects.all().prefetch_related('items__product_variant__product', 'shipping_address')
+    # Every relation read by OrderSerializer -> OrderItemSerializer -> OrderProductVariantSerializer
+    queryset = Order.objects.all().select_related('user', 'shipping_address').prefetch_related(
+        Prefetch('items', queryset=OrderItem.objects.select_related(
+            'product_variant__product', 'product_variant__size__size'
+        ))
+    )
     serializer_class = OrderSerializer
     permission_classes = [IsAuthenticated]
 
+    def is_summary(self):
+        # The list is a compact summary unless ?view=full is requested; lines come from the detail route
+        return self.action == 'list' and self.request.query_params.get('view') != 'full'
+
+    def get_serializer_class(self):
+        if self.is_summary():
+            return OrderSummarySerializer
+        return OrderSerializer
+
     def get_queryset(self):
+        if self.is_summary():
+            first_item = OrderItem.objects.filter(order=OuterRef('pk')).order_by('id')
+            return Order.objects.filter(user=self.request.user).annotate(
+                item_count=Coalesce(
+                    Subquery(
+                        OrderItem.objects.filter(order=OuterRef('pk')).values('order')
+                        .annotate(total=Sum('quantity')).values('total')
+                    ),
+                    0
+                ),
+                thumbnail=Subquery(first_item.values('product_variant__product__main_image')[:1]),
+            ).order_by('-order_date')
         return self.queryset.filter(user=self.request.user).order_by('-order_date')
 
-    def perform_create(self, serializer):
-        cart = get_object_or_404(Cart, user=self.request.user)
+    def get_archived_queryset(self):
+        archived_orders = get_archived_orders(self.request.user)
+        if self.is_summary():
+            return archived_orders
+        return archived_orders.prefetch_related('items')
 
-        if not cart.items.exists():
-            raise serializers.ValidationError("سبد خرید شما خالی است و نمی‌توانید سفارش ثبت کنید.")
+    def serialize_order(self, order):
+        if isinstance(order, ArchivedOrder):
+            serializer_class = ArchivedOrderSummarySerializer if self.is_summary() else ArchivedOrderSerializer
+        else:
+            serializer_class = self.get_serializer_class()
+        return serializer_class(order, context=self.get_serializer_context()).data
 
-        order = serializer.save(user=self.request.user, total_amount=cart.get_total_price())
+    def list(self, request, *args, **kwargs):
+        # Orders moved to the archive are listed together with the current ones
+        orders = CombinedOrderList(self.filter_queryset(self.get_queryset()), self.get_archived_queryset())
+        page = self.paginate_queryset(orders)
+        if page is not None:
+            return self.get_paginated_response([self.serialize_order(order) for order in page])
+        return Response([self.serialize_order(order) for order in orders[:]])
+
+    def retrieve(self, request, *args, **kwargs):
+        try:
+            instance = self.get_object()
+        except Http404:
+            instance = get_object_or_404(self.get_archived_queryset(), pk=kwargs[self.lookup_field])
+        return Response(self.serialize_order(instance))
 
-        for cart_item in cart.items.all():
-            OrderItem.objects.create(
-                order=order,
-                product_variant=cart_item.product_variant,
-                quantity=cart_item.quantity,
-                price_at_order=cart_item.price_at_addition
-            )
-            product_variant = cart_item.product_variant
-            product_variant.online_stock = F('online_stock') - cart_item.quantity
-            product_variant.save()
+    @idempotent
+    def create(self, request, *args, **kwargs):
+        return super().create(request, *args, **kwargs)
 
-        cart.items.all().delete()
+    def perform_create(self, serializer):
+        order = place_order(
+            self.request.user,
+            coupon_code=self.request.data.get('coupon_code'),
+            **serializer.validated_data
+        )
+        # Re-read with the prefetches of the queryset for the response
+        serializer.instance = self.get_queryset().get(pk=order.pk)
 
 # Address ViewSet
 class AddressViewSet(viewsets.ModelViewSet):
@@ -380,3 +454,54 @@ class AddressViewSet(viewsets.ModelViewSet):
         address.is_default = True
         address.save()
         return Response({'status': 'آدرس به عنوان پیش فرض تنظیم شد.'})
+
+
+# Public order tracking by tracking code (no authentication)
+class OrderTrackingView(APIView):
+    permission_classes = [AllowAny]
+
+    def get(self, request, tracking_code):
+        info = get_tracking_info(tracking_code)
+        if info is None:
+            return Response({"detail": "سفارشی با این کد پیگیری یافت نشد."}, status=status.HTTP_404_NOT_FOUND)
+        return Response(info)
+
+
+# Reports (read only from the daily rollup tables, never from orders)
+class SalesReportView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        group = request.query_params.get('group', 'category')
+        if group not in ('category', 'variant'):
+            return Response({"detail": "گروه بندی باید category یا variant باشد."}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            start = date.fromisoformat(request.query_params['start']) if request.query_params.get('start') else None
+            end = date.fromisoformat(request.query_params['end']) if request.query_params.get('end') else None
+        except ValueError:
+            return Response({"detail": "تاریخ نامعتبر است. قالب درست: YYYY-MM-DD"}, status=status.HTTP_400_BAD_REQUEST)
+
+        if group == 'category':
+            rows = DailyCategorySales.objects.values('category_id', 'category__name')
+        else:
+            rows = DailyVariantSales.objects.values(
+                'product_variant_id', 'product_variant__product__name', 'product_variant__color'
+            )
+        if start:
+            rows = rows.filter(day__gte=start)
+        if end:
+            rows = rows.filter(day__lte=end)
+        rows = rows.annotate(
+            total_units=Sum('units'), total_gross=Sum('gross'), total_discount=Sum('discount')
+        ).order_by('-total_gross')
+        return Response(list(rows))
+
+
+class CouponStatsView(APIView):
+    # Redemption stats per coupon, read from CouponRedemption (no order scan)
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        code = request.query_params.get('code')
+        coupons = Coupon.objects.filter(code__iexact=code.strip()) if code else None
+        return Response(list(get_redemption_stats(coupons)))